@@ -0,0 +1,86 @@
+"""Serialized-response cache invalidated by per-base write versions."""
+import hashlib
+import threading
+from collections import OrderedDict
+
+# pseudo-base bumped by every write, for responses that span all bases
+ALL_BASES = "*"
+
+
+class CachedResponse:
+    __slots__ = ("versions", "body", "etag")
+
+    def __init__(self, versions, body):
+        self.versions = versions
+        self.body = body
+        self.etag = '"%s"' % hashlib.blake2b(body, digest_size=12).hexdigest()
+
+
+class ResponseCache:
+    """LRU of encoded JSON bodies tagged with the versions they were built at.
+
+    Every write calls ``bump`` for the bases it touched; an entry is served
+    only while the versions of its own bases are unchanged, so a purchase at
+    one base leaves every other base's cached dashboard valid. Responses
+    covering every base depend on ``ALL_BASES``, which each ``bump`` advances.
+    """
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def versions(self, bases):
+        """Current version of each base in ``bases``, in order"""
+        with self._lock:
+            return tuple(self._versions.get(base_id, 0) for base_id in bases)
+
+    def bump(self, *bases):
+        with self._lock:
+            for base_id in bases + (ALL_BASES,):
+                self._versions[base_id] = self._versions.get(base_id, 0) + 1
+
+    def get(self, key, bases):
+        with self._lock:
+            entry = self._entries.get(key)
+            current = tuple(self._versions.get(base_id, 0) for base_id in bases)
+            if entry is None or entry.versions != current:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, versions, body):
+        """Store ``body`` built when the bases were at ``versions`` (from ``versions()``
+        read *before* building, so a racing write leaves it stale, never wrong)"""
+        entry = CachedResponse(versions, body)
+        if self.maxsize <= 0:
+            return entry
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def etag_matches(if_none_match, etag):
+    """True when an If-None-Match header value covers ``etag``"""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
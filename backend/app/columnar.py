@@ -0,0 +1,426 @@
+"""Column-oriented transaction store for the in-memory API.
+
+Rows live in typed ``array`` chunks instead of one dict per record (about
+60 bytes a row instead of several hundred). Dates are parsed once on write
+into integer microseconds, repeated strings are dictionary-encoded, and
+aggregates run as masked sums over the columns (NumPy when it is installed,
+plain loops over the index postings otherwise). The list endpoints still see
+dict rows, built lazily by ``RowView``.
+"""
+import threading
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from collections.abc import Sequence
+from datetime import date, datetime, timedelta
+from heapq import merge
+from importlib.util import find_spec
+
+# optional: aggregates fall back to pure Python. NumPy is imported by the
+# first aggregate rather than here, which keeps it out of the cold start.
+NUMPY_AVAILABLE = find_spec("numpy") is not None
+np = None
+
+
+def _numpy():
+    """True once NumPy is imported, False when it is not installed"""
+    global np
+    if np is None and NUMPY_AVAILABLE:
+        import numpy
+        np = numpy
+    return np is not None
+
+CHUNK_ROWS = 8192
+EPOCH = datetime(1970, 1, 1)
+DAY_US = 86_400_000_000
+
+# date column encodings
+DATE_RAW = 0       # kept verbatim in ``raw_dates`` (unparseable or non-canonical)
+DATE_DAY = 1       # "YYYY-MM-DD"
+DATE_DATETIME = 2  # datetime.isoformat() of a naive datetime
+
+
+def parse_date(value):
+    """``(microseconds since epoch or None, encoding)`` for a date string"""
+    try:
+        if len(value) == 10:
+            d = date.fromisoformat(value)
+            return (d - EPOCH.date()).days * DAY_US, DATE_DAY
+        dt = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None, DATE_RAW
+    naive = dt.replace(tzinfo=None)
+    us = (naive - EPOCH) // timedelta(microseconds=1)
+    return us, DATE_DATETIME if dt.tzinfo is None and dt.isoformat() == value else DATE_RAW
+
+
+def format_date(us, encoding):
+    if encoding == DATE_DAY:
+        return (EPOCH + timedelta(microseconds=us)).date().isoformat()
+    return (EPOCH + timedelta(microseconds=us)).isoformat()
+
+
+def day_number(value):
+    """Epoch day of a 'YYYY-MM-DD[...]' bound"""
+    return (date.fromisoformat(value[:10]) - EPOCH.date()).days
+
+
+def day_date(day):
+    """Calendar date of an epoch day"""
+    return EPOCH.date() + timedelta(days=day)
+
+
+BUCKETS = ("day", "week", "month")
+
+
+def bucket_day(day, bucket):
+    """Epoch day starting the ``bucket`` (day, ISO week or month) holding ``day``"""
+    if bucket == "week":
+        # 1970-01-01 was a Thursday; weeks start on Monday
+        return day - (day + 3) % 7
+    if bucket == "month":
+        return (day_date(day).replace(day=1) - EPOCH.date()).days
+    return day
+
+
+def bucket_days(days, bucket):
+    """Vectorized ``bucket_day`` over a NumPy array of epoch days"""
+    if bucket == "week":
+        return days - (days + 3) % 7
+    if bucket == "month":
+        months = days.astype("datetime64[D]").astype("datetime64[M]")
+        return months.astype("datetime64[D]").astype(np.int64)
+    return days
+
+
+def _factorize(values):
+    """``(codes, cardinality)`` mapping an int64 array onto 0..cardinality-1"""
+    lo, hi = int(values.min()), int(values.max())
+    if hi - lo < 4 * len(values) + 1024:
+        # dense ids (bases, equipment, days): an offset is enough, no sort
+        return values - lo, hi - lo + 1
+    uniq, inverse = np.unique(values, return_inverse=True)
+    return inverse.ravel(), len(uniq)
+
+
+def _may_overflow(values):
+    """True if summing the int64 ``values`` could leave the int64 range"""
+    if not len(values):
+        return False
+    peak = max(abs(int(values.max())), abs(int(values.min())))
+    return peak * len(values) >= 2 ** 63
+
+
+class Column:
+    """Append-only typed column stored in fixed-size chunks.
+
+    Chunks are allocated at full size and never resized, so NumPy views
+    taken by readers stay valid while writers append.
+    """
+
+    def __init__(self, typecode):
+        self.typecode = typecode
+        self.chunks = []
+        self.size = 0
+
+    def append(self, value):
+        offset = self.size % CHUNK_ROWS
+        if offset == 0:
+            self.chunks.append(array(self.typecode, bytes(array(self.typecode).itemsize * CHUNK_ROWS)))
+        self.chunks[-1][offset] = value
+        self.size += 1
+
+    def check(self, value):
+        """Raise OverflowError or TypeError if ``value`` does not fit, without appending"""
+        array(self.typecode, (value,))
+
+    def __getitem__(self, i):
+        return self.chunks[i // CHUNK_ROWS][i % CHUNK_ROWS]
+
+    def numpy(self, n):
+        """First ``n`` values as one NumPy array"""
+        parts = [np.frombuffer(chunk, dtype=chunk.typecode) for chunk in self.chunks]
+        if not parts:
+            return np.zeros(0, dtype=self.typecode)
+        return np.concatenate(parts)[:n]
+
+
+class StrColumn:
+    """Dictionary-encoded string column; each distinct value is stored once"""
+
+    def __init__(self):
+        self.codes = Column("l")
+        self.values = []
+        self.lookup = {}
+
+    def append(self, value):
+        code = self.lookup.get(value)
+        if code is None:
+            code = self.lookup[value] = len(self.values)
+            self.values.append(value)
+        self.codes.append(code)
+
+    def check(self, value):
+        hash(value)
+
+    def __getitem__(self, i):
+        return self.values[self.codes[i]]
+
+
+class RowView(Sequence):
+    """Lazy sequence of dict rows for a list of row positions"""
+
+    def __init__(self, store, positions):
+        self.store = store
+        self.positions = positions
+
+    def __len__(self):
+        return len(self.positions)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self.store.row(p) for p in self.positions[i]]
+        return self.store.row(self.positions[i])
+
+    def __iter__(self):
+        row = self.store.row
+        for p in self.positions:
+            yield row(p)
+
+
+class ColumnarStore:
+    """Drop-in replacement for RecordStore backed by typed columns.
+
+    ``fields`` is the record layout in output order; ``str_fields`` are
+    dictionary-encoded, ``date_field`` is parsed once on write and every
+    other field is a 64-bit integer column.
+    """
+
+    def __init__(self, fields, indexed_fields=(), date_field=None, str_fields=()):
+        self.fields = tuple(fields)
+        self.date_field = date_field
+        self.columns = {}
+        for field in self.fields:
+            if field in str_fields:
+                self.columns[field] = StrColumn()
+            elif field != date_field:
+                self.columns[field] = Column("q")
+        if date_field:
+            self.ts = Column("q")
+            self.date_encoding = Column("b")
+            self.raw_dates = {}
+            # positions whose date could not be parsed; never match a range
+            self.undated = set()
+        self.indexes = {field: {} for field in indexed_fields}
+        self.by_day = {}
+        self.days = []
+        self.size = 0
+        self.last_id = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        return iter(RowView(self, range(self.size)))
+
+    def __getitem__(self, item):
+        return RowView(self, range(self.size))[item]
+
+    def row(self, pos):
+        record = {}
+        for field in self.fields:
+            if field == self.date_field:
+                encoding = self.date_encoding[pos]
+                if encoding == DATE_RAW:
+                    record[field] = self.raw_dates[pos]
+                else:
+                    record[field] = format_date(self.ts[pos], encoding)
+            else:
+                record[field] = self.columns[field][pos]
+        return record
+
+    # ---------- writes ----------
+    def check(self, record):
+        """Raise ValueError if some field of ``record`` cannot be stored (ids are the store's)"""
+        for field, column in self.columns.items():
+            if field == "id":
+                continue
+            try:
+                column.check(record[field])
+            except (KeyError, OverflowError, TypeError) as exc:
+                raise ValueError(f"{field}: {record.get(field)!r} cannot be stored") from exc
+
+    def insert(self, record, log=None):
+        """Give ``record`` the next id and append it atomically (see RecordStore.insert)"""
+        with self.lock:
+            record["id"] = self.last_id + 1
+            self.append(record)
+            return log(record) if log is not None else None
+
+    def append(self, record):
+        # every value is checked before the first column grows, so a bad
+        # record leaves the columns aligned
+        self.check(record)
+        pos = self.size
+        self.last_id = max(self.last_id, record["id"])
+        for field, column in self.columns.items():
+            column.append(record[field])
+        if self.date_field:
+            raw = record[self.date_field]
+            us, encoding = parse_date(raw)
+            self.ts.append(us if us is not None else 0)
+            self.date_encoding.append(encoding)
+            if encoding == DATE_RAW:
+                self.raw_dates[pos] = raw
+            if us is None:
+                self.undated.add(pos)
+            else:
+                day = us // DAY_US
+                postings = self.by_day.get(day)
+                if postings is None:
+                    self.by_day[day] = array("q", [pos])
+                    insort(self.days, day)
+                else:
+                    postings.append(pos)
+        for field, index in self.indexes.items():
+            postings = index.get(record[field])
+            if postings is None:
+                index[record[field]] = array("q", [pos])
+            else:
+                postings.append(pos)
+        # published last, so readers never see a half-written row
+        self.size = pos + 1
+
+    # ---------- filtered reads ----------
+    def _day_positions(self, start_date, end_date):
+        lo = bisect_left(self.days, day_number(start_date)) if start_date else 0
+        hi = bisect_right(self.days, day_number(end_date)) if end_date else len(self.days)
+        return [self.by_day[d] for d in self.days[lo:hi]]
+
+    def _in_range(self, pos, start_date, end_date):
+        if pos in self.undated:
+            return False
+        day = self.ts[pos] // DAY_US
+        return not ((start_date and day < day_number(start_date)) or (end_date and day > day_number(end_date)))
+
+    def find(self, start_date=None, end_date=None, **filters):
+        """Rows matching every non-None ``field=value`` and the day range"""
+        filters = {f: v for f, v in filters.items() if v is not None}
+        candidates = [self.indexes[f].get(v, ()) for f, v in filters.items()]
+        ranged = bool(self.date_field and (start_date or end_date))
+
+        if ranged:
+            day_lists = self._day_positions(start_date, end_date)
+            if not candidates or sum(map(len, day_lists)) < min(map(len, candidates)):
+                candidates.append(list(merge(*day_lists)))
+                ranged = False
+
+        if not candidates:
+            return RowView(self, range(self.size))
+        smallest = min(candidates, key=len)
+        columns = [(self.columns[f], v) for f, v in filters.items()]
+        positions = [
+            p for p in smallest
+            if p < self.size
+            and all(col[p] == v for col, v in columns)
+            and (not ranged or self._in_range(p, start_date, end_date))
+        ]
+        return RowView(self, positions)
+
+    def find_either(self, fields, value, start_date=None, end_date=None):
+        """Rows where any of ``fields`` equals ``value``, in id order"""
+        positions = []
+        last = None
+        for p in merge(*(self.indexes[f].get(value, ()) for f in fields)):
+            if p == last or p >= self.size:
+                continue
+            last = p
+            if (not start_date and not end_date) or self._in_range(p, start_date, end_date):
+                positions.append(p)
+        return RowView(self, positions)
+
+    # ---------- aggregates ----------
+    def _mask(self, n, start_date, end_date, filters, dated=False):
+        mask = np.ones(n, dtype=bool)
+        for field, value in filters.items():
+            mask &= self.columns[field].numpy(n) == value
+        if start_date or end_date or dated:
+            ts = self.ts.numpy(n)
+            # list() copies the set in one step; writers may add to it meanwhile
+            undated = [p for p in list(self.undated) if p < n]
+            if undated:
+                mask[undated] = False
+            if start_date:
+                mask &= ts >= day_number(start_date) * DAY_US
+            if end_date:
+                mask &= ts < (day_number(end_date) + 1) * DAY_US
+        return mask
+
+    def sum(self, value_field="quantity", start_date=None, end_date=None, **filters):
+        """Sum of ``value_field`` over rows matching the filters and day range"""
+        filters = {f: v for f, v in filters.items() if v is not None}
+        n = self.size
+        if _numpy():
+            mask = self._mask(n, start_date, end_date, filters)
+            values = self.columns[value_field].numpy(n)[mask]
+            if _may_overflow(values):
+                # np.sum would wrap around silently; Python ints do not
+                return sum(values.tolist())
+            return int(values.sum())
+        column = self.columns[value_field]
+        if not filters and not (start_date or end_date):
+            return sum(column[p] for p in range(n))
+        return sum(column[p] for p in self.find(start_date, end_date, **filters).positions)
+
+    def group_sum(self, keys, value_field="quantity", start_date=None, end_date=None, bucket=None, upto=None, **filters):
+        """``{(key values...): sum}`` over rows matching the filters and day range.
+
+        With ``bucket`` ("day", "week" or "month") each key also ends with
+        the epoch day starting the row's bucket; undated rows are skipped.
+        ``upto`` limits the sum to the first ``upto`` rows, a cut taken
+        earlier while writers were paused.
+        """
+        filters = {f: v for f, v in filters.items() if v is not None}
+        n = self.size if upto is None else min(upto, self.size)
+        if _numpy():
+            mask = self._mask(n, start_date, end_date, filters, dated=bool(bucket))
+            key_cols = [self.columns[k].numpy(n)[mask] for k in keys]
+            if bucket:
+                key_cols.append(bucket_days(self.ts.numpy(n)[mask] // DAY_US, bucket))
+            values = self.columns[value_field].numpy(n)[mask]
+            if not len(values):
+                return {}
+            # mixed-radix group code per row, kept dense so the per-group
+            # arrays stay no larger than the number of rows
+            m = len(values)
+            codes = np.zeros(m, dtype=np.int64)
+            groups = 1
+            for col in key_cols:
+                part, cardinality = _factorize(col)
+                codes = codes * cardinality + part
+                groups *= cardinality
+                if groups > 4 * m + 1024:
+                    _, codes = np.unique(codes, return_inverse=True)
+                    codes = codes.ravel()
+                    groups = int(codes.max()) + 1
+            # object sums add Python ints, which cannot wrap like int64 does
+            sums = np.zeros(groups, dtype=object if _may_overflow(values) else np.int64)
+            np.add.at(sums, codes, values.astype(sums.dtype))
+            first = np.full(groups, m, dtype=np.int64)
+            np.minimum.at(first, codes, np.arange(m))
+            present = np.flatnonzero(first < m)
+            keys = zip(*(col[first[present]].tolist() for col in key_cols))
+            return dict(zip(keys, sums[present].tolist()))
+        positions = range(n) if not filters and not (start_date or end_date) \
+            else [p for p in self.find(start_date, end_date, **filters).positions if p < n]
+        key_cols = [self.columns[k] for k in keys]
+        column = self.columns[value_field]
+        result = {}
+        for p in positions:
+            key = tuple(col[p] for col in key_cols)
+            if bucket:
+                if p in self.undated:
+                    continue
+                key += (bucket_day(self.ts[p] // DAY_US, bucket),)
+            result[key] = result.get(key, 0) + column[p]
+        return result
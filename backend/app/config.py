@@ -1,5 +1,5 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+import threading
+from urllib.parse import quote_plus
 from pydantic_settings import BaseSettings
 
 # Database Configuration
@@ -9,16 +9,114 @@ class Settings(BaseSettings):
     MYSQL_HOST: str = "localhost"
     MYSQL_DB: str = "mil_asset_system"
     SECRET_KEY: str = "your-secret-key-change-in-production"
+    ACCESS_TOKEN_EXPIRE_MINUTES: int = 60
+    # bcrypt cost and the process pool that runs it (0 workers = one per CPU)
+    BCRYPT_ROUNDS: int = 12
+    PASSWORD_HASH_WORKERS: int = 0
+    PASSWORD_HASH_QUEUE: int = 64
+    TOKEN_CACHE_SIZE: int = 4096
+    # Accept unsigned "demo-token-<username>" and bare-username tokens on the
+    # in-memory API. Development only: anyone can claim to be any user.
+    DEMO_TOKENS: bool = False
+    TOKEN_CACHE_TTL_SECONDS: float = 300.0
+    # Encoded responses kept for dashboard and reference-data endpoints
+    RESPONSE_CACHE_SIZE: int = 1024
+    # Response encoder: "auto" (orjson, then msgspec, then stdlib), "orjson", "msgspec" or "json"
+    JSON_BACKEND: str = "auto"
+    # Request metrics at /metrics; PROFILE_SLOW_REQUEST_MS > 0 turns on the
+    # stack sampler while any request has been running longer than that
+    METRICS_ENABLED: bool = True
+    PROFILE_SLOW_REQUEST_MS: float = 0.0
+    PROFILE_INTERVAL_MS: float = 10.0
+    # Live event stream: per-client queue bound and keepalive interval
+    EVENT_QUEUE_SIZE: int = 256
+    EVENT_HEARTBEAT_SECONDS: float = 15.0
+    # Background report/export jobs: pool size, per-user running and waiting
+    # limits, and how long finished results are kept
+    JOB_WORKERS: int = 2
+    JOB_USER_CONCURRENCY: int = 1
+    JOB_USER_PENDING: int = 8
+    JOB_RESULT_TTL_SECONDS: float = 3600.0
     DATABASE_URL: str = ""
+    ASYNC_DATABASE_URL: str = ""
+
+    # Connection pool (one per process and driver, see app.db.make_engine).
+    # Size pool_size + max_overflow against workers x concurrent requests.
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30.0
+    # Recycle below MySQL's wait_timeout instead of pinging on every checkout
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = False
+    DB_STATEMENT_TIMEOUT_MS: int = 0
+
+    # In-memory transaction storage: "columnar" (typed arrays) or "rows" (dicts)
+    STORE_BACKEND: str = "columnar"
+    # Lock stripes for per-base writes in the in-memory API
+    STORE_LOCK_STRIPES: int = 16
+
+    # Where in-memory writes are ordered: "local" (this process, one worker)
+    # or "shared" (the state server from `python -m app.state`, any number of
+    # workers). STATE_ADDRESS is a unix socket path or host:port; the authkey
+    # defaults to SECRET_KEY.
+    STATE_BACKEND: str = "local"
+    STATE_ADDRESS: str = "/tmp/mil-asset-state.sock"
+    STATE_AUTHKEY: str = ""
+    STATE_POLL_MS: float = 5.0
+
+    # SQL routers served by app.main next to the in-memory API, imported at
+    # startup: comma-separated names from app.routers.ROUTERS, empty for none.
+    # They live under SQL_ROUTERS_PREFIX because app.main already serves
+    # /api/auth/token and /api/purchases/bulk; startup fails on a clash.
+    SQL_ROUTERS: str = ""
+    SQL_ROUTERS_PREFIX: str = "/sql"
+
+    # Durable mode for the in-memory API (app/main.py); empty WAL_DIR disables it
+    WAL_DIR: str = ""
+    WAL_SEGMENT_BYTES: int = 64 * 1024 * 1024
+    WAL_FSYNC_INTERVAL_MS: float = 5.0
+    WAL_SYNC_COMMIT: bool = True
+    WAL_SNAPSHOT_EVERY: int = 100_000
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
+        # credentials are quoted so an "@" or ":" in the password survives URL parsing
+        credentials = f"{quote_plus(self.MYSQL_USER)}:{quote_plus(self.MYSQL_PASSWORD)}"
         if not self.DATABASE_URL:
-            self.DATABASE_URL = f"mysql+mysqlconnector://{self.MYSQL_USER}:{self.MYSQL_PASSWORD}@{self.MYSQL_HOST}/{self.MYSQL_DB}"
+            self.DATABASE_URL = f"mysql+mysqlconnector://{credentials}@{self.MYSQL_HOST}/{self.MYSQL_DB}"
+        if not self.ASYNC_DATABASE_URL:
+            self.ASYNC_DATABASE_URL = f"mysql+aiomysql://{credentials}@{self.MYSQL_HOST}/{self.MYSQL_DB}"
 
 settings = Settings()
 
-# SQLAlchemy Configuration
-Base = declarative_base()
-engine = create_engine(settings.DATABASE_URL, pool_pre_ping=True)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# SQLAlchemy Configuration. Base, engine and SessionLocal are built on first
+# access (module __getattr__), so the in-memory API never imports SQLAlchemy
+# and the DBAPI driver loads with the first session, not at import.
+_lazy = {}
+_lazy_lock = threading.RLock()
+
+def _declarative_base():
+    from sqlalchemy.orm import declarative_base
+    return declarative_base()
+
+def _session_factory():
+    from app.db import LazySessionmaker
+    return LazySessionmaker(get_engine, autocommit=False, autoflush=False)
+
+def _engine():
+    from app.db import make_engine
+    return make_engine(settings)
+
+_FACTORIES = {"Base": _declarative_base, "SessionLocal": _session_factory, "engine": _engine}
+
+def __getattr__(name):
+    factory = _FACTORIES.get(name)
+    if factory is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    with _lazy_lock:
+        if name not in _lazy:
+            _lazy[name] = factory()
+        return _lazy[name]
+
+def get_engine():
+    return __getattr__("engine")
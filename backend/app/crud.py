@@ -1,56 +1,458 @@
+import threading
+from datetime import date, datetime
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, select, insert, literal, union_all, and_, or_
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
 from app import models
 
+METRIC_KINDS = ("opening_balance", "purchases", "transfer_in", "transfer_out", "assigned", "expended")
+
+def get_user_by_username(db: Session, username: str):
+    return db.scalar(select(models.User).where(models.User.username == username))
+
+def create_user(db: Session, username: str, password_hash: str, full_name=None, base_id=None):
+    """Insert a user; ``password_hash`` is already hashed (see deps.hash_password_async).
+    The users table has no column for ``full_name``, it is accepted and dropped."""
+    user = models.User(username=username, password_hash=password_hash, base_id=base_id)
+    db.add(user)
+    db.commit()
+    db.refresh(user)
+    return user
+
 def get_opening_balance(db: Session, base_id: int, date: str):
-    return db.query(func.sum(models.OpeningStock.quantity))\
-        .filter(models.OpeningStock.base_id == base_id)\
-        .scalar() or 0
+    """Stock held by a base at the start of ``date`` (all opening stock if None)"""
+    balances = get_opening_balances(db, [base_id], date).get(base_id, {})
+    return sum(balances.values())
 
-def get_total_purchases(db: Session, base_id: int, start_date, end_date):
-    q = db.query(func.sum(models.Purchase.quantity))\
-        .filter(models.Purchase.base_id == base_id)
+def _as_day(value):
+    """Coerce a 'YYYY-MM-DD[THH:MM...]' string or datetime to a date"""
+    if value is None or isinstance(value, date):
+        return value.date() if isinstance(value, datetime) else value
+    return date.fromisoformat(str(value)[:10])
 
-    if start_date:
-        q = q.filter(models.Purchase.purchase_date >= start_date)
-    if end_date:
-        q = q.filter(models.Purchase.purchase_date <= end_date)
+def _rollup_total_stmt(base_id: int, column, start_date, end_date):
+    # Movement tables store DATE columns, so every range covers whole days and
+    # the daily rollup answers it without touching raw rows.
+    q = select(func.sum(column))\
+        .where(models.DailyMovement.base_id == base_id)
 
-    return q.scalar() or 0
+    if start_date: q = q.where(models.DailyMovement.day >= _as_day(start_date))
+    if end_date: q = q.where(models.DailyMovement.day <= _as_day(end_date))
 
+    return q
 
-def get_total_transfer_in(db: Session, base_id: int, start_date, end_date):
-    q = db.query(func.sum(models.Transfer.quantity))\
-        .filter(models.Transfer.to_base == base_id)
+def _rollup_total(db: Session, base_id: int, column, start_date, end_date):
+    return db.execute(_rollup_total_stmt(base_id, column, start_date, end_date)).scalar() or 0
 
-    if start_date: q = q.filter(models.Transfer.transfer_date >= start_date)
-    if end_date: q = q.filter(models.Transfer.transfer_date <= end_date)
+def get_total_purchases(db: Session, base_id: int, start_date, end_date):
+    return _rollup_total(db, base_id, models.DailyMovement.purchased, start_date, end_date)
 
-    return q.scalar() or 0
+def get_total_transfer_in(db: Session, base_id: int, start_date, end_date):
+    return _rollup_total(db, base_id, models.DailyMovement.transfer_in, start_date, end_date)
 
 def get_total_transfer_out(db: Session, base_id: int, start_date, end_date):
-    q = db.query(func.sum(models.Transfer.quantity))\
-        .filter(models.Transfer.from_base == base_id)
+    return _rollup_total(db, base_id, models.DailyMovement.transfer_out, start_date, end_date)
+
+def get_total_assigned(db: Session, base_id: int, start_date, end_date):
+    return _rollup_total(db, base_id, models.DailyMovement.assigned, start_date, end_date)
 
-    if start_date: q = q.filter(models.Transfer.transfer_date >= start_date)
-    if end_date: q = q.filter(models.Transfer.transfer_date <= end_date)
+def get_total_expended(db: Session, base_id: int, start_date, end_date):
+    return _rollup_total(db, base_id, models.DailyMovement.expended, start_date, end_date)
 
-    return q.scalar() or 0
 
-def get_total_assigned(db: Session, base_id: int, start_date, end_date):
-    q = db.query(func.sum(models.Assignment.quantity))\
-        .filter(models.Assignment.base_id == base_id)
+# ==================== Daily rollup ====================
+# metric kind -> DailyMovement column
+ROLLUP_COLUMNS = {
+    "purchases": "purchased",
+    "transfer_in": "transfer_in",
+    "transfer_out": "transfer_out",
+    "assigned": "assigned",
+    "expended": "expended",
+}
 
-    if start_date: q = q.filter(models.Assignment.assigned_date >= start_date)
-    if end_date: q = q.filter(models.Assignment.assigned_date <= end_date)
+def _rollup_deltas(row):
+    """(base_id, equipment_id, day, kind, quantity) entries for a movement row"""
+    if isinstance(row, models.Purchase):
+        return [(row.base_id, row.equipment_id, row.purchase_date, "purchases", row.quantity)]
+    if isinstance(row, models.Transfer):
+        return [
+            (row.from_base, row.equipment_id, row.transfer_date, "transfer_out", row.quantity),
+            (row.to_base, row.equipment_id, row.transfer_date, "transfer_in", row.quantity),
+        ]
+    if isinstance(row, models.Assignment):
+        return [(row.base_id, row.equipment_id, row.assigned_date, "assigned", row.quantity)]
+    if isinstance(row, models.Expended):
+        return [(row.base_id, row.equipment_id, row.expended_date, "expended", row.quantity)]
+    raise TypeError(f"Not a movement row: {row!r}")
 
-    return q.scalar() or 0
+# sign of each metric kind in the running stock balance
+BALANCE_SIGNS = {
+    "purchases": 1,
+    "transfer_in": 1,
+    "transfer_out": -1,
+    "assigned": 0,
+    "expended": -1,
+}
 
-def get_total_expended(db: Session, base_id: int, start_date, end_date):
-    q = db.query(func.sum(models.Expended.quantity))\
-        .filter(models.Expended.base_id == base_id)
+def _upsert_add(db: Session, model, key: dict, column: str, delta: int):
+    """Add ``delta`` to ``column`` of the row at ``key``, inserting it (other columns 0) if missing.
+
+    One INSERT ... ON DUPLICATE KEY UPDATE / ON CONFLICT DO UPDATE, so two
+    transactions creating the same row both land instead of one failing on
+    the primary key (a row that does not exist yet cannot be locked).
+    """
+    table = model.__table__
+    values = {c.name: 0 for c in table.columns if not c.primary_key}
+    values.update(key)
+    values[column] = delta
+    dialect = db.get_bind().dialect.name
+    if dialect in ("mysql", "mariadb"):
+        stmt = mysql.insert(table).values(values)
+        stmt = stmt.on_duplicate_key_update({column: table.c[column] + stmt.inserted[column]})
+    elif dialect in ("sqlite", "postgresql"):
+        stmt = (sqlite if dialect == "sqlite" else postgresql).insert(table).values(values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[c.name for c in table.primary_key],
+            set_={column: table.c[column] + stmt.excluded[column]},
+        )
+    else:
+        raise NotImplementedError(f"No upsert for the {dialect} dialect")
+    db.execute(stmt)
+
+def record_daily_movement(db: Session, base_id: int, equipment_id: int, day, kind: str, quantity: int):
+    """Add ``quantity`` to one rollup cell, creating it if needed; the caller commits"""
+    key = {"base_id": base_id, "equipment_id": equipment_id, "day": _as_day(day)}
+    _upsert_add(db, models.DailyMovement, key, ROLLUP_COLUMNS[kind], quantity or 0)
+
+DATE_ATTRS = {
+    models.Purchase: "purchase_date",
+    models.Transfer: "transfer_date",
+    models.Assignment: "assigned_date",
+    models.Expended: "expended_date",
+}
+
+def _apply_rollup(db: Session, deltas):
+    """Fold (base_id, equipment_id, day, kind, quantity) entries into rollup and snapshots"""
+    cells = {}
+    for base_id, equipment_id, day, kind, quantity in deltas:
+        key = (base_id, equipment_id, _as_day(day), kind)
+        cells[key] = cells.get(key, 0) + (quantity or 0)
+    for (base_id, equipment_id, day, kind), quantity in cells.items():
+        record_daily_movement(db, base_id, equipment_id, day, kind, quantity)
+        if BALANCE_SIGNS[kind]:
+            _adjust_snapshots(db, base_id, equipment_id, day, BALANCE_SIGNS[kind] * quantity)
+
+def add_movement(db: Session, row):
+    """Insert a Purchase/Transfer/Assignment/Expended row and update the rollup"""
+    date_attr = DATE_ATTRS[type(row)]
+    if getattr(row, date_attr) is None:
+        setattr(row, date_attr, date.today())
+
+    db.add(row)
+    _apply_rollup(db, _rollup_deltas(row))
+    return row
+
+def add_movements(db: Session, model, rows):
+    """Insert many rows of one movement model with a single executemany.
+
+    The rollup is updated once per touched (base, equipment, day) cell and the
+    whole batch commits or rolls back together.
+    """
+    date_attr = DATE_ATTRS[model]
+    today = date.today()
+    rows = [{**row, date_attr: _as_day(row.get(date_attr)) or today} for row in rows]
+    if not rows:
+        return 0
+    try:
+        db.execute(insert(model), rows)
+        _apply_rollup(db, (d for row in rows for d in _rollup_deltas(model(**row))))
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return len(rows)
+
+def add_purchase(db: Session, base_id: int, items, user_id=None):
+    """Record a multi-item purchase order for a base in one batch"""
+    return add_movements(db, models.Purchase, [
+        {"base_id": base_id, "equipment_id": it["asset_id"], "quantity": it["quantity"]}
+        for it in items
+    ])
+
+def rebuild_daily_rollup(db: Session):
+    """Recompute movement_daily from the raw movement tables"""
+    sources = [
+        (models.Purchase.base_id, models.Purchase.equipment_id, models.Purchase.purchase_date, models.Purchase.quantity, "purchases"),
+        (models.Transfer.to_base, models.Transfer.equipment_id, models.Transfer.transfer_date, models.Transfer.quantity, "transfer_in"),
+        (models.Transfer.from_base, models.Transfer.equipment_id, models.Transfer.transfer_date, models.Transfer.quantity, "transfer_out"),
+        (models.Assignment.base_id, models.Assignment.equipment_id, models.Assignment.assigned_date, models.Assignment.quantity, "assigned"),
+        (models.Expended.base_id, models.Expended.equipment_id, models.Expended.expended_date, models.Expended.quantity, "expended"),
+    ]
+    cells = {}
+    for base_col, eq_col, day_col, qty_col, kind in sources:
+        rows = db.query(base_col, eq_col, day_col, func.sum(qty_col))\
+            .filter(day_col.isnot(None))\
+            .group_by(base_col, eq_col, day_col)
+        for base_id, equipment_id, day, total in rows:
+            cell = cells.setdefault((base_id, equipment_id, day), dict.fromkeys(ROLLUP_COLUMNS.values(), 0))
+            cell[ROLLUP_COLUMNS[kind]] += int(total or 0)
+
+    db.query(models.DailyMovement).delete()
+    if cells:
+        db.execute(insert(models.DailyMovement), [
+            {"base_id": b, "equipment_id": e, "day": d, **totals}
+            for (b, e, d), totals in cells.items()
+        ])
+    db.commit()
+    return len(cells)
+
+def backfill_daily_rollup(db: Session):
+    """Build movement_daily from the raw tables when it is empty but they are not.
+
+    Databases that predate the rollup have history but no rollup rows, and
+    every get_total_* reads 0 until this runs (deps.prepare_db runs it at
+    startup). Returns the number of cells written.
+    """
+    if db.scalar(select(models.DailyMovement.day).limit(1)) is not None:
+        return 0
+    if all(db.scalar(select(model.id).limit(1)) is None for model in DATE_ATTRS):
+        return 0
+    try:
+        return rebuild_daily_rollup(db)
+    except IntegrityError:
+        # another worker backfilled it first
+        db.rollback()
+        return 0
+
+
+# ==================== Balance snapshots ====================
+def _opening_parts(base_ids, day):
+    """Selects of (base_id, equipment_id, quantity) summing to the balance at the start of ``day``.
+
+    Opening stock is small and read whole, so rows seeded at any time (or
+    undated) always count; the movements come from _net_movement_parts.
+    """
+    o = models.OpeningStock
+    opening = select(o.base_id, o.equipment_id, o.quantity).where(o.base_id.in_(base_ids))
+    if day is None:
+        return [opening]
+    day = _as_day(day)
+    opening = opening.where(or_(o.date.is_(None), o.date <= day))
+    return [opening, *_net_movement_parts(base_ids, day)]
+
+def _net_movement_parts(base_ids, day):
+    """Selects summing the net movement before ``day``.
+
+    With a snapshot at P <= day this reads the snapshot plus rollup days in
+    [P, day), so work is bounded by the snapshot interval instead of the
+    full history.
+    """
+    s, d = models.StockSnapshot, models.DailyMovement
+    latest = select(s.base_id, func.max(s.period_start).label("period_start"))\
+        .where(s.base_id.in_(base_ids), s.period_start <= day)\
+        .group_by(s.base_id)\
+        .subquery("latest_snapshot")
+
+    snapshot = select(s.base_id, s.equipment_id, s.quantity)\
+        .join(latest, and_(s.base_id == latest.c.base_id, s.period_start == latest.c.period_start))
+    movements = select(d.base_id, d.equipment_id, d.purchased + d.transfer_in - d.transfer_out - d.expended)\
+        .outerjoin(latest, d.base_id == latest.c.base_id)\
+        .where(d.base_id.in_(base_ids), d.day < day)\
+        .where(or_(latest.c.period_start.is_(None), d.day >= latest.c.period_start))
+    return [snapshot, movements]
+
+def _balances_stmt(parts):
+    parts = union_all(*parts).subquery("balance_parts")
+    base_col, eq_col, qty_col = parts.c
+    return select(base_col, eq_col, func.sum(qty_col)).group_by(base_col, eq_col)
+
+def _opening_balances_stmt(base_ids, day):
+    return _balances_stmt(_opening_parts(base_ids, day))
+
+def _collect_balances(rows, base_ids):
+    result = {base_id: {} for base_id in base_ids}
+    for base_id, equipment_id, quantity in rows:
+        result[base_id][equipment_id] = int(quantity or 0)
+    return result
+
+def _opening_balances(db: Session, base_ids, day):
+    return _collect_balances(db.execute(_opening_balances_stmt(base_ids, day)), base_ids)
+
+def get_opening_balances(db: Session, base_ids, day=None):
+    """``{base_id: {equipment_id: quantity}}`` at the start of ``day``"""
+    base_ids = list(dict.fromkeys(base_ids))
+    if not base_ids:
+        return {}
+    if snapshots_due():
+        snapshot_if_due(db)
+    return _opening_balances(db, base_ids, day)
+
+def take_snapshot(db: Session, period_start, base_ids=None):
+    """Store the net movement of every base/equipment before ``period_start``.
+
+    Opening stock stays out of the snapshot; reads add it from its own table.
+    """
+    period_start = _as_day(period_start)
+    if base_ids is None:
+        base_ids = [b for (b,) in db.query(models.BaseModel.id)]
+
+    # drop any earlier snapshot for this period so it is not read back below
+    db.query(models.StockSnapshot)\
+        .filter(models.StockSnapshot.period_start == period_start, models.StockSnapshot.base_id.in_(base_ids))\
+        .delete(synchronize_session=False)
+    db.flush()
+
+    rows = [
+        {"base_id": base_id, "equipment_id": equipment_id, "period_start": period_start, "quantity": quantity}
+        for base_id, balances in _collect_balances(
+            db.execute(_balances_stmt(_net_movement_parts(base_ids, period_start))), base_ids).items()
+        for equipment_id, quantity in balances.items()
+    ]
+    if rows:
+        db.execute(insert(models.StockSnapshot), rows)
+    db.commit()
+    return len(rows)
+
+def ensure_monthly_snapshots(db: Session, upto=None):
+    """Snapshot every month start between the latest snapshot and ``upto``"""
+    upto = _as_day(upto) or date.today()
+    latest = db.query(func.max(models.StockSnapshot.period_start)).scalar()
+    if latest is None:
+        latest = db.query(func.min(models.DailyMovement.day)).scalar()
+        if latest is None:
+            return []
+    else:
+        latest = _as_day(latest)
+
+    taken = []
+    period = _month_after(latest)
+    while period <= upto:
+        take_snapshot(db, period)
+        taken.append(period)
+        period = _month_after(period)
+    return taken
+
+def _month_after(day):
+    return date(day.year + day.month // 12, day.month % 12 + 1, 1)
+
+# Reads take the monthly snapshots that have come due, so a long-running
+# process keeps them current; between month starts the check is a date compare.
+_snapshot_lock = threading.Lock()
+_next_snapshot = None
+
+def snapshots_due():
+    return _next_snapshot is None or date.today() >= _next_snapshot
+
+def snapshot_if_due(db: Session):
+    """ensure_monthly_snapshots once per month per process; returns the periods taken"""
+    global _next_snapshot
+    # never block: on the async path this runs on the event loop's thread
+    if not _snapshot_lock.acquire(blocking=False):
+        return []
+    try:
+        if not snapshots_due():
+            return []
+        try:
+            taken = ensure_monthly_snapshots(db)
+        except IntegrityError:
+            # another worker took them first
+            db.rollback()
+            taken = []
+        _next_snapshot = _month_after(date.today())
+        return taken
+    finally:
+        _snapshot_lock.release()
+
+def _adjust_snapshots(db: Session, base_id: int, equipment_id: int, day, delta: int):
+    """Carry a back-dated movement into snapshots taken after ``day``"""
+    s = models.StockSnapshot
+    periods = [p for (p,) in db.query(s.period_start)
+               .filter(s.base_id == base_id, s.period_start > _as_day(day))
+               .distinct()]
+    for period in periods:
+        _upsert_add(db, s, {"base_id": base_id, "equipment_id": equipment_id, "period_start": period}, "quantity", delta)
+
+
+def _movement_rows(base_ids, start_date, end_date):
+    """Opening balance at start_date UNION ALL the daily rollup, one column per metric"""
+    zero = literal(0)
+    balance = union_all(*_opening_parts(base_ids, start_date)).subquery("opening")
+    base_col, _, qty_col = balance.c
+    opening = select(
+        base_col.label("base_id"),
+        qty_col.label("opening_balance"),
+        zero.label("purchases"), zero.label("transfer_in"), zero.label("transfer_out"),
+        zero.label("assigned"), zero.label("expended"),
+    )
+
+    d = models.DailyMovement
+    movements = select(
+        d.base_id, zero, d.purchased, d.transfer_in, d.transfer_out, d.assigned, d.expended,
+    ).where(d.base_id.in_(base_ids))
+    if start_date: movements = movements.where(d.day >= _as_day(start_date))
+    if end_date: movements = movements.where(d.day <= _as_day(end_date))
+
+    return union_all(opening, movements).subquery("movements")
+
+
+def with_derived_metrics(metrics: dict):
+    """Add net_movement and closing_balance to a dict of raw metrics"""
+    metrics["net_movement"] = metrics["purchases"] + metrics["transfer_in"] - metrics["transfer_out"]
+    metrics["closing_balance"] = metrics["opening_balance"] + metrics["net_movement"] - metrics["expended"]
+    return metrics
+
+
+def _dashboard_metrics_stmt(base_ids, start_date, end_date):
+    m = _movement_rows(base_ids, start_date, end_date)
+    return select(
+        m.c.base_id,
+        *[func.sum(m.c[kind]).label(kind) for kind in METRIC_KINDS],
+    ).group_by(m.c.base_id)
+
+def _collect_metrics(rows, base_ids):
+    result = {base_id: dict.fromkeys(METRIC_KINDS, 0) for base_id in base_ids}
+    for row in rows:
+        result[row.base_id] = {kind: int(getattr(row, kind) or 0) for kind in METRIC_KINDS}
+    return {base_id: with_derived_metrics(metrics) for base_id, metrics in result.items()}
+
+def _base_id_list(base_ids):
+    if isinstance(base_ids, int):
+        base_ids = [base_ids]
+    return list(dict.fromkeys(base_ids))
+
+def get_dashboard_metrics(db: Session, base_ids, start_date=None, end_date=None):
+    """All dashboard figures for one or more bases in a single statement.
+
+    Returns ``{base_id: metrics}``; bases without any rows get zeros.
+    """
+    base_ids = _base_id_list(base_ids)
+    if not base_ids:
+        return {}
+    if snapshots_due():
+        snapshot_if_due(db)
+    return _collect_metrics(db.execute(_dashboard_metrics_stmt(base_ids, start_date, end_date)), base_ids)
+
+
+# ==================== Async variants ====================
+# Same statements as above, executed on an AsyncSession (see deps.get_async_db).
+async def get_opening_balances_async(db: AsyncSession, base_ids, day=None):
+    base_ids = list(dict.fromkeys(base_ids))
+    if not base_ids:
+        return {}
+    if snapshots_due():
+        await db.run_sync(snapshot_if_due)
+    return _collect_balances(await db.execute(_opening_balances_stmt(base_ids, day)), base_ids)
 
-    if start_date: q = q.filter(models.Expended.expended_date >= start_date)
-    if end_date: q = q.filter(models.Expended.expended_date <= end_date)
+async def get_opening_balance_async(db: AsyncSession, base_id: int, date: str):
+    balances = (await get_opening_balances_async(db, [base_id], date)).get(base_id, {})
+    return sum(balances.values())
 
-    return q.scalar() or 0
+async def get_dashboard_metrics_async(db: AsyncSession, base_ids, start_date=None, end_date=None):
+    base_ids = _base_id_list(base_ids)
+    if not base_ids:
+        return {}
+    if snapshots_due():
+        await db.run_sync(snapshot_if_due)
+    return _collect_metrics(await db.execute(_dashboard_metrics_stmt(base_ids, start_date, end_date)), base_ids)
@@ -0,0 +1,205 @@
+"""Engine factory with Settings-driven pool tuning and pool metrics."""
+import logging
+import threading
+import time
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+from app.metrics import instrument_engine, registry
+
+logger = logging.getLogger(__name__)
+
+# checkouts that block at least this long count as a wait
+WAIT_THRESHOLD_SECONDS = 0.001
+
+
+class PoolMetrics:
+    """Counters for one engine's pool"""
+
+    def __init__(self, name):
+        self.name = name
+        self.pool = None
+        self.connects = 0
+        self.checkouts = 0
+        self.checked_out = 0
+        self.invalidations = 0
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self.timeouts = 0
+        self._lock = threading.Lock()
+
+    def record_wait(self, seconds, timed_out=False):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            if seconds >= WAIT_THRESHOLD_SECONDS:
+                self.waits += 1
+                self.wait_seconds += seconds
+        if timed_out or seconds >= 1.0:
+            logger.warning("pool %s: checkout waited %.3fs (timed_out=%s)", self.name, seconds, timed_out)
+
+    def snapshot(self):
+        pool = self.pool
+        return {
+            "name": self.name,
+            "pool_size": pool.size() if hasattr(pool, "size") else None,
+            # QueuePool counts up from -pool_size until the pool is full
+            "overflow": max(0, pool.overflow()) if hasattr(pool, "overflow") else None,
+            "checked_out": self.checked_out,
+            "checkouts": self.checkouts,
+            "connects": self.connects,
+            "invalidations": self.invalidations,
+            "waits": self.waits,
+            "wait_seconds": round(self.wait_seconds, 6),
+            "timeouts": self.timeouts,
+        }
+
+
+class _MeteredPoolMixin:
+    """Times checkouts that can block on the underlying queue"""
+    metrics = None
+
+    def _do_get(self):
+        # Only a checkout with the pool and its overflow both in use waits for
+        # a connection to come back; the others take an idle one or open a new
+        # one, and connect time is not a wait.
+        if self.metrics is None or not (-1 < self._max_overflow <= self._overflow):
+            return super()._do_get()
+        started = time.perf_counter()
+        timed_out = False
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            timed_out = True
+            raise
+        finally:
+            if self.metrics is not None:
+                self.metrics.record_wait(time.perf_counter() - started, timed_out)
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        if self.metrics is not None:
+            self.metrics.pool = pool
+        return pool
+
+
+class MeteredQueuePool(_MeteredPoolMixin, QueuePool):
+    pass
+
+
+class MeteredAsyncQueuePool(_MeteredPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+# name -> PoolMetrics for every engine built by make_engine
+pool_registry = {}
+
+
+def _attach_events(sync_engine, metrics, statement_timeout_ms):
+    @event.listens_for(sync_engine, "connect")
+    def on_connect(dbapi_conn, record):
+        metrics.connects += 1
+        if statement_timeout_ms and sync_engine.dialect.name == "mysql":
+            cursor = dbapi_conn.cursor()
+            try:
+                # MySQL aborts read-only SELECTs running longer than this
+                cursor.execute(f"SET SESSION max_execution_time = {int(statement_timeout_ms)}")
+            finally:
+                cursor.close()
+
+    @event.listens_for(sync_engine, "checkout")
+    def on_checkout(dbapi_conn, record, proxy):
+        with metrics._lock:
+            metrics.checkouts += 1
+            metrics.checked_out += 1
+
+    @event.listens_for(sync_engine, "checkin")
+    def on_checkin(dbapi_conn, record):
+        with metrics._lock:
+            metrics.checked_out = max(0, metrics.checked_out - 1)
+
+    @event.listens_for(sync_engine, "invalidate")
+    def on_invalidate(dbapi_conn, record, exception):
+        metrics.invalidations += 1
+
+    instrument_engine(sync_engine)
+
+
+def make_engine(settings, url=None, async_=False, name=None):
+    """Build the process' engine for ``url`` (defaults to settings.DATABASE_URL).
+
+    Pool sizing, recycle, pre-ping and statement timeout come from Settings.
+    SQLite URLs keep SQLAlchemy's default pool since sizing does not apply.
+    """
+    url = url or (settings.ASYNC_DATABASE_URL if async_ else settings.DATABASE_URL)
+    name = name or ("async" if async_ else "sync")
+    metrics = pool_registry[name] = PoolMetrics(name)
+
+    kwargs = {}
+    if not make_url(url).get_backend_name().startswith("sqlite"):
+        kwargs.update(
+            poolclass=MeteredAsyncQueuePool if async_ else MeteredQueuePool,
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_timeout=settings.DB_POOL_TIMEOUT,
+            pool_recycle=settings.DB_POOL_RECYCLE,
+            pool_pre_ping=settings.DB_POOL_PRE_PING,
+        )
+
+    if async_:
+        from sqlalchemy.ext.asyncio import create_async_engine
+        engine = create_async_engine(url, **kwargs)
+        sync_engine = engine.sync_engine
+    else:
+        engine = sync_engine = create_engine(url, **kwargs)
+
+    sync_engine.pool.metrics = metrics
+    metrics.pool = sync_engine.pool
+    _attach_events(sync_engine, metrics, settings.DB_STATEMENT_TIMEOUT_MS)
+    return engine
+
+
+class LazySessionmaker(sessionmaker):
+    """sessionmaker bound to ``engine_factory()`` when the first session opens"""
+
+    def __init__(self, engine_factory, **kw):
+        super().__init__(**kw)
+        self._engine_factory = engine_factory
+
+    def __call__(self, **local_kw):
+        if self.kw.get("bind") is None:
+            self.configure(bind=self._engine_factory())
+        return super().__call__(**local_kw)
+
+
+def pool_metrics():
+    """Current counters for every engine built by make_engine"""
+    return [metrics.snapshot() for metrics in pool_registry.values()]
+
+
+# pool counter -> (metric name, type, help)
+POOL_SERIES = {
+    "checked_out": ("db_pool_checked_out", "gauge", "Connections currently checked out"),
+    "pool_size": ("db_pool_size", "gauge", "Configured pool size"),
+    "overflow": ("db_pool_overflow", "gauge", "Connections beyond pool_size"),
+    "checkouts": ("db_pool_checkouts_total", "counter", "Connection checkouts"),
+    "connects": ("db_pool_connects_total", "counter", "New DBAPI connections"),
+    "invalidations": ("db_pool_invalidations_total", "counter", "Invalidated connections"),
+    "waits": ("db_pool_waits_total", "counter", "Checkouts that had to wait"),
+    "wait_seconds": ("db_pool_wait_seconds_total", "counter", "Time spent waiting for a connection"),
+    "timeouts": ("db_pool_timeouts_total", "counter", "Checkouts that timed out"),
+}
+
+
+@registry.collector
+def _pool_series():
+    snapshots = pool_metrics()
+    return [
+        (name, kind, help_text, {(("pool", snap["name"]),): snap[field] for snap in snapshots})
+        for field, (name, kind, help_text) in POOL_SERIES.items()
+    ] if snapshots else []
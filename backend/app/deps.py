@@ -1,17 +1,30 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from .config import settings
-from .models import Base
-from jose import jwt, JWTError
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from .config import settings, get_engine, SessionLocal
+from .db import make_engine
+from .models import Base, User
+from . import crud
+from .security import Principal, TokenCache, create_access_token, decode_token
+from .metrics import timed
 from fastapi import Depends, HTTPException
 from fastapi.security import OAuth2PasswordBearer
-from passlib.context import CryptContext
+from .passwords import HashQueueFull, PasswordHasher
 
-engine = create_engine(settings.DATABASE_URL, pool_pre_ping=True)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Async engine for the routers; built on first use so the driver
+# (aiomysql / aiosqlite) is only needed when the async path is served
+_async_sessionmaker = None
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/token")
+def get_async_sessionmaker():
+    global _async_sessionmaker
+    if _async_sessionmaker is None:
+        async_engine = make_engine(settings, async_=True)
+        _async_sessionmaker = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+    return _async_sessionmaker
+
+password_hasher = PasswordHasher(settings.BCRYPT_ROUNDS, settings.PASSWORD_HASH_WORKERS, settings.PASSWORD_HASH_QUEUE)
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl=settings.SQL_ROUTERS_PREFIX + "/api/auth/token")
+token_cache = TokenCache(settings.TOKEN_CACHE_SIZE, settings.TOKEN_CACHE_TTL_SECONDS)
 
 def get_db():
     db = SessionLocal()
@@ -20,23 +33,60 @@ def get_db():
     finally:
         db.close()
 
+async def get_async_db():
+    async with get_async_sessionmaker()() as db:
+        yield db
+
 def create_db():
-    Base.metadata.create_all(bind=engine)
+    Base.metadata.create_all(bind=get_engine())
+
+def prepare_db():
+    """Create missing tables, backfill derived ones and take due snapshots; safe to run on every start"""
+    create_db()
+    db = SessionLocal()
+    try:
+        crud.backfill_daily_rollup(db)
+        crud.snapshot_if_due(db)
+    finally:
+        db.close()
 
 def verify_password(plain, hashed):
-    return pwd_context.verify(plain, hashed)
+    return password_hasher.verify_sync(plain, hashed)
 
 def hash_password(passwd):
-    return pwd_context.hash(passwd)
+    return password_hasher.hash_sync(passwd)
+
+def _too_busy():
+    return HTTPException(status_code=429, detail="Too many concurrent logins, retry shortly", headers={"Retry-After": "1"})
 
-def create_access_token(data: dict, expires_delta=None):
-    to_encode = data.copy()
-    token = jwt.encode(to_encode, settings.SECRET_KEY, algorithm="HS256")
-    return token
+async def verify_password_async(plain, hashed):
+    """Check a password on the hashing pool; 429 when the pool is saturated"""
+    try:
+        return await password_hasher.verify(plain, hashed)
+    except HashQueueFull:
+        raise _too_busy() from None
 
-def decode_token(token: str):
+async def hash_password_async(passwd):
     try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=["HS256"])
-        return payload
-    except JWTError:
-        return None
+        return await password_hasher.hash(passwd)
+    except HashQueueFull:
+        raise _too_busy() from None
+
+@timed("auth")
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)) -> Principal:
+    """Resolve the bearer token to a Principal, decoding it only on a cache miss"""
+    principal = token_cache.get(token)
+    if principal is not None:
+        return principal
+
+    payload = decode_token(token)
+    if not payload or not payload.get("sub"):
+        raise HTTPException(status_code=401, detail="Invalid token")
+    # ``sub`` is the username on both paths (security.user_claims)
+    user = await db.scalar(select(User).where(User.username == payload["sub"]))
+    if user is None:
+        raise HTTPException(status_code=401, detail="User not found")
+
+    principal = Principal(user.username, user.role, user.base_id, user_id=user.id)
+    token_cache.put(token, principal, payload.get("exp"))
+    return principal
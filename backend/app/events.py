@@ -0,0 +1,115 @@
+"""Server-sent event fan-out of recorded writes to live dashboards."""
+import asyncio
+import itertools
+import threading
+
+from app.responses import dumps
+
+
+class Subscription:
+    """One SSE client: a bounded queue on the client's event loop.
+
+    ``bases`` is the set of bases the client may see, or None for all.
+    A client that lets its queue fill up is dropped rather than slowing
+    writers down or buffering without limit.
+    """
+
+    def __init__(self, hub, loop, bases, maxsize):
+        self.hub = hub
+        self.loop = loop
+        self.bases = bases
+        self.queue = asyncio.Queue(maxsize)
+        self.dropped = False
+
+    def wants(self, bases):
+        return self.bases is None or not self.bases.isdisjoint(bases)
+
+    def _offer(self, frame):
+        # runs on the subscriber's loop
+        if self.dropped:
+            return
+        try:
+            self.queue.put_nowait(frame)
+        except asyncio.QueueFull:
+            self.dropped = True
+            self.hub.drop(self)
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(None)
+
+
+class EventHub:
+    """Publishes events from any thread to every matching subscriber.
+
+    Each event is encoded once as an SSE frame; fan-out only hands the same
+    bytes to each subscriber's loop with ``call_soon_threadsafe``.
+    """
+
+    def __init__(self, queue_size=256):
+        self.queue_size = queue_size
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self.published = 0
+        self.dropped = 0
+
+    def subscribe(self, bases=None):
+        sub = Subscription(self, asyncio.get_running_loop(), bases, self.queue_size)
+        with self._lock:
+            self._subscribers.add(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            self._subscribers.discard(sub)
+
+    def drop(self, sub):
+        with self._lock:
+            if sub in self._subscribers:
+                self._subscribers.discard(sub)
+                self.dropped += 1
+
+    def publish(self, event, data, bases):
+        """Send ``data`` as an ``event`` to subscribers allowed to see any of ``bases``"""
+        if not self._subscribers:
+            return
+        with self._lock:
+            targets = [sub for sub in self._subscribers if sub.wants(bases)]
+        if not targets:
+            return
+        frame = b"id: %d\nevent: %s\ndata: %s\n\n" % (next(self._ids), event.encode(), dumps(data))
+        self.published += 1
+        for sub in targets:
+            try:
+                sub.loop.call_soon_threadsafe(sub._offer, frame)
+            except RuntimeError:
+                # the client's loop has shut down
+                self.unsubscribe(sub)
+
+    async def stream(self, bases=None, heartbeat=15.0):
+        """Subscribe to ``bases`` and yield SSE frames until the client disconnects or is dropped.
+
+        The subscription is taken on the first iteration, inside the ``try``,
+        so a response that never starts never subscribes and the ``finally``
+        always unsubscribes.
+        """
+        sub = None
+        try:
+            sub = self.subscribe(bases)
+            yield b"retry: 3000\n\n"
+            while True:
+                try:
+                    frame = await asyncio.wait_for(sub.queue.get(), heartbeat)
+                except asyncio.TimeoutError:
+                    yield b": keepalive\n\n"
+                    continue
+                if frame is None:
+                    yield b"event: dropped\ndata: {\"reason\":\"slow consumer\"}\n\n"
+                    return
+                yield frame
+        finally:
+            if sub is not None:
+                self.unsubscribe(sub)
+
+    def __len__(self):
+        return len(self._subscribers)
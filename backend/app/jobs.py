@@ -0,0 +1,275 @@
+"""Background jobs for heavy reports and exports.
+
+A job wraps a callable returning ``(body bytes, media_type, filename)``.
+``JobQueue`` runs jobs on a bounded thread pool: at most ``workers`` at a
+time and at most ``per_user`` per owner; the rest wait in submission order,
+skipping owners already at their limit. An owner with ``max_pending`` jobs
+waiting is refused with ``JobLimitReached``. Finished jobs keep their result
+for ``ttl`` seconds. Status changes wake async watchers on their own loops,
+so a status stream costs nothing while its job runs.
+"""
+import asyncio
+import itertools
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import HTTPException
+from fastapi.responses import Response, StreamingResponse
+
+from app.config import settings
+from app.responses import dumps
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED = (DONE, FAILED, CANCELLED)
+
+
+class JobLimitReached(Exception):
+    """The owner already has ``max_pending`` jobs waiting"""
+
+
+class Job:
+    __slots__ = ("id", "owner", "kind", "params", "fn", "status", "error",
+                 "body", "media_type", "filename",
+                 "created_at", "started_at", "finished_at", "_watchers")
+
+    def __init__(self, owner, kind, params, fn):
+        self.id = uuid.uuid4().hex
+        self.owner = owner
+        self.kind = kind
+        self.params = params
+        self.fn = fn
+        self.status = QUEUED
+        self.error = None
+        self.body = None
+        self.media_type = None
+        self.filename = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._watchers = []
+
+    def as_dict(self):
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "owner": self.owner,
+            "params": self.params,
+            "status": self.status,
+            "error": self.error,
+            "size": len(self.body) if self.body is not None else None,
+            "media_type": self.media_type,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class JobQueue:
+    """Bounded, per-owner fair pool of report jobs"""
+
+    def __init__(self, workers=2, per_user=1, max_pending=8, ttl=3600.0, max_jobs=1000):
+        self.workers = workers
+        self.per_user = per_user
+        self.max_pending = max_pending
+        self.ttl = ttl
+        self.max_jobs = max_jobs
+        self._executor = None
+        self._jobs = OrderedDict()
+        self._pending = deque()
+        self._running = {}
+        self._active = 0
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.rejected = 0
+        self.completed = {DONE: 0, FAILED: 0, CANCELLED: 0}
+
+    def submit(self, owner, kind, fn, params=None):
+        """Queue ``fn()``; raises JobLimitReached when ``owner`` has too many waiting"""
+        with self._lock:
+            self._expire()
+            if sum(1 for job in self._pending if job.owner == owner) >= self.max_pending:
+                self.rejected += 1
+                raise JobLimitReached(f"{self.max_pending} jobs already waiting")
+            job = Job(owner, kind, params or {}, fn)
+            self._jobs[job.id] = job
+            self._pending.append(job)
+            self.submitted += 1
+            self._dispatch()
+        return job
+
+    def _dispatch(self):
+        # caller holds the lock
+        while self._active < self.workers:
+            job = next((j for j in self._pending if self._running.get(j.owner, 0) < self.per_user), None)
+            if job is None:
+                return
+            self._pending.remove(job)
+            self._running[job.owner] = self._running.get(job.owner, 0) + 1
+            self._active += 1
+            self._set_status(job, RUNNING)
+            job.started_at = time.time()
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix="job")
+            self._executor.submit(self._run, job)
+
+    def _run(self, job):
+        try:
+            body, media_type, filename = job.fn()
+            status, error = DONE, None
+        except HTTPException as exc:
+            body = media_type = filename = None
+            status, error = FAILED, exc.detail
+        except Exception as exc:
+            body = media_type = filename = None
+            status, error = FAILED, f"{type(exc).__name__}: {exc}"
+        with self._lock:
+            job.body, job.media_type, job.filename, job.error = body, media_type, filename, error
+            job.finished_at = time.time()
+            job.fn = None
+            self._set_status(job, status)
+            self._active -= 1
+            self._running[job.owner] -= 1
+            if not self._running[job.owner]:
+                del self._running[job.owner]
+            self._dispatch()
+
+    def _set_status(self, job, status):
+        # caller holds the lock
+        job.status = status
+        if status in self.completed:
+            self.completed[status] += 1
+        watchers, job._watchers = job._watchers, []
+        for loop, future in watchers:
+            try:
+                loop.call_soon_threadsafe(_resolve, future)
+            except RuntimeError:
+                # the watcher's loop has shut down
+                pass
+
+    def _expire(self):
+        # caller holds the lock; drop finished jobs past their ttl, then the
+        # oldest finished ones while over max_jobs
+        now = time.time()
+        finished = [job for job in self._jobs.values() if job.status in FINISHED]
+        excess = len(self._jobs) - self.max_jobs
+        for job in finished:
+            if now - job.finished_at > self.ttl or excess > 0:
+                del self._jobs[job.id]
+                excess -= 1
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def jobs(self, owner=None):
+        with self._lock:
+            return [job for job in self._jobs.values() if owner is None or job.owner == owner]
+
+    def cancel(self, job):
+        """Cancel a waiting job or discard a finished one; running jobs run on"""
+        with self._lock:
+            if job.status == QUEUED:
+                self._pending.remove(job)
+                job.finished_at = time.time()
+                job.fn = None
+                self._set_status(job, CANCELLED)
+                return True
+            if job.status in FINISHED:
+                self._jobs.pop(job.id, None)
+                return True
+            return False
+
+    async def changed(self, job, seen, timeout):
+        """Wait until ``job.status`` differs from ``seen``; False on timeout"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self._lock:
+            if job.status != seen:
+                return True
+            job._watchers.append((loop, future))
+        try:
+            await asyncio.wait_for(future, timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def stream(self, job, heartbeat=15.0):
+        """SSE ``status`` frames for ``job`` until it finishes"""
+        yield b"retry: 3000\n\n"
+        ids = itertools.count(1)
+        while True:
+            status = job.status
+            yield b"id: %d\nevent: status\ndata: %s\n\n" % (next(ids), dumps(job.as_dict()))
+            if status in FINISHED:
+                return
+            while not await self.changed(job, status, heartbeat):
+                yield b": keepalive\n\n"
+
+    def pending(self):
+        return len(self._pending)
+
+    def running(self):
+        return self._active
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(None)
+
+
+# ==================== HTTP helpers ====================
+def too_many_jobs(exc):
+    return HTTPException(status_code=429, detail=f"Too many jobs queued: {exc}", headers={"Retry-After": "5"})
+
+
+def owned_job(queue, job_id, owner, admin=False):
+    """The job, if it exists and belongs to ``owner`` (admins see every job)"""
+    job = queue.get(job_id)
+    if job is None or (job.owner != owner and not admin):
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+def job_status(job, result_url):
+    content = job.as_dict()
+    if job.status == DONE:
+        content["result_url"] = result_url
+    return content
+
+
+def job_events(queue, job):
+    return StreamingResponse(
+        queue.stream(job, settings.EVENT_HEARTBEAT_SECONDS),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def job_result(job):
+    """The finished job's body as a download; 409 until it is done"""
+    if job.status == FAILED:
+        raise HTTPException(status_code=409, detail=f"Job failed: {job.error}")
+    if job.status != DONE:
+        raise HTTPException(status_code=409, detail=f"Job is {job.status}")
+    return Response(job.body, media_type=job.media_type,
+                    headers={"Content-Disposition": f'attachment; filename="{job.filename}"'})
+
+
+job_queue = JobQueue(
+    settings.JOB_WORKERS,
+    settings.JOB_USER_CONCURRENCY,
+    settings.JOB_USER_PENDING,
+    settings.JOB_RESULT_TTL_SECONDS,
+)
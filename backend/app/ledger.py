@@ -0,0 +1,107 @@
+"""Running movement totals per base and per equipment for the dashboard."""
+
+FIELDS = ("purchases", "transfer_in", "transfer_out", "assigned", "expended")
+
+
+def _empty_totals():
+    return dict.fromkeys(FIELDS, 0)
+
+
+class BalanceLedger:
+    """Aggregate store updated in O(1) by every write.
+
+    ``bases[base_id]`` holds the base-wide totals and
+    ``equipment[base_id][equipment_id]`` the same totals split by equipment.
+    """
+
+    def __init__(self):
+        self.bases = {}
+        self.equipment = {}
+
+    def _add(self, base_id, equipment_id, field, quantity):
+        totals = self.bases.get(base_id)
+        if totals is None:
+            totals = self.bases[base_id] = _empty_totals()
+        totals[field] += quantity
+
+        per_base = self.equipment.setdefault(base_id, {})
+        eq_totals = per_base.get(equipment_id)
+        if eq_totals is None:
+            eq_totals = per_base[equipment_id] = _empty_totals()
+        eq_totals[field] += quantity
+
+    def record_purchase(self, record):
+        self._add(record["base_id"], record["equipment_id"], "purchases", record["quantity"])
+
+    def record_transfer(self, record):
+        self._add(record["from_base_id"], record["equipment_id"], "transfer_out", record["quantity"])
+        self._add(record["to_base_id"], record["equipment_id"], "transfer_in", record["quantity"])
+
+    def record_assignment(self, record):
+        self._add(record["base_id"], record["equipment_id"], "assigned", record["quantity"])
+
+    def record_expenditure(self, record):
+        self._add(record["base_id"], record["equipment_id"], "expended", record["quantity"])
+
+    def base_totals(self, base_id):
+        """Return a copy of the totals for a base (all zeros if unseen)"""
+        totals = self.bases.get(base_id)
+        return dict(totals) if totals else _empty_totals()
+
+    def equipment_totals(self, base_id):
+        """Return a copy of the per-equipment totals for a base"""
+        # list() first: a concurrent write may add an equipment key meanwhile
+        return {eq_id: dict(t) for eq_id, t in list(self.equipment.get(base_id, {}).items())}
+
+    def clear(self):
+        self.bases.clear()
+        self.equipment.clear()
+
+    def rebuild(self, purchases, transfers, assignments, expended):
+        """Recompute every total from the raw transaction stores"""
+        self.clear()
+        sources = (
+            (purchases, "base_id", "purchases"),
+            (transfers, "from_base_id", "transfer_out"),
+            (transfers, "to_base_id", "transfer_in"),
+            (assignments, "base_id", "assigned"),
+            (expended, "base_id", "expended"),
+        )
+        for records, base_field, field in sources:
+            for (base_id, equipment_id), quantity in _grouped(records, base_field).items():
+                self._add(base_id, equipment_id, field, quantity)
+
+
+def _grouped(records, base_field):
+    """``{(base, equipment): quantity}``, vectorized when the store supports it"""
+    if hasattr(records, "group_sum"):
+        return records.group_sum((base_field, "equipment_id"))
+    totals = {}
+    for r in records:
+        key = (r[base_field], r["equipment_id"])
+        totals[key] = totals.get(key, 0) + r["quantity"]
+    return totals
+
+
+def check_ledger(ledger, purchases, transfers, assignments, expended):
+    """Compare ``ledger`` against a fresh rebuild and list every difference"""
+    fresh = BalanceLedger()
+    fresh.rebuild(purchases, transfers, assignments, expended)
+
+    mismatches = []
+    for base_id in set(ledger.equipment) | set(fresh.equipment):
+        current = ledger.equipment.get(base_id, {})
+        expected = fresh.equipment.get(base_id, {})
+        for eq_id in set(current) | set(expected):
+            have = current.get(eq_id) or _empty_totals()
+            want = expected.get(eq_id) or _empty_totals()
+            for field in FIELDS:
+                if have[field] != want[field]:
+                    mismatches.append({
+                        "base_id": base_id,
+                        "equipment_id": eq_id,
+                        "field": field,
+                        "ledger": have[field],
+                        "expected": want[field],
+                    })
+    return fresh, mismatches
@@ -1,12 +1,46 @@
 # backend/app/main.py
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from pydantic import BaseModel, Field, ValidationError
 from typing import List, Optional
-from datetime import datetime
+from datetime import date, datetime, timedelta
+from bisect import bisect_right
+from contextlib import asynccontextmanager
+from itertools import groupby
+import atexit
 import json
+import sys
+import threading
+import time
 
-app = FastAPI(title="Military Asset Management System")
+from app.cache import ALL_BASES, ResponseCache, etag_matches
+from app.events import EventHub
+from app.jobs import JobLimitReached, job_events, job_queue, job_result, job_status, owned_job, too_many_jobs
+from app.metrics import SlowRequestProfiler, TimingMiddleware, registry, span, timed
+from app.ledger import FIELDS, BalanceLedger, check_ledger
+from app.store import RecordStore, StripedLock
+from app.columnar import BUCKETS, ColumnarStore, day_date
+from app.config import settings
+from app.security import Principal, TokenCache, create_access_token, decode_token, user_claims
+from app.state import (
+	InsufficientStock, LocalState, ReplicaSyncMiddleware, SharedState, apply_stock_deltas,
+	parse_address, record_bases, state_authkey, stock_deltas, stock_shortfall,
+)
+from app.reports import EXPORT_FORMATS, MEDIA_TYPES, PARQUET_AVAILABLE, encode_rows
+from app.responses import FastJSONResponse, dumps
+from app.routers import include_routers
+from app.wal import WriteAheadLog
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+	"""Build the heavy state before serving instead of at import (see startup)"""
+	await run_in_threadpool(startup)
+	yield
+	shutdown()
+
+app = FastAPI(title="Military Asset Management System", default_response_class=FastJSONResponse, lifespan=lifespan)
 
 # CORS Configuration
 app.add_middleware(
@@ -17,6 +51,13 @@ app.add_middleware(
 	allow_headers=["*"],
 )
 
+# Per-route latency histograms and spans, scraped at /metrics
+profiler = None
+if settings.METRICS_ENABLED:
+	if settings.PROFILE_SLOW_REQUEST_MS > 0:
+		profiler = SlowRequestProfiler(settings.PROFILE_SLOW_REQUEST_MS / 1000, settings.PROFILE_INTERVAL_MS / 1000)
+	app.add_middleware(TimingMiddleware, profiler=profiler)
+
 # ==================== In-Memory Database ====================
 users_db = {
 	"admin1": {"password": "admin123", "role": "admin", "base_id": None, "name": "Admin User"},
@@ -40,12 +81,36 @@ equipment_db = [
 
 # In-memory storage for transactions
 stock_data = {}
-purchases_db = []
-transfers_db = []
-assignments_db = []
-expended_db = []
+def make_store(fields, indexed_fields, date_field, str_fields=()):
+	"""Columnar store by default; settings.STORE_BACKEND = "rows" keeps dict rows"""
+	if settings.STORE_BACKEND == "rows":
+		return RecordStore(indexed_fields, date_field=date_field, fields=fields)
+	return ColumnarStore(fields, indexed_fields, date_field=date_field, str_fields=str_fields)
+
+purchases_db = make_store(
+	("id", "base_id", "equipment_id", "quantity", "purchase_date"),
+	("base_id", "equipment_id"), "purchase_date")
+transfers_db = make_store(
+	("id", "from_base_id", "to_base_id", "equipment_id", "quantity", "transfer_date"),
+	("from_base_id", "to_base_id", "equipment_id"), "transfer_date")
+assignments_db = make_store(
+	("id", "base_id", "equipment_id", "personnel_name", "quantity", "assigned_date"),
+	("base_id", "equipment_id"), "assigned_date", str_fields=("personnel_name",))
+expended_db = make_store(
+	("id", "base_id", "equipment_id", "quantity", "expended_date"),
+	("base_id", "equipment_id"), "expended_date")
+
+# Verified tokens -> Principal, so repeat requests skip decoding
+token_cache = TokenCache(settings.TOKEN_CACHE_SIZE, settings.TOKEN_CACHE_TTL_SECONDS)
+
+# Running totals kept in step with the stores above by the create_* handlers
+ledger = BalanceLedger()
 
 # ==================== Pydantic Models ====================
+# Movements are positive and fit the SQL Integer columns; totals over many
+# rows then stay far inside the int64 sums the columnar store computes
+MAX_QUANTITY = 2 ** 31 - 1
+
 class LoginRequest(BaseModel):
 	username: str
 	password: str
@@ -58,45 +123,69 @@ class LoginResponse(BaseModel):
 class PurchaseCreate(BaseModel):
 	base_id: int
 	equipment_id: int
-	quantity: int
+	quantity: int = Field(gt=0, le=MAX_QUANTITY)
 	purchase_date: Optional[str] = None
 
 class TransferCreate(BaseModel):
 	from_base_id: int
 	to_base_id: int
 	equipment_id: int
-	quantity: int
+	quantity: int = Field(gt=0, le=MAX_QUANTITY)
 	transfer_date: Optional[str] = None
 
 class AssignmentCreate(BaseModel):
 	base_id: int
 	equipment_id: int
 	personnel_name: str
-	quantity: int
+	quantity: int = Field(gt=0, le=MAX_QUANTITY)
 	assigned_date: Optional[str] = None
 
 class ExpenditureCreate(BaseModel):
 	base_id: int
 	equipment_id: int
-	quantity: int
+	quantity: int = Field(gt=0, le=MAX_QUANTITY)
 	expended_date: Optional[str] = None
 
+class JobCreate(BaseModel):
+	kind: str  # "rollup", "dashboard" or "history"
+	table: Optional[str] = None  # rollup: balances/flows; history: purchases/transfers/assignments/expended
+	base_id: Optional[int] = None
+	equipment_id: Optional[int] = None
+	start_date: Optional[str] = None
+	end_date: Optional[str] = None
+	by_equipment: bool = False
+	format: str = "json"
+
 # ==================== Helper Functions ====================
+@timed("auth")
 def verify_token(token: str):
-	"""Decode and verify JWT token (simplified)"""
+	"""Resolve a token to the caller's Principal, caching verified tokens"""
 	if not token:
 		raise HTTPException(status_code=401, detail="Invalid token")
 	
-	# Handle both old and new token formats
-	username = None
-	if token.startswith("demo-token-"):
+	principal = token_cache.get(token)
+	if principal is not None:
+		return principal
+	
+	# Signed tokens from /api/auth/token; unsigned "demo-token-<username>"
+	# and bare-username tokens only with settings.DEMO_TOKENS
+	exp = None
+	if token.count(".") == 2:
+		payload = decode_token(token)
+		if not payload:
+			raise HTTPException(status_code=401, detail="Invalid token")
+		username, exp = payload.get("sub"), payload.get("exp")
+	elif settings.DEMO_TOKENS:
 		username = token.replace("demo-token-", "")
 	else:
-		username = token.replace("demo-token-", "")
+		raise HTTPException(status_code=401, detail="Invalid token")
 	
 	if username not in users_db:
 		raise HTTPException(status_code=401, detail="User not found")
-	return users_db[username]
+	user = users_db[username]
+	principal = Principal(username, user["role"], user["base_id"], user["name"])
+	token_cache.put(token, principal, exp)
+	return principal
 
 def check_rbac(user: dict, required_role: str = None, base_id: int = None):
 	"""Check role-based access control"""
@@ -105,6 +194,50 @@ def check_rbac(user: dict, required_role: str = None, base_id: int = None):
 	if base_id and user["role"] == "base_commander" and user["base_id"] != base_id:
 		raise HTTPException(status_code=403, detail="Access denied for this base")
 
+MAX_PAGE_SIZE = 1000
+STREAM_CHUNK_ROWS = 500
+
+def _ndjson_chunks(records, start):
+	"""Yield NDJSON lines in chunks without building the whole body"""
+	buf = []
+	for i in range(start, len(records)):
+		buf.append(dumps(records[i]))
+		if len(buf) >= STREAM_CHUNK_ROWS:
+			yield b"\n".join(buf) + b"\n"
+			buf = []
+	if buf:
+		yield b"\n".join(buf) + b"\n"
+
+def check_date_filters(*values):
+	"""400 on date filters that are not ISO 'YYYY-MM-DD[...]' strings"""
+	for value in values:
+		if value is None:
+			continue
+		try:
+			datetime.fromisoformat(value[:10])
+		except ValueError:
+			raise HTTPException(status_code=400, detail=f"Invalid date filter: {value}")
+
+def paginate(records, limit: int = None, after_id: int = None, stream: bool = False):
+	"""Apply keyset pagination to id-ordered records, or stream them as NDJSON.
+
+	Rows are plain JSON types, so the page is encoded directly and FastAPI's
+	jsonable_encoder pass is skipped.
+	"""
+	start = bisect_right(records, after_id, key=lambda r: r["id"]) if after_id else 0
+	
+	if stream:
+		return StreamingResponse(_ndjson_chunks(records, start), media_type="application/x-ndjson")
+	
+	if limit is None:
+		return FastJSONResponse(records[start:])
+	
+	page = records[start:start + limit]
+	headers = {}
+	if start + limit < len(records):
+		headers["X-Next-After-Id"] = str(page[-1]["id"])
+	return FastJSONResponse(page, headers=headers)
+
 def initialize_stock():
 	"""Initialize stock for bases"""
 	for base in bases_db:
@@ -113,7 +246,348 @@ def initialize_stock():
 			for eq in equipment_db:
 				stock_data[base["id"]][eq["id"]] = {"opening": 100, "current": 100}
 
-initialize_stock()
+# ==================== Writes ====================
+# table name -> (store, ledger hook); table names are also the WAL tags
+TABLES = {
+	"purchases": (purchases_db, ledger.record_purchase),
+	"transfers": (transfers_db, ledger.record_transfer),
+	"assignments": (assignments_db, ledger.record_assignment),
+	"expended": (expended_db, ledger.record_expenditure),
+}
+
+# Per-base state (ledger, stock) is guarded by a stripe of base_locks, so
+# writes for different bases never wait on each other
+base_locks = StripedLock(settings.STORE_LOCK_STRIPES)
+
+def check_stock(deltas):
+	"""Reject the batch if any net debit exceeds current stock (caller holds the base stripes)"""
+	shortfall = stock_shortfall(stock_data, deltas)
+	if shortfall:
+		raise InsufficientStock(shortfall)
+
+def adjust_stock(table: str, record: dict):
+	apply_stock_deltas(stock_data, stock_deltas(table, record))
+
+def apply_record(table: str, record: dict):
+	"""Add a record that already has an id to its store, the ledger and stock"""
+	store, ledger_hook = TABLES[table]
+	store.append(record)
+	ledger_hook(record)
+	adjust_stock(table, record)
+
+# ==================== Response Cache ====================
+response_cache = ResponseCache(settings.RESPONSE_CACHE_SIZE)
+
+def cached_response(request: Request, key: tuple, bases: tuple, build, encode, media_type: str, headers: dict = None):
+	"""``encode(build())``, reused until a write touches one of ``bases``.
+
+	Every response carries an ETag; a matching If-None-Match gets a bodiless 304.
+	"""
+	entry = response_cache.get(key, bases)
+	if entry is None:
+		versions = response_cache.versions(bases)
+		content = build()
+		with span("serialize"):
+			body = encode(content)
+		entry = response_cache.put(key, versions, body)
+	headers = {**(headers or {}), "ETag": entry.etag, "Cache-Control": "no-cache"}
+	if etag_matches(request.headers.get("if-none-match"), entry.etag):
+		return Response(status_code=304, headers=headers)
+	return Response(entry.body, media_type=media_type, headers=headers)
+
+def cached_json(request: Request, key: tuple, bases: tuple, build):
+	"""JSON-encoded ``build()`` result through the response cache"""
+	return cached_response(request, key, bases, build, dumps, "application/json")
+
+# ==================== Live Events ====================
+event_hub = EventHub(settings.EVENT_QUEUE_SIZE)
+
+EVENT_NAMES = {"purchases": "purchase", "transfers": "transfer", "assignments": "assignment", "expended": "expenditure"}
+
+def publish_records(table: str, records: list):
+	"""Push recorded movements and the per-base dashboard deltas they cause"""
+	if not len(event_hub):
+		return
+	deltas = {}
+	for record in records:
+		event_hub.publish(EVENT_NAMES[table], record, record_bases(table, record))
+		for field, source, base_field in MOVEMENT_SOURCES:
+			if source == table:
+				delta = deltas.setdefault(record[base_field], dict.fromkeys(FIELDS, 0))
+				delta[field] += record["quantity"]
+	for base_id, delta in deltas.items():
+		metrics = balance_metrics(0, delta)
+		del metrics["opening_balance"]
+		event_hub.publish("dashboard", {"base_id": base_id, **metrics}, (base_id,))
+
+def commit_local(table: str, records: list):
+	"""Check stock, assign ids, log (in durable mode) and apply a batch of new records.
+
+	Either every record is applied or, on an overdraw, none is. The batch
+	shares one WAL commit, so bulk writes pay for a single fsync.
+	"""
+	store, ledger_hook = TABLES[table]
+	log = (lambda record: wal.append(table, record)) if wal is not None else None
+	seq = None
+	bases = {b for record in records for b in record_bases(table, record)}
+	with base_locks.hold(*bases):
+		check_stock([d for record in records for d in stock_deltas(table, record)])
+		for record in records:
+			seq = store.insert(record, log)
+			ledger_hook(record)
+			adjust_stock(table, record)
+		response_cache.bump(*bases)
+	if seq is not None:
+		with span("wal"):
+			wal.commit(seq)
+		maybe_compact_wal()
+	publish_records(table, records)
+	return records
+
+def commit_records(table: str, records: list):
+	"""Commit a batch through the state backend; an overdraw is a 400.
+	
+	Every record is checked against the store first, so a value it cannot
+	hold is a 422 before anything is logged or applied.
+	"""
+	store = TABLES[table][0]
+	try:
+		for record in records:
+			store.check(record)
+	except ValueError as exc:
+		raise HTTPException(status_code=422, detail=str(exc))
+	try:
+		return (state_backend or startup()).commit(table, records)
+	except InsufficientStock as exc:
+		raise HTTPException(status_code=400, detail=str(exc))
+
+def purchase_row(purchase: PurchaseCreate):
+	return {
+		"id": None,
+		"base_id": purchase.base_id,
+		"equipment_id": purchase.equipment_id,
+		"quantity": purchase.quantity,
+		"purchase_date": purchase.purchase_date or datetime.now().isoformat(),
+	}
+
+def transfer_row(transfer: TransferCreate):
+	return {
+		"id": None,
+		"from_base_id": transfer.from_base_id,
+		"to_base_id": transfer.to_base_id,
+		"equipment_id": transfer.equipment_id,
+		"quantity": transfer.quantity,
+		"transfer_date": transfer.transfer_date or datetime.now().isoformat(),
+	}
+
+def assignment_row(assignment: AssignmentCreate):
+	return {
+		"id": None,
+		"base_id": assignment.base_id,
+		"equipment_id": assignment.equipment_id,
+		"personnel_name": assignment.personnel_name,
+		"quantity": assignment.quantity,
+		"assigned_date": assignment.assigned_date or datetime.now().isoformat(),
+	}
+
+def expenditure_row(expend: ExpenditureCreate):
+	return {
+		"id": None,
+		"base_id": expend.base_id,
+		"equipment_id": expend.equipment_id,
+		"quantity": expend.quantity,
+		"expended_date": expend.expended_date or datetime.now().isoformat(),
+	}
+
+# ==================== Durability ====================
+# Optional write-ahead log (settings.WAL_DIR); None keeps the store memory-only
+wal = None
+_compacting = threading.Event()
+
+def freeze_state():
+	"""Cut the state for a snapshot (caller holds every base stripe); returns its dump function.
+
+	The stores are append-only, so their first ``len`` rows stay as they are
+	after the stripes are released; only the small stock table is copied here.
+	"""
+	stock = {str(b): {str(e): dict(v) for e, v in eqs.items()} for b, eqs in stock_data.items()}
+	sizes = {table: len(store) for table, (store, _) in TABLES.items()}
+	def dump_state():
+		"""JSON-ready copy of everything the WAL protects"""
+		return {"stock": stock, "tables": {table: TABLES[table][0][0:n] for table, n in sizes.items()}}
+	return dump_state
+
+def load_state(state: dict):
+	for table, records in state["tables"].items():
+		for record in records:
+			apply_record(table, record)
+	# the snapshot's stock already includes these records
+	stock_data.clear()
+	for b, eqs in state["stock"].items():
+		stock_data[int(b)] = {int(e): v for e, v in eqs.items()}
+
+def compact_wal():
+	"""Snapshot current state and drop the log segments it covers"""
+	try:
+		wal.snapshot(freeze_state, pause=base_locks.hold_all())
+	finally:
+		_compacting.clear()
+
+def maybe_compact_wal():
+	if wal.appends_since_snapshot >= settings.WAL_SNAPSHOT_EVERY and not _compacting.is_set():
+		_compacting.set()
+		threading.Thread(target=compact_wal, name="wal-compact", daemon=True).start()
+
+def open_wal():
+	"""Rebuild memory from the latest snapshot plus the log tail, then start logging"""
+	global wal
+	if not settings.WAL_DIR or settings.STATE_BACKEND == "shared":
+		# with a shared state backend the state server owns the log
+		return
+	log = WriteAheadLog(
+		settings.WAL_DIR,
+		segment_bytes=settings.WAL_SEGMENT_BYTES,
+		fsync_interval=settings.WAL_FSYNC_INTERVAL_MS / 1000,
+		sync_commit=settings.WAL_SYNC_COMMIT,
+	)
+	state, entries = log.recover()
+	if state:
+		load_state(state)
+	for table, record in entries:
+		apply_record(table, record)
+	wal = log
+	atexit.register(log.close)
+
+# ==================== State Backend ====================
+def apply_entries(entries):
+	"""Replay writes ordered by the state server into this worker's stores"""
+	for table, group in groupby(entries, key=lambda entry: entry[0]):
+		records = [record for _, record in group]
+		for record in records:
+			bases = record_bases(table, record)
+			with base_locks.hold(*bases):
+				apply_record(table, record)
+				response_cache.bump(*bases)
+		publish_records(table, records)
+
+def make_state_backend():
+	"""This process alone by default; settings.STATE_BACKEND = "shared" joins the state server"""
+	if settings.STATE_BACKEND == "local":
+		return LocalState(commit_local)
+	if settings.STATE_BACKEND != "shared":
+		raise ValueError(f"Unknown STATE_BACKEND {settings.STATE_BACKEND!r}")
+	shared = SharedState(
+		parse_address(settings.STATE_ADDRESS), state_authkey(settings), apply_entries,
+		poll=settings.STATE_POLL_MS / 1000,
+	)
+	opening = shared.attach({b: {e: v["opening"] for e, v in eqs.items()} for b, eqs in stock_data.items()})
+	stock_data.clear()
+	for base_id, eqs in opening.items():
+		stock_data[base_id] = {eq_id: {"opening": qty, "current": qty} for eq_id, qty in eqs.items()}
+	shared.sync()
+	atexit.register(shared.close)
+	return shared
+
+# ==================== Startup ====================
+# Seeded stock, WAL recovery, the state backend and the SQL routers are set
+# up by the lifespan, or by the first request when no lifespan runs (a
+# mounted sub-app, a bare ASGI call). Scripts that touch the stores directly
+# call startup() first.
+state_backend = None
+_startup_lock = threading.Lock()
+
+def startup():
+	"""Idempotent; returns the state backend"""
+	global state_backend
+	if state_backend is not None:
+		return state_backend
+	with _startup_lock:
+		if state_backend is None:
+			initialize_stock()
+			open_wal()
+			if settings.SQL_ROUTERS:
+				include_routers(app, settings.SQL_ROUTERS, settings.SQL_ROUTERS_PREFIX)
+				# imported here so the in-memory API alone never loads SQLAlchemy
+				from app.deps import prepare_db
+				prepare_db()
+			state_backend = make_state_backend()
+	return state_backend
+
+def shutdown():
+	"""Stop background work and flush the WAL; the process is expected to exit next"""
+	job_queue.shutdown()
+	if state_backend is not None:
+		state_backend.close()
+	if wal is not None:
+		wal.close()
+	# only loaded when SQL_ROUTERS includes a router that hashes passwords
+	deps = sys.modules.get("app.deps")
+	if deps is not None:
+		deps.password_hasher.shutdown()
+
+app.add_middleware(ReplicaSyncMiddleware, startup=startup)
+
+# ==================== Bulk Ingestion ====================
+async def read_bulk_items(request: Request):
+	"""Parse a JSON array or an NDJSON (application/x-ndjson) request body"""
+	body = await request.body()
+	try:
+		if request.headers.get("content-type", "").startswith("application/x-ndjson"):
+			return [json.loads(line) for line in body.splitlines() if line.strip()]
+		items = json.loads(body or b"[]")
+	except ValueError:
+		raise HTTPException(status_code=400, detail="Malformed JSON body")
+	if not isinstance(items, list):
+		raise HTTPException(status_code=400, detail="Expected a JSON array or NDJSON body")
+	return items
+
+def bulk_apply(items: list, model, authorize, table: str, build_row):
+	"""Validate and RBAC-check every item, then apply all of them or none"""
+	started = time.perf_counter()
+	results = []
+	accepted = []
+	for index, raw in enumerate(items):
+		try:
+			item = model.model_validate(raw)
+			authorize(item)
+		except ValidationError as exc:
+			results.append({"index": index, "ok": False, "status": 422,
+				"error": exc.errors(include_url=False, include_context=False)})
+			continue
+		except HTTPException as exc:
+			results.append({"index": index, "ok": False, "status": exc.status_code, "error": exc.detail})
+			continue
+		accepted.append(item)
+		results.append({"index": index, "ok": True})
+	
+	failed = [r for r in results if not r["ok"]]
+	if failed:
+		status = 422 if any(r["status"] == 422 for r in failed) else failed[0]["status"]
+		return FastJSONResponse(status_code=status, content={
+			"ok": False,
+			"message": f"{len(failed)} of {len(items)} items rejected, nothing recorded",
+			"results": results,
+		})
+	
+	records = commit_records(table, [build_row(item) for item in accepted])
+	for record, result in zip(records, results):
+		result["id"] = record["id"]
+	
+	elapsed = time.perf_counter() - started
+	return {
+		"ok": True,
+		"message": f"{len(accepted)} items recorded",
+		"results": results,
+		"elapsed_ms": round(elapsed * 1000, 3),
+		"items_per_sec": round(len(accepted) / elapsed, 1) if elapsed else None,
+	}
+
+def bulk_authorizer(token: str, required_role: str = None, base_field: str = "base_id"):
+	"""Verify the token once and return a per-item RBAC check"""
+	if not token:
+		return lambda item: None
+	user = verify_token(token)
+	return lambda item: check_rbac(user, required_role, getattr(item, base_field))
 
 # ==================== Authentication ====================
 @app.post("/api/auth/token", response_model=LoginResponse)
@@ -126,7 +600,7 @@ def login(form_data: LoginRequest):
 	if user["password"] != form_data.password:
 		raise HTTPException(status_code=400, detail="Invalid credentials")
 	
-	token = f"demo-token-{form_data.username}"
+	token = create_access_token(user_claims(form_data.username, user["role"], user["base_id"]))
 	return {
 		"access_token": token,
 		"token_type": "bearer",
@@ -139,53 +613,420 @@ def login(form_data: LoginRequest):
 	}
 
 # ==================== Dashboard ====================
+# (ledger field, table, column holding the base) for every movement kind
+MOVEMENT_SOURCES = (
+	("purchases", "purchases", "base_id"),
+	("transfer_in", "transfers", "to_base_id"),
+	("transfer_out", "transfers", "from_base_id"),
+	("assigned", "assignments", "base_id"),
+	("expended", "expended", "base_id"),
+)
+
+def equipment_movements(base_id, start_date=None, end_date=None, bucket=None, equipment_id=None):
+	"""Movement totals of a base keyed by equipment_id, or (equipment_id, bucket day)"""
+	if not (start_date or end_date or bucket or equipment_id):
+		return ledger.equipment_totals(base_id)
+	result = {}
+	for field, table, base_field in MOVEMENT_SOURCES:
+		store = TABLES[table][0]
+		sums = store.group_sum(
+			("equipment_id",), start_date=start_date, end_date=end_date, bucket=bucket,
+			equipment_id=equipment_id, **{base_field: base_id},
+		)
+		for key, quantity in sums.items():
+			key = key if bucket else key[0]
+			totals = result.get(key)
+			if totals is None:
+				totals = result[key] = dict.fromkeys(FIELDS, 0)
+			totals[field] += quantity
+	return result
+
+def balance_metrics(opening, totals):
+	"""Dashboard figures from an opening balance and movement totals"""
+	net_movement = totals["purchases"] + totals["transfer_in"] - totals["transfer_out"]
+	return {
+		"opening_balance": opening,
+		**totals,
+		"net_movement": net_movement,
+		"closing_balance": opening + net_movement - totals["assigned"] - totals["expended"],
+	}
+
+def opening_balances(base_id, start_date=None):
+	"""Per-equipment balance of a base at the start of ``start_date``"""
+	# list() first: a concurrent write may add an equipment key meanwhile
+	opening = {eq_id: stock["opening"] for eq_id, stock in list(stock_data.get(base_id, {}).items())}
+	if start_date:
+		day_before = (date.fromisoformat(start_date[:10]) - timedelta(days=1)).isoformat()
+		for eq_id, totals in equipment_movements(base_id, end_date=day_before).items():
+			opening[eq_id] = balance_metrics(opening.get(eq_id, 0), totals)["closing_balance"]
+	return opening
+
 @app.get("/api/dashboard")
 def get_dashboard(
 	base_id: int = 1,
 	start_date: Optional[str] = None,
 	end_date: Optional[str] = None,
-	token: str = None
+	by_equipment: bool = False,
+	token: str = None,
+	request: Request = None
 ):
-	"""Get dashboard metrics for a base"""
+	"""Get dashboard metrics for a base, optionally split by equipment type"""
+	role = None
 	if token:
 		user = verify_token(token)
 		check_rbac(user, base_id=base_id)
+		role = user["role"]
+	check_date_filters(start_date, end_date)
 	
-	# Calculate metrics
-	opening = sum(stock["opening"] for stock in stock_data.get(base_id, {}).values())
+	key = ("dashboard", base_id, start_date, end_date, by_equipment, role)
+	return cached_json(request, key, (base_id,), lambda: dashboard_metrics(base_id, start_date, end_date, by_equipment))
+
+def dashboard_metrics(base_id, start_date, end_date, by_equipment):
+	opening = opening_balances(base_id, start_date)
+	if not (start_date or end_date or by_equipment):
+		# the ledger keeps base-wide totals too, no per-equipment pass needed
+		return {"base_id": base_id, **balance_metrics(sum(opening.values()), ledger.base_totals(base_id))}
+	movements = equipment_movements(base_id, start_date, end_date)
 	
-	purchases = sum(p["quantity"] for p in purchases_db if p["base_id"] == base_id)
-	transfer_in = sum(t["quantity"] for t in transfers_db if t["to_base_id"] == base_id)
-	transfer_out = sum(t["quantity"] for t in transfers_db if t["from_base_id"] == base_id)
-	assigned = sum(a["quantity"] for a in assignments_db if a["base_id"] == base_id)
-	expended = sum(e["quantity"] for e in expended_db if e["base_id"] == base_id)
+	totals = dict.fromkeys(FIELDS, 0)
+	for eq_totals in movements.values():
+		for field in FIELDS:
+			totals[field] += eq_totals[field]
 	
-	net_movement = purchases + transfer_in - transfer_out
-	closing = opening + net_movement - assigned - expended
+	result = {"base_id": base_id, **balance_metrics(sum(opening.values()), totals)}
+	if by_equipment:
+		result["equipment"] = [
+			{"equipment_id": eq_id, **balance_metrics(opening.get(eq_id, 0), movements.get(eq_id) or dict.fromkeys(FIELDS, 0))}
+			for eq_id in sorted(set(opening) | set(movements))
+		]
+	return result
+
+@app.get("/api/dashboard/timeseries")
+def get_dashboard_timeseries(
+	base_id: int = 1,
+	start_date: Optional[str] = None,
+	end_date: Optional[str] = None,
+	bucket: str = Query("day", pattern="^(" + "|".join(BUCKETS) + ")$"),
+	equipment_id: Optional[int] = None,
+	token: str = None,
+	request: Request = None
+):
+	"""Per-equipment movement of a base bucketed by day, week or month"""
+	role = None
+	if token:
+		user = verify_token(token)
+		check_rbac(user, base_id=base_id)
+		role = user["role"]
+	check_date_filters(start_date, end_date)
 	
+	key = ("timeseries", base_id, start_date, end_date, bucket, equipment_id, role)
+	return cached_json(request, key, (base_id,), lambda: movement_series(base_id, start_date, end_date, bucket, equipment_id))
+
+def movement_series(base_id, start_date, end_date, bucket, equipment_id):
+	movements = equipment_movements(base_id, start_date, end_date, bucket, equipment_id)
+	series = {}
+	for (eq_id, day) in sorted(movements):
+		totals = movements[(eq_id, day)]
+		series.setdefault(eq_id, []).append({
+			"period": day_date(day).isoformat(),
+			**totals,
+			"net_movement": totals["purchases"] + totals["transfer_in"] - totals["transfer_out"],
+		})
 	return {
 		"base_id": base_id,
-		"opening_balance": opening,
-		"purchases": purchases,
-		"transfer_in": transfer_in,
-		"transfer_out": transfer_out,
-		"assigned": assigned,
-		"expended": expended,
-		"net_movement": net_movement,
-		"closing_balance": closing,
+		"bucket": bucket,
+		"start_date": start_date,
+		"end_date": end_date,
+		"series": [{"equipment_id": eq_id, "points": points} for eq_id, points in series.items()],
+	}
+
+# ==================== Cross-base Rollup ====================
+ROLLUP_COLUMNS = ("base_id", "equipment_id", "opening_balance", *FIELDS, "net_movement", "closing_balance")
+FLOW_COLUMNS = ("from_base_id", "to_base_id", "equipment_id", "quantity")
+
+def rollup_movements(start_date=None, end_date=None):
+	"""(totals by (base_id, equipment_id), transfer quantity by (from, to, equipment_id)).
+
+	Without a date range the totals come straight from the ledger; with one,
+	every table is grouped once and transfers feed both sides from the flows.
+	"""
+	if not (start_date or end_date):
+		# one consistent cut, so ledger and flows reconcile under concurrent writes;
+		# the transfer scan runs over the cut's rows after writers resume
+		with base_locks.hold_all():
+			transfers = len(transfers_db)
+			movements = {(b, e): dict(t) for b, eqs in ledger.equipment.items() for e, t in eqs.items()}
+		flows = transfers_db.group_sum(("from_base_id", "to_base_id", "equipment_id"), upto=transfers)
+		return movements, flows
+	
+	flows = transfers_db.group_sum(("from_base_id", "to_base_id", "equipment_id"), start_date=start_date, end_date=end_date)
+	movements = {}
+	def add(key, field, quantity):
+		totals = movements.get(key)
+		if totals is None:
+			totals = movements[key] = dict.fromkeys(FIELDS, 0)
+		totals[field] += quantity
+	for field, table, base_field in MOVEMENT_SOURCES:
+		if table == "transfers":
+			continue
+		sums = TABLES[table][0].group_sum((base_field, "equipment_id"), start_date=start_date, end_date=end_date)
+		for key, quantity in sums.items():
+			add(key, field, quantity)
+	for (from_id, to_id, eq_id), quantity in flows.items():
+		add((from_id, eq_id), "transfer_out", quantity)
+		add((to_id, eq_id), "transfer_in", quantity)
+	return movements, flows
+
+def stock_rollup(start_date=None, end_date=None):
+	"""Every base x equipment balance, per-base totals, transfer flows and their reconciliation"""
+	opening = {(b, e): s["opening"] for b, eqs in list(stock_data.items()) for e, s in list(eqs.items())}
+	if start_date:
+		day_before = (date.fromisoformat(start_date[:10]) - timedelta(days=1)).isoformat()
+		for key, totals in rollup_movements(end_date=day_before)[0].items():
+			opening[key] = balance_metrics(opening.get(key, 0), totals)["closing_balance"]
+	movements, flows = rollup_movements(start_date, end_date)
+	
+	balances = []
+	base_opening, base_totals = {}, {}
+	for base_id, eq_id in sorted(set(opening) | set(movements)):
+		totals = movements.get((base_id, eq_id)) or dict.fromkeys(FIELDS, 0)
+		balances.append({"base_id": base_id, "equipment_id": eq_id, **balance_metrics(opening.get((base_id, eq_id), 0), totals)})
+		base_opening[base_id] = base_opening.get(base_id, 0) + opening.get((base_id, eq_id), 0)
+		summed = base_totals.setdefault(base_id, dict.fromkeys(FIELDS, 0))
+		for field in FIELDS:
+			summed[field] += totals[field]
+	
+	flow_rows, pairs = [], {}
+	for (from_id, to_id, eq_id), quantity in sorted(flows.items()):
+		flow_rows.append({"from_base_id": from_id, "to_base_id": to_id, "equipment_id": eq_id, "quantity": quantity})
+		pairs[(from_id, to_id)] = pairs.get((from_id, to_id), 0) + quantity
+	
+	# every transfer-out should land as a transfer-in at a known base
+	known = {base["id"] for base in bases_db}
+	unknown = sorted({b for pair in pairs for b in pair} - known)
+	transfer_out = sum(t["transfer_out"] for t in base_totals.values())
+	transfer_in = sum(t["transfer_in"] for t in base_totals.values())
+	flow_total = sum(pairs.values())
+	return {
+		"start_date": start_date,
+		"end_date": end_date,
+		"bases": [{"base_id": b, **balance_metrics(base_opening[b], t)} for b, t in base_totals.items()],
+		"balances": balances,
+		"flows": flow_rows,
+		"pairs": [{"from_base_id": f, "to_base_id": t, "quantity": q} for (f, t), q in pairs.items()],
+		"reconciliation": {
+			"transfer_out": transfer_out,
+			"transfer_in": transfer_in,
+			"flow_total": flow_total,
+			"balanced": transfer_out == transfer_in == flow_total,
+			"unknown_bases": unknown,
+			"unmatched_quantity": sum(q for (f, t), q in pairs.items() if f not in known or t not in known),
+		},
+	}
+
+@app.get("/api/dashboard/rollup")
+def get_dashboard_rollup(
+	start_date: Optional[str] = None,
+	end_date: Optional[str] = None,
+	format: str = Query("json", pattern="^(" + "|".join(EXPORT_FORMATS) + ")$"),
+	table: str = Query("balances", pattern="^(balances|flows)$"),
+	token: str = None,
+	request: Request = None
+):
+	"""All-bases balances and transfer flows; CSV/Parquet export one table for audits"""
+	if token:
+		user = verify_token(token)
+		check_rbac(user, "admin")
+	check_date_filters(start_date, end_date)
+	
+	key = ("rollup", start_date, end_date, format, table)
+	if format == "json":
+		return cached_json(request, key, (ALL_BASES,), lambda: stock_rollup(start_date, end_date))
+	if format == "parquet" and not PARQUET_AVAILABLE:
+		raise HTTPException(status_code=501, detail="Parquet export needs pyarrow")
+	
+	columns = ROLLUP_COLUMNS if table == "balances" else FLOW_COLUMNS
+	period = f"{(start_date or 'start')[:10]}_{(end_date or 'now')[:10]}"
+	return cached_response(
+		request, key, (ALL_BASES,),
+		lambda: stock_rollup(start_date, end_date)[table],
+		lambda rows: encode_rows(format, rows, columns),
+		MEDIA_TYPES[format],
+		{"Content-Disposition": f'attachment; filename="rollup-{table}-{period}.{format}"'},
+	)
+
+@app.get("/api/dashboard/consistency")
+def check_dashboard_consistency(repair: bool = False, token: str = None):
+	"""Rebuild the dashboard ledger from the raw lists and report differences"""
+	if token:
+		user = verify_token(token)
+		check_rbac(user, "admin")
+	
+	with base_locks.hold_all():
+		fresh, mismatches = check_ledger(ledger, purchases_db, transfers_db, assignments_db, expended_db)
+		if repair and mismatches:
+			ledger.bases, ledger.equipment = fresh.bases, fresh.equipment
+			response_cache.clear()
+	
+	return {
+		"consistent": not mismatches,
+		"repaired": bool(repair and mismatches),
+		"mismatches": mismatches,
 	}
 
+@app.get("/api/events")
+async def stream_events(base_id: Optional[int] = None, token: str = None):
+	"""Server-sent events: each recorded movement plus per-base dashboard deltas"""
+	bases = {base_id} if base_id else None
+	if token:
+		user = verify_token(token)
+		if user["role"] == "base_commander":
+			check_rbac(user, base_id=base_id)
+			bases = {user["base_id"]}
+	
+	return StreamingResponse(
+		event_hub.stream(bases, settings.EVENT_HEARTBEAT_SECONDS),
+		media_type="text/event-stream",
+		headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+	)
+
+# ==================== Background Jobs ====================
+# Heavy reports run on app.jobs.job_queue; the request only validates,
+# checks access and returns a job id to poll, stream and download
+JOB_FORMATS = {
+	"rollup": ("json", "csv", "parquet"),
+	"dashboard": ("json",),
+	"history": ("json", "ndjson", "csv", "parquet"),
+}
+
+def history_rows(table, base_id=None, equipment_id=None, start_date=None, end_date=None):
+	"""Records of one table, filtered like the list endpoints"""
+	store = TABLES[table][0]
+	if table != "transfers":
+		return store.find(base_id=base_id, equipment_id=equipment_id, start_date=start_date, end_date=end_date)
+	if not base_id:
+		return store.find(equipment_id=equipment_id, start_date=start_date, end_date=end_date)
+	rows = store.find_either(("from_base_id", "to_base_id"), base_id, start_date, end_date)
+	return [r for r in rows if r["equipment_id"] == equipment_id] if equipment_id else rows
+
+def export_body(fmt, content=None, rows=None, columns=()):
+	if fmt == "json":
+		return dumps(content if rows is None else list(rows))
+	if fmt == "ndjson":
+		return b"".join(_ndjson_chunks(rows, 0))
+	return encode_rows(fmt, rows, columns)
+
+def job_builder(spec: JobCreate):
+	"""The job's callable: ``() -> (body, media_type, filename)``"""
+	period = f"{(spec.start_date or 'start')[:10]}_{(spec.end_date or 'now')[:10]}"
+	media_type = "application/x-ndjson" if spec.format == "ndjson" else MEDIA_TYPES[spec.format]
+	if spec.kind == "rollup":
+		table = spec.table or "balances"
+		columns = ROLLUP_COLUMNS if table == "balances" else FLOW_COLUMNS
+		def build():
+			rollup = stock_rollup(spec.start_date, spec.end_date)
+			if spec.format == "json":
+				return export_body("json", rollup), media_type, f"rollup-{period}.json"
+			return export_body(spec.format, rows=rollup[table], columns=columns), media_type, f"rollup-{table}-{period}.{spec.format}"
+	elif spec.kind == "dashboard":
+		def build():
+			content = dashboard_metrics(spec.base_id, spec.start_date, spec.end_date, spec.by_equipment)
+			return export_body("json", content), media_type, f"dashboard-{spec.base_id}-{period}.json"
+	else:
+		def build():
+			rows = history_rows(spec.table, spec.base_id, spec.equipment_id, spec.start_date, spec.end_date)
+			return export_body(spec.format, rows=rows, columns=TABLES[spec.table][0].fields), media_type, f"{spec.table}-{period}.{spec.format}"
+	return build
+
+def check_job_spec(spec: JobCreate, user):
+	"""400/403/501 before queueing, so a job only fails for unexpected reasons"""
+	if spec.kind not in JOB_FORMATS:
+		raise HTTPException(status_code=400, detail=f"Unknown job kind: {spec.kind}")
+	if spec.format not in JOB_FORMATS[spec.kind]:
+		raise HTTPException(status_code=400, detail=f"{spec.kind} jobs export {', '.join(JOB_FORMATS[spec.kind])}")
+	if spec.format == "parquet" and not PARQUET_AVAILABLE:
+		raise HTTPException(status_code=501, detail="Parquet export needs pyarrow")
+	check_date_filters(spec.start_date, spec.end_date)
+	if spec.kind == "rollup":
+		if spec.table not in (None, "balances", "flows"):
+			raise HTTPException(status_code=400, detail="rollup table is balances or flows")
+		if user:
+			check_rbac(user, "admin")
+	elif spec.kind == "dashboard":
+		spec.base_id = spec.base_id or 1
+		if user:
+			check_rbac(user, base_id=spec.base_id)
+	else:
+		if spec.table not in TABLES:
+			raise HTTPException(status_code=400, detail=f"history table is one of {', '.join(TABLES)}")
+		if user and user["role"] == "base_commander":
+			spec.base_id = user["base_id"]
+
+def job_caller(token):
+	"""(owner, is_admin) of a jobs request"""
+	if not token:
+		return "anonymous", False
+	user = verify_token(token)
+	return user["username"], user["role"] == "admin"
+
+def job_links(request: Request, job):
+	return job_status(job, str(request.url_for("get_job_result", job_id=job.id))) | {
+		"status_url": str(request.url_for("get_job", job_id=job.id)),
+		"events_url": str(request.url_for("stream_job_events", job_id=job.id)),
+	}
+
+@app.post("/api/jobs", status_code=202)
+def submit_job(spec: JobCreate, request: Request, token: str = None):
+	"""Queue a report or export; poll, stream or download it under /api/jobs/{id}"""
+	user = verify_token(token) if token else None
+	check_job_spec(spec, user)
+	owner = user["username"] if user else "anonymous"
+	try:
+		job = job_queue.submit(owner, spec.kind, job_builder(spec), spec.model_dump(exclude_none=True))
+	except JobLimitReached as exc:
+		raise too_many_jobs(exc)
+	return FastJSONResponse(job_links(request, job), status_code=202)
+
+@app.get("/api/jobs")
+def list_jobs(request: Request, token: str = None):
+	"""The caller's jobs (every job for admins), oldest first"""
+	owner, admin = job_caller(token)
+	return [job_links(request, job) for job in job_queue.jobs(None if admin else owner)]
+
+@app.get("/api/jobs/{job_id}")
+def get_job(job_id: str, request: Request, token: str = None):
+	"""Status of one job"""
+	return job_links(request, owned_job(job_queue, job_id, *job_caller(token)))
+
+@app.get("/api/jobs/{job_id}/events")
+def stream_job_events(job_id: str, token: str = None):
+	"""Server-sent ``status`` events until the job finishes"""
+	return job_events(job_queue, owned_job(job_queue, job_id, *job_caller(token)))
+
+@app.get("/api/jobs/{job_id}/result")
+def get_job_result(job_id: str, token: str = None):
+	"""Download a finished job's output"""
+	return job_result(owned_job(job_queue, job_id, *job_caller(token)))
+
+@app.delete("/api/jobs/{job_id}")
+def cancel_job(job_id: str, token: str = None):
+	"""Cancel a waiting job or discard a finished one"""
+	job = owned_job(job_queue, job_id, *job_caller(token))
+	if not job_queue.cancel(job):
+		raise HTTPException(status_code=409, detail="Job is already running")
+	return {"ok": True, "status": job.status}
+
 # ==================== Bases ====================
 @app.get("/api/bases")
-def list_bases():
+def list_bases(request: Request):
 	"""Get all bases"""
-	return bases_db
+	return cached_json(request, ("bases",), (), lambda: bases_db)
 
 # ==================== Equipment ====================
 @app.get("/api/equipment")
-def list_equipment():
+def list_equipment(request: Request):
 	"""Get all equipment types"""
-	return equipment_db
+	return cached_json(request, ("equipment",), (), lambda: equipment_db)
 
 # ==================== Purchases ====================
 @app.post("/api/purchases")
@@ -195,31 +1036,40 @@ def create_purchase(purchase: PurchaseCreate, token: str = None):
 		user = verify_token(token)
 		check_rbac(user, "logistics_officer", purchase.base_id)
 	
-	purchase_record = {
-		"id": len(purchases_db) + 1,
-		"base_id": purchase.base_id,
-		"equipment_id": purchase.equipment_id,
-		"quantity": purchase.quantity,
-		"purchase_date": purchase.purchase_date or datetime.now().isoformat(),
-	}
-	purchases_db.append(purchase_record)
+	purchase_record = commit_records("purchases", [purchase_row(purchase)])[0]
 	return {"ok": True, "message": "Purchase recorded", "data": purchase_record}
 
 @app.get("/api/purchases")
-def list_purchases(base_id: Optional[int] = None, equipment_id: Optional[int] = None, token: str = None):
+def list_purchases(
+	base_id: Optional[int] = None,
+	equipment_id: Optional[int] = None,
+	start_date: Optional[str] = None,
+	end_date: Optional[str] = None,
+	limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+	after_id: Optional[int] = None,
+	stream: bool = False,
+	token: str = None,
+):
 	"""Get purchases with filters"""
 	if token:
 		user = verify_token(token)
 		if user["role"] == "base_commander":
 			base_id = user["base_id"]
 	
-	result = purchases_db
-	if base_id:
-		result = [p for p in result if p["base_id"] == base_id]
-	if equipment_id:
-		result = [p for p in result if p["equipment_id"] == equipment_id]
-	
-	return result
+	check_date_filters(start_date, end_date)
+	result = purchases_db.find(
+		base_id=base_id or None,
+		equipment_id=equipment_id or None,
+		start_date=start_date,
+		end_date=end_date,
+	)
+	return paginate(result, limit, after_id, stream)
+
+@app.post("/api/purchases/bulk")
+async def create_purchases_bulk(request: Request, token: str = None):
+	"""Record many purchases (JSON array or NDJSON) atomically"""
+	items = await read_bulk_items(request)
+	return await run_in_threadpool(bulk_apply, items, PurchaseCreate, bulk_authorizer(token, "logistics_officer"), "purchases", purchase_row)
 
 # ==================== Transfers ====================
 @app.post("/api/transfers")
@@ -229,30 +1079,37 @@ def create_transfer(transfer: TransferCreate, token: str = None):
 		user = verify_token(token)
 		check_rbac(user, "logistics_officer", transfer.from_base_id)
 	
-	transfer_record = {
-		"id": len(transfers_db) + 1,
-		"from_base_id": transfer.from_base_id,
-		"to_base_id": transfer.to_base_id,
-		"equipment_id": transfer.equipment_id,
-		"quantity": transfer.quantity,
-		"transfer_date": transfer.transfer_date or datetime.now().isoformat(),
-	}
-	transfers_db.append(transfer_record)
+	transfer_record = commit_records("transfers", [transfer_row(transfer)])[0]
 	return {"ok": True, "message": "Transfer recorded", "data": transfer_record}
 
 @app.get("/api/transfers")
-def list_transfers(base_id: Optional[int] = None, token: str = None):
+def list_transfers(
+	base_id: Optional[int] = None,
+	start_date: Optional[str] = None,
+	end_date: Optional[str] = None,
+	limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+	after_id: Optional[int] = None,
+	stream: bool = False,
+	token: str = None,
+):
 	"""Get transfers (both sent and received)"""
 	if token:
 		user = verify_token(token)
 		if user["role"] == "base_commander":
 			base_id = user["base_id"]
 	
-	result = transfers_db
+	check_date_filters(start_date, end_date)
 	if base_id:
-		result = [t for t in result if t["from_base_id"] == base_id or t["to_base_id"] == base_id]
-	
-	return result
+		result = transfers_db.find_either(("from_base_id", "to_base_id"), base_id, start_date, end_date)
+	else:
+		result = transfers_db.find(start_date=start_date, end_date=end_date)
+	return paginate(result, limit, after_id, stream)
+
+@app.post("/api/transfers/bulk")
+async def create_transfers_bulk(request: Request, token: str = None):
+	"""Record many transfers (JSON array or NDJSON) atomically"""
+	items = await read_bulk_items(request)
+	return await run_in_threadpool(bulk_apply, items, TransferCreate, bulk_authorizer(token, "logistics_officer", "from_base_id"), "transfers", transfer_row)
 
 # ==================== Assignments ====================
 @app.post("/api/assignments")
@@ -262,30 +1119,34 @@ def create_assignment(assignment: AssignmentCreate, token: str = None):
 		user = verify_token(token)
 		check_rbac(user, base_id=assignment.base_id)
 	
-	assignment_record = {
-		"id": len(assignments_db) + 1,
-		"base_id": assignment.base_id,
-		"equipment_id": assignment.equipment_id,
-		"personnel_name": assignment.personnel_name,
-		"quantity": assignment.quantity,
-		"assigned_date": assignment.assigned_date or datetime.now().isoformat(),
-	}
-	assignments_db.append(assignment_record)
+	assignment_record = commit_records("assignments", [assignment_row(assignment)])[0]
 	return {"ok": True, "message": "Assignment recorded", "data": assignment_record}
 
 @app.get("/api/assignments")
-def list_assignments(base_id: Optional[int] = None, token: str = None):
+def list_assignments(
+	base_id: Optional[int] = None,
+	start_date: Optional[str] = None,
+	end_date: Optional[str] = None,
+	limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+	after_id: Optional[int] = None,
+	stream: bool = False,
+	token: str = None,
+):
 	"""Get assignments"""
 	if token:
 		user = verify_token(token)
 		if user["role"] == "base_commander":
 			base_id = user["base_id"]
 	
-	result = assignments_db
-	if base_id:
-		result = [a for a in result if a["base_id"] == base_id]
-	
-	return result
+	check_date_filters(start_date, end_date)
+	result = assignments_db.find(base_id=base_id or None, start_date=start_date, end_date=end_date)
+	return paginate(result, limit, after_id, stream)
+
+@app.post("/api/assignments/bulk")
+async def create_assignments_bulk(request: Request, token: str = None):
+	"""Record many assignments (JSON array or NDJSON) atomically"""
+	items = await read_bulk_items(request)
+	return await run_in_threadpool(bulk_apply, items, AssignmentCreate, bulk_authorizer(token), "assignments", assignment_row)
 
 # ==================== Expenditures ====================
 @app.post("/api/expenditures")
@@ -295,29 +1156,34 @@ def create_expenditure(expend: ExpenditureCreate, token: str = None):
 		user = verify_token(token)
 		check_rbac(user, base_id=expend.base_id)
 	
-	expended_record = {
-		"id": len(expended_db) + 1,
-		"base_id": expend.base_id,
-		"equipment_id": expend.equipment_id,
-		"quantity": expend.quantity,
-		"expended_date": expend.expended_date or datetime.now().isoformat(),
-	}
-	expended_db.append(expended_record)
+	expended_record = commit_records("expended", [expenditure_row(expend)])[0]
 	return {"ok": True, "message": "Expenditure recorded", "data": expended_record}
 
 @app.get("/api/expenditures")
-def list_expenditures(base_id: Optional[int] = None, token: str = None):
+def list_expenditures(
+	base_id: Optional[int] = None,
+	start_date: Optional[str] = None,
+	end_date: Optional[str] = None,
+	limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+	after_id: Optional[int] = None,
+	stream: bool = False,
+	token: str = None,
+):
 	"""Get expended assets"""
 	if token:
 		user = verify_token(token)
 		if user["role"] == "base_commander":
 			base_id = user["base_id"]
 	
-	result = expended_db
-	if base_id:
-		result = [e for e in result if e["base_id"] == base_id]
-	
-	return result
+	check_date_filters(start_date, end_date)
+	result = expended_db.find(base_id=base_id or None, start_date=start_date, end_date=end_date)
+	return paginate(result, limit, after_id, stream)
+
+@app.post("/api/expenditures/bulk")
+async def create_expenditures_bulk(request: Request, token: str = None):
+	"""Record many expenditures (JSON array or NDJSON) atomically"""
+	items = await read_bulk_items(request)
+	return await run_in_threadpool(bulk_apply, items, ExpenditureCreate, bulk_authorizer(token), "expended", expenditure_row)
 
 # ==================== Stock ====================
 @app.get("/api/stock")
@@ -327,4 +1193,41 @@ def get_stock(base_id: int = 1, token: str = None):
 		user = verify_token(token)
 		check_rbac(user, base_id=base_id)
 	
-	return stock_data.get(base_id, {})
+	# copy so a concurrent write cannot resize the dict mid-serialization
+	return FastJSONResponse({eq_id: dict(entry) for eq_id, entry in list(stock_data.get(base_id, {}).items())})
+
+# ==================== Metrics ====================
+@registry.collector
+def _app_series():
+	return [
+		("response_cache_hits_total", "counter", "Responses served from the response cache", {(): response_cache.hits}),
+		("response_cache_misses_total", "counter", "Responses built on a cache miss", {(): response_cache.misses}),
+		("response_cache_entries", "gauge", "Encoded responses held", {(): len(response_cache)}),
+		("event_subscribers", "gauge", "Open /api/events streams", {(): len(event_hub)}),
+		("event_dropped_total", "counter", "Event streams dropped as slow consumers", {(): event_hub.dropped}),
+		("store_rows", "gauge", "Rows held per in-memory table",
+			{(("table", table),): len(store) for table, (store, _) in TABLES.items()}),
+		("jobs_pending", "gauge", "Background jobs waiting for a worker", {(): job_queue.pending()}),
+		("jobs_running", "gauge", "Background jobs running", {(): job_queue.running()}),
+		("jobs_finished_total", "counter", "Background jobs finished, by outcome",
+			{(("status", status),): count for status, count in job_queue.completed.items()}),
+		("jobs_rejected_total", "counter", "Job submissions refused by the per-user limit", {(): job_queue.rejected}),
+		("state_replica_lag", "gauge", "State server log entries not yet applied in this worker",
+			{(("backend", settings.STATE_BACKEND),): state_backend.lag() if state_backend else 0}),
+	]
+
+@app.get("/metrics", include_in_schema=False)
+def get_metrics(token: str = None):
+	"""Prometheus text exposition of request, span, pool and store metrics"""
+	if token:
+		check_rbac(verify_token(token), "admin")
+	return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/metrics/profile", include_in_schema=False)
+def get_profile(reset: bool = False, token: str = None):
+	"""Folded stacks sampled during slow requests (PROFILE_SLOW_REQUEST_MS)"""
+	if token:
+		check_rbac(verify_token(token), "admin")
+	if profiler is None:
+		raise HTTPException(status_code=404, detail="Profiler disabled; set PROFILE_SLOW_REQUEST_MS")
+	return PlainTextResponse(profiler.folded(reset))
@@ -0,0 +1,317 @@
+"""Request timing, hot-path spans and Prometheus text exposition.
+
+``TimingMiddleware`` times every HTTP request into a per-route histogram and
+opens a per-request span table. Code on the hot path wraps its work in
+``span("auth")``, ``span("db")``, ``span("serialize")`` (or ``@timed``);
+each span lands in that table, in a per-route span histogram and in the
+response's ``Server-Timing`` header. Both work in async code and in
+threadpool-run sync endpoints, since the span table rides a ContextVar.
+"""
+import functools
+import inspect
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+
+class Histogram:
+    """Cumulative-bucket histogram for one label set"""
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Registry:
+    """Histograms and counters keyed by (metric name, label values)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+        self._help = {}
+        self._collectors = []
+
+    def describe(self, name, kind, help_text, labels=(), buckets=None):
+        self._help[name] = (kind, help_text, labels, buckets)
+
+    def observe(self, name, value, *labels):
+        key = (name, labels)
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = Histogram(self._help[name][3] or LATENCY_BUCKETS)
+            hist.observe(value)
+
+    def inc(self, name, amount=1, *labels):
+        key = (name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def collector(self, fn):
+        """Register ``fn() -> [(name, kind, help, {labels: value})]`` evaluated at scrape time"""
+        self._collectors.append(fn)
+        return fn
+
+    def render(self):
+        """Prometheus text format (version 0.0.4)"""
+        with self._lock:
+            histograms = {k: (list(h.counts), h.sum, h.count) for k, h in self._histograms.items()}
+            counters = dict(self._counters)
+        lines = []
+        for name, (kind, help_text, label_names, buckets) in self._help.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            if kind == "histogram":
+                bounds = buckets or LATENCY_BUCKETS
+                for (metric, labels), (counts, total, count) in sorted(histograms.items()):
+                    if metric != name:
+                        continue
+                    base = _labels(label_names, labels)
+                    running = 0
+                    for bound, n in zip(bounds, counts):
+                        running += n
+                        lines.append(f"{name}_bucket{_labels(label_names, labels, le=_num(bound))} {running}")
+                    lines.append(f"{name}_bucket{_labels(label_names, labels, le='+Inf')} {count}")
+                    lines.append(f"{name}_sum{base} {_num(total)}")
+                    lines.append(f"{name}_count{base} {count}")
+            else:
+                for (metric, labels), value in sorted(counters.items()):
+                    if metric == name:
+                        lines.append(f"{name}{_labels(label_names, labels)} {_num(value)}")
+        for fn in self._collectors:
+            for name, kind, help_text, samples in fn():
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples.items():
+                    label_names = tuple(k for k, _ in labels)
+                    lines.append(f"{name}{_labels(label_names, tuple(v for _, v in labels))} {_num(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _num(value):
+    if value is None:
+        return "NaN"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, **extra):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    pairs += [f'{n}="{v}"' for n, v in extra.items()]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+registry = Registry()
+registry.describe("http_request_duration_seconds", "histogram",
+                  "Request latency by route", ("method", "route", "status"))
+registry.describe("http_request_span_seconds", "histogram",
+                  "Time spent per span (auth, db, serialize, ...) within requests", ("route", "span"))
+registry.describe("http_request_db_queries", "histogram",
+                  "SQL statements executed per request", ("route",), COUNT_BUCKETS)
+registry.describe("db_queries_total", "counter", "SQL statements executed", ())
+registry.describe("db_query_seconds_total", "counter", "Time spent executing SQL statements", ())
+
+
+# ==================== Spans ====================
+class RequestSpans:
+    __slots__ = ("totals", "db_queries")
+
+    def __init__(self):
+        self.totals = {}
+        self.db_queries = 0
+
+    def add(self, name, seconds):
+        self.totals[name] = self.totals.get(name, 0.0) + seconds
+
+
+_request = ContextVar("request_spans", default=None)
+
+
+@contextmanager
+def span(name):
+    """Time the block and charge it to ``name`` in the current request"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        spans = _request.get()
+        if spans is not None:
+            spans.add(name, time.perf_counter() - started)
+
+
+def timed(name):
+    """Decorator form of ``span`` for sync and async callables"""
+    def decorate(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def wrapper(*args, **kwargs):
+                with span(name):
+                    return await fn(*args, **kwargs)
+        else:
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with span(name):
+                    return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+# ==================== SQLAlchemy ====================
+def instrument_engine(sync_engine):
+    """Count statements and their time, per request and process-wide"""
+    from sqlalchemy import event
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def after(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["query_started"].pop()
+        elapsed = time.perf_counter() - started
+        registry.inc("db_queries_total")
+        registry.inc("db_query_seconds_total", elapsed)
+        spans = _request.get()
+        if spans is not None:
+            spans.add("db", elapsed)
+            spans.db_queries += 1
+
+    @event.listens_for(sync_engine, "handle_error")
+    def on_error(context):
+        started = context.connection.info.get("query_started") if context.connection is not None else None
+        if started:
+            started.pop()
+
+
+# ==================== Sampling profiler ====================
+class SlowRequestProfiler:
+    """Samples every thread's stack while a request has run past ``threshold``.
+
+    Stacks are kept in folded form (``outer;inner;leaf count``, the input of
+    flamegraph.pl and speedscope), restricted to stacks that pass through
+    ``root`` so idle server threads do not drown out the app.
+    """
+
+    def __init__(self, threshold, interval=0.01, root=None, max_stacks=5000):
+        self.threshold = threshold
+        self.interval = interval
+        self.root = root or os.path.dirname(os.path.abspath(__file__))
+        self.max_stacks = max_stacks
+        self.stacks = Counter()
+        self.samples = 0
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def begin(self):
+        token = object()
+        with self._lock:
+            self._inflight[token] = time.perf_counter()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="slow-request-profiler", daemon=True)
+                self._thread.start()
+        return token
+
+    def end(self, token):
+        with self._lock:
+            self._inflight.pop(token, None)
+
+    def _run(self):
+        own = threading.get_ident()
+        while True:
+            time.sleep(self.interval)
+            now = time.perf_counter()
+            with self._lock:
+                slow = any(now - started >= self.threshold for started in self._inflight.values())
+            if slow:
+                self._sample(own)
+
+    def _sample(self, own):
+        for ident, frame in sys._current_frames().items():
+            if ident == own:
+                continue
+            names = []
+            in_app = False
+            while frame is not None:
+                code = frame.f_code
+                in_app = in_app or code.co_filename.startswith(self.root)
+                names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            if not in_app:
+                continue
+            stack = ";".join(reversed(names))
+            with self._lock:
+                if stack in self.stacks or len(self.stacks) < self.max_stacks:
+                    self.stacks[stack] += 1
+                    self.samples += 1
+
+    def folded(self, reset=False):
+        with self._lock:
+            text = "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+            if reset:
+                self.stacks.clear()
+                self.samples = 0
+        return text
+
+
+# ==================== Middleware ====================
+class TimingMiddleware:
+    """Pure ASGI middleware, so streaming responses pass through untouched"""
+
+    def __init__(self, app, profiler=None):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        spans = RequestSpans()
+        reset = _request.set(spans)
+        token = self.profiler.begin() if self.profiler else None
+        started = time.perf_counter()
+        status = 500
+
+        async def send_timed(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if spans.totals:
+                    timing = ", ".join(f"{name};dur={seconds * 1000:.3f}" for name, seconds in spans.totals.items())
+                    message.setdefault("headers", [])
+                    message["headers"] = list(message["headers"]) + [(b"server-timing", timing.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_timed)
+        finally:
+            elapsed = time.perf_counter() - started
+            if token is not None:
+                self.profiler.end(token)
+            _request.reset(reset)
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            registry.observe("http_request_duration_seconds", elapsed, scope["method"], route, str(status))
+            for name, seconds in spans.totals.items():
+                registry.observe("http_request_span_seconds", seconds, route, name)
+            if spans.db_queries or "db" in spans.totals:
+                registry.observe("http_request_db_queries", spans.db_queries, route)
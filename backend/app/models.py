@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Enum, Date, ForeignKey
+from sqlalchemy import Column, Integer, String, Enum, Date, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from app.config import Base
 
@@ -28,6 +28,18 @@ class OpeningStock(Base):
     quantity = Column(Integer)
     date = Column(Date)
 
+class StockSnapshot(Base):
+    """Net movement per base and equipment before ``period_start`` (opening stock excluded)"""
+    __tablename__ = "stock_snapshots"
+    base_id = Column(Integer, ForeignKey("bases.id"), primary_key=True)
+    equipment_id = Column(Integer, ForeignKey("equipment_types.id"), primary_key=True)
+    period_start = Column(Date, primary_key=True)
+    quantity = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        Index("ix_stock_snapshots_base_period", "base_id", "period_start"),
+    )
+
 class Purchase(Base):
     __tablename__ = "purchases"
     id = Column(Integer, primary_key=True)
@@ -36,6 +48,10 @@ class Purchase(Base):
     quantity = Column(Integer)
     purchase_date = Column(Date)
 
+    __table_args__ = (
+        Index("ix_purchases_base_equipment_date", "base_id", "equipment_id", "purchase_date"),
+    )
+
 class Transfer(Base):
     __tablename__ = "transfers"
     id = Column(Integer, primary_key=True)
@@ -45,6 +61,11 @@ class Transfer(Base):
     quantity = Column(Integer)
     transfer_date = Column(Date)
 
+    __table_args__ = (
+        Index("ix_transfers_from_equipment_date", "from_base", "equipment_id", "transfer_date"),
+        Index("ix_transfers_to_equipment_date", "to_base", "equipment_id", "transfer_date"),
+    )
+
 class Assignment(Base):
     __tablename__ = "assignments"
     id = Column(Integer, primary_key=True)
@@ -54,6 +75,10 @@ class Assignment(Base):
     quantity = Column(Integer)
     assigned_date = Column(Date)
 
+    __table_args__ = (
+        Index("ix_assignments_base_equipment_date", "base_id", "equipment_id", "assigned_date"),
+    )
+
 class Expended(Base):
     __tablename__ = "expended"
     id = Column(Integer, primary_key=True)
@@ -61,3 +86,23 @@ class Expended(Base):
     equipment_id = Column(Integer, ForeignKey("equipment_types.id"))
     quantity = Column(Integer)
     expended_date = Column(Date)
+
+    __table_args__ = (
+        Index("ix_expended_base_equipment_date", "base_id", "equipment_id", "expended_date"),
+    )
+
+class DailyMovement(Base):
+    """Per-day rollup of every movement table, maintained by crud.add_movement"""
+    __tablename__ = "movement_daily"
+    base_id = Column(Integer, ForeignKey("bases.id"), primary_key=True)
+    equipment_id = Column(Integer, ForeignKey("equipment_types.id"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    purchased = Column(Integer, nullable=False, default=0)
+    transfer_in = Column(Integer, nullable=False, default=0)
+    transfer_out = Column(Integer, nullable=False, default=0)
+    assigned = Column(Integer, nullable=False, default=0)
+    expended = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        Index("ix_movement_daily_base_day", "base_id", "day"),
+    )
@@ -0,0 +1,102 @@
+"""bcrypt hashing on a bounded process pool, off the event loop.
+
+A bcrypt call at the default cost burns 100-250ms of CPU. Done inline, a
+burst of logins (a shift change at a base) stalls every other request on
+the same worker. ``PasswordHasher`` runs them on a small process pool
+and admits at most ``workers + queue_size`` at a time; beyond that callers
+get ``HashQueueFull`` and the routers answer 429.
+"""
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import bcrypt
+
+# bcrypt only looks at the first 72 bytes; truncate explicitly as passlib did
+BCRYPT_MAX_BYTES = 72
+
+
+def _secret(password):
+    return password.encode("utf-8")[:BCRYPT_MAX_BYTES]
+
+
+def hash_password(password, rounds=12):
+    return bcrypt.hashpw(_secret(password), bcrypt.gensalt(rounds)).decode("ascii")
+
+
+def verify_password(password, hashed):
+    try:
+        return bcrypt.checkpw(_secret(password), hashed.encode("ascii"))
+    except ValueError:
+        # malformed or non-bcrypt hash
+        return False
+
+
+class HashQueueFull(Exception):
+    """More hashing requests are in flight than the pool admits"""
+
+
+class PasswordHasher:
+    """Bounded process pool for bcrypt.
+
+    ``workers=0`` uses one process per CPU. ``inline=True`` hashes on the
+    calling thread instead (tests, one-off scripts).
+    """
+
+    def __init__(self, rounds=12, workers=0, queue_size=64, inline=False):
+        self.rounds = rounds
+        self.workers = workers or os.cpu_count() or 1
+        self.inline = inline
+        self._slots = threading.BoundedSemaphore(self.workers + queue_size)
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        self.rejected = 0
+
+    def _pool(self):
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    # spawn: forking a process that runs server threads is unsafe
+                    self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._executor
+
+    def _submit(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            self.rejected += 1
+            raise HashQueueFull()
+        try:
+            future = self._pool().submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        # the slot frees when the work finishes, even if the caller gave up
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    async def _run(self, fn, *args):
+        if self.inline:
+            return fn(*args)
+        return await asyncio.wrap_future(self._submit(fn, *args))
+
+    async def hash(self, password):
+        return await self._run(hash_password, password, self.rounds)
+
+    async def verify(self, password, hashed):
+        return await self._run(verify_password, password, hashed)
+
+    def hash_sync(self, password):
+        if self.inline:
+            return hash_password(password, self.rounds)
+        return self._submit(hash_password, password, self.rounds).result()
+
+    def verify_sync(self, password, hashed):
+        if self.inline:
+            return verify_password(password, hashed)
+        return self._submit(verify_password, password, hashed).result()
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
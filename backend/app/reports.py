@@ -0,0 +1,39 @@
+"""Tabular exports of report rows (CSV, and Parquet when pyarrow is installed)."""
+import csv
+import io
+from importlib.util import find_spec
+
+# optional: only the Parquet export needs pyarrow, imported on first use
+PARQUET_AVAILABLE = find_spec("pyarrow") is not None
+
+EXPORT_FORMATS = ("json", "csv", "parquet")
+MEDIA_TYPES = {
+    "json": "application/json",
+    "csv": "text/csv; charset=utf-8",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+def to_csv(rows, columns):
+    """``rows`` (dicts) as CSV with a header line, in ``columns`` order"""
+    out = io.StringIO()
+    writer = csv.DictWriter(out, fieldnames=columns, extrasaction="ignore", lineterminator="\n")
+    writer.writeheader()
+    writer.writerows(rows)
+    return out.getvalue().encode()
+
+
+def to_parquet(rows, columns):
+    """``rows`` as a single-row-group Parquet file"""
+    if not PARQUET_AVAILABLE:
+        raise RuntimeError("Parquet export needs pyarrow")
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    table = pa.table({column: [row.get(column) for row in rows] for column in columns})
+    buf = io.BytesIO()
+    pq.write_table(table, buf)
+    return buf.getvalue()
+
+
+def encode_rows(fmt, rows, columns):
+    return to_parquet(rows, columns) if fmt == "parquet" else to_csv(rows, columns)
@@ -0,0 +1,74 @@
+"""JSON encoding for responses: orjson or msgspec when installed, stdlib otherwise.
+
+``settings.JSON_BACKEND`` picks the encoder ("auto", "orjson", "msgspec" or
+"json"). Handlers that return ``FastJSONResponse`` directly skip FastAPI's
+``jsonable_encoder`` walk, which is most of the cost of a large list
+response; everything else still goes through it and is then rendered here.
+"""
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+from fastapi.responses import JSONResponse
+
+from app.config import settings
+from app.metrics import span
+
+JSON_BACKENDS = ("orjson", "msgspec", "json")
+
+
+def _default(obj):
+    """Encode the few non-JSON types that reach a response"""
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, (set, frozenset, tuple)):
+        return list(obj)
+    if hasattr(obj, "model_dump"):
+        return obj.model_dump(mode="json")
+    if hasattr(obj, "as_dict"):
+        return obj.as_dict()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def _stdlib_dumps(content):
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":"), default=_default).encode()
+
+
+def _make_dumps(backend):
+    if backend == "orjson":
+        import orjson
+        option = orjson.OPT_NON_STR_KEYS
+
+        def dumps(content):
+            return orjson.dumps(content, default=_default, option=option)
+        return dumps
+    if backend == "msgspec":
+        import msgspec
+        return msgspec.json.Encoder(enc_hook=_default).encode
+    return _stdlib_dumps
+
+
+def select_backend(name="auto"):
+    """``(backend name, dumps)`` for ``name``; "auto" takes the first one installed"""
+    if name not in ("auto",) + JSON_BACKENDS:
+        raise ValueError(f"Unknown JSON_BACKEND {name!r}")
+    for backend in JSON_BACKENDS if name == "auto" else (name,):
+        try:
+            return backend, _make_dumps(backend)
+        except ImportError:
+            if name != "auto":
+                raise
+    return "json", _stdlib_dumps
+
+
+JSON_BACKEND, dumps = select_backend(settings.JSON_BACKEND)
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with the selected encoder"""
+
+    def render(self, content):
+        with span("serialize"):
+            return dumps(content)
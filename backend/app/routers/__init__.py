@@ -0,0 +1,35 @@
+"""SQL-backed routers, imported only when an app asks for them."""
+import importlib
+
+ROUTERS = ("auth", "dashboard", "purchases", "assets")
+
+
+def load_router(name):
+    if name not in ROUTERS:
+        raise ValueError(f"Unknown router {name!r}; expected one of {', '.join(ROUTERS)}")
+    return importlib.import_module(f"{__name__}.{name}").router
+
+
+def _endpoints(routes, prefix=""):
+    return {(prefix + route.path, method) for route in routes for method in getattr(route, "methods", None) or ()}
+
+
+def include_routers(app, names, prefix=""):
+    """Import and include each router in ``names`` (a list or a comma-separated string) under ``prefix``.
+
+    Raises RuntimeError, before including any of them, if a route would be
+    shadowed by one the app already serves.
+    """
+    if isinstance(names, str):
+        names = [name.strip() for name in names.split(",") if name.strip()]
+    routers = [load_router(name) for name in names]
+    taken = _endpoints(app.routes)
+    for name, router in zip(names, routers):
+        clashes = _endpoints(router.routes, prefix) & taken
+        if clashes:
+            listed = ", ".join(f"{method} {path}" for path, method in sorted(clashes))
+            raise RuntimeError(f"Router {name!r} would be shadowed by existing routes: {listed}; "
+                               f"include it under another prefix")
+        taken |= _endpoints(router.routes, prefix)
+    for router in routers:
+        app.include_router(router, prefix=prefix)
@@ -1,11 +1,13 @@
 from fastapi import APIRouter, Depends
 from sqlalchemy.orm import Session
 from ..deps import get_db, decode_token, oauth2_scheme
-from .. import crud, schemas
+from .. import crud, models, schemas
 from fastapi import HTTPException
+from ..responses import FastJSONResponse
 
-router = APIRouter(prefix="/api/assets")
+router = APIRouter(prefix="/api/assets", default_response_class=FastJSONResponse)
 
 @router.get("/")
 def list_assets(db: Session = Depends(get_db)):
-    return db.query(crud.__import__("..models", fromlist=["models"]).models.Asset).all()
+    # the asset catalogue is the equipment_types table
+    return [{"id": e.id, "name": e.name} for e in db.query(models.EquipmentType).order_by(models.EquipmentType.id)]
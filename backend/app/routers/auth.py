@@ -1,23 +1,26 @@
 from fastapi import APIRouter, Depends, HTTPException
-from ..deps import get_db, create_access_token, decode_token, verify_password
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..deps import get_async_db, create_access_token, hash_password_async, verify_password_async
+from ..security import user_claims
 from .. import crud, schemas
-from fastapi import status
-from sqlalchemy.orm import Session
+from ..responses import FastJSONResponse
 
-router = APIRouter(prefix="/api/auth")
+router = APIRouter(prefix="/api/auth", default_response_class=FastJSONResponse)
 
 @router.post("/register", response_model=dict)
-def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
-    existing = crud.get_user_by_username(db, user.username)
+async def register(user: schemas.UserCreate, db: AsyncSession = Depends(get_async_db)):
+    existing = await db.run_sync(crud.get_user_by_username, user.username)
     if existing:
         raise HTTPException(status_code=400, detail="User exists")
-    u = crud.create_user(db, user.username, user.password, user.full_name, user.base_id)
+    # bcrypt runs on the hashing pool, not on the event loop
+    password_hash = await hash_password_async(user.password)
+    u = await db.run_sync(crud.create_user, user.username, password_hash, user.full_name, user.base_id)
     return {"id": u.id, "username": u.username}
 
 @router.post("/token", response_model=schemas.Token)
-def login(form_data: schemas.UserCreate, db: Session = Depends(get_db)):
-    user = crud.get_user_by_username(db, form_data.username)
-    if not user or not verify_password(form_data.password, user.password_hash):
+async def login(form_data: schemas.UserCreate, db: AsyncSession = Depends(get_async_db)):
+    user = await db.run_sync(crud.get_user_by_username, form_data.username)
+    if not user or not await verify_password_async(form_data.password, user.password_hash):
         raise HTTPException(status_code=400, detail="Incorrect credentials")
-    token = create_access_token({"sub": user.id, "username": user.username, "base_id": user.base_id})
+    token = create_access_token(user_claims(user.username, user.role, user.base_id))
     return {"access_token": token, "token_type":"bearer"}
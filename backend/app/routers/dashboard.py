@@ -1,20 +1,37 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from app.deps import get_db, get_current_user
+from datetime import date
+from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.deps import SessionLocal, get_async_db, get_current_user
 from app import crud
+from app.jobs import JobLimitReached, job_events, job_queue, job_result, job_status, owned_job, too_many_jobs
+from app.reports import MEDIA_TYPES, to_csv
+from app.responses import FastJSONResponse, dumps
 
 router = APIRouter(
     prefix="/dashboard",
     tags=["Dashboard"],
+    default_response_class=FastJSONResponse,
 )
 
 
+def _check_dates(*values):
+    """400 on date filters that are not ISO 'YYYY-MM-DD[...]' strings (as app.main does)"""
+    for value in values:
+        if value is None:
+            continue
+        try:
+            date.fromisoformat(value[:10])
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"Invalid date filter: {value}")
+
+
 @router.get("/")
-def get_dashboard_data(
+async def get_dashboard_data(
     base_id: int,
     start_date: str = None,
     end_date: str = None,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: dict = Depends(get_current_user)
 ):
     """
@@ -31,39 +48,114 @@ def get_dashboard_data(
     # Restrict Base Commander to only their base
     if current_user["role"] == "base_commander" and current_user["base_id"] != base_id:
         raise HTTPException(status_code=403, detail="Access denied for this base")
+    _check_dates(start_date, end_date)
+
+    # All seven figures in one round trip
+    metrics = (await crud.get_dashboard_metrics_async(db, [base_id], start_date, end_date))[base_id]
 
-    # Get data from CRUD functions
-    opening_balance = crud.get_opening_balance(db, base_id, start_date)
-    purchases = crud.get_total_purchases(db, base_id, start_date, end_date)
-    transfer_in = crud.get_total_transfer_in(db, base_id, start_date, end_date)
-    transfer_out = crud.get_total_transfer_out(db, base_id, start_date, end_date)
-    assigned = crud.get_total_assigned(db, base_id, start_date, end_date)
-    expended = crud.get_total_expended(db, base_id, start_date, end_date)
-
-    # Closing balance calculation
-    closing_balance = (
-        opening_balance
-        + purchases
-        + transfer_in
-        - transfer_out
-        - expended
-    )
-
-    # Net movement calculation
-    net_movement = purchases + transfer_in - transfer_out
-
-    return {
+    return FastJSONResponse({
         "base_id": base_id,
-        "opening_balance": opening_balance,
-        "purchases": purchases,
-        "transfer_in": transfer_in,
-        "transfer_out": transfer_out,
-        "assigned": assigned,
-        "expended": expended,
-        "net_movement": net_movement,
-        "closing_balance": closing_balance,
+        **metrics,
         "filters": {
             "start_date": start_date,
             "end_date": end_date,
         },
+    })
+
+
+@router.get("/bases")
+async def get_dashboard_data_for_bases(
+    base_ids: List[int] = Query(...),
+    start_date: str = None,
+    end_date: str = None,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: dict = Depends(get_current_user)
+):
+    """Dashboard metrics for several bases at once, grouped by base"""
+
+    if current_user["role"] == "base_commander" and any(b != current_user["base_id"] for b in base_ids):
+        raise HTTPException(status_code=403, detail="Access denied for this base")
+    _check_dates(start_date, end_date)
+
+    metrics = await crud.get_dashboard_metrics_async(db, base_ids, start_date, end_date)
+
+    return FastJSONResponse({
+        "bases": [{"base_id": base_id, **m} for base_id, m in metrics.items()],
+        "filters": {
+            "start_date": start_date,
+            "end_date": end_date,
+        },
+    })
+
+
+# ==================== Background jobs ====================
+# Large ranges over many bases run on app.jobs.job_queue instead of
+# holding a request open; the result is downloaded once it is done.
+def _job_owner(current_user):
+    return f"sql:{current_user.user_id}"
+
+
+def _dashboard_job(base_ids, start_date, end_date, fmt):
+    def build():
+        db = SessionLocal()
+        try:
+            metrics = crud.get_dashboard_metrics(db, base_ids, start_date, end_date)
+        finally:
+            db.close()
+        rows = [{"base_id": base_id, **m} for base_id, m in metrics.items()]
+        period = f"{start_date or 'start'}_{end_date or 'now'}"
+        if fmt == "csv":
+            columns = list(rows[0]) if rows else ["base_id"]
+            return to_csv(rows, columns), MEDIA_TYPES["csv"], f"dashboard-{period}.csv"
+        body = dumps({"bases": rows, "filters": {"start_date": start_date, "end_date": end_date}})
+        return body, MEDIA_TYPES["json"], f"dashboard-{period}.json"
+    return build
+
+
+def _job_links(request: Request, job):
+    return job_status(job, str(request.url_for("get_dashboard_job_result", job_id=job.id))) | {
+        "status_url": str(request.url_for("get_dashboard_job", job_id=job.id)),
+        "events_url": str(request.url_for("stream_dashboard_job_events", job_id=job.id)),
     }
+
+
+@router.post("/jobs", status_code=202)
+async def submit_dashboard_job(
+    request: Request,
+    base_ids: List[int] = Query(...),
+    start_date: str = None,
+    end_date: str = None,
+    format: str = Query("json", pattern="^(json|csv)$"),
+    current_user: dict = Depends(get_current_user)
+):
+    """Queue the /dashboard/bases figures as a background job (JSON or CSV)"""
+
+    if current_user["role"] == "base_commander" and any(b != current_user["base_id"] for b in base_ids):
+        raise HTTPException(status_code=403, detail="Access denied for this base")
+    _check_dates(start_date, end_date)
+
+    params = {"base_ids": base_ids, "start_date": start_date, "end_date": end_date, "format": format}
+    try:
+        job = job_queue.submit(_job_owner(current_user), "dashboard", _dashboard_job(base_ids, start_date, end_date, format), params)
+    except JobLimitReached as exc:
+        raise too_many_jobs(exc)
+    return FastJSONResponse(_job_links(request, job), status_code=202)
+
+
+@router.get("/jobs/{job_id}")
+async def get_dashboard_job(job_id: str, request: Request, current_user: dict = Depends(get_current_user)):
+    """Status of a background dashboard job"""
+    job = owned_job(job_queue, job_id, _job_owner(current_user), current_user["role"] == "admin")
+    return _job_links(request, job)
+
+
+@router.get("/jobs/{job_id}/events")
+async def stream_dashboard_job_events(job_id: str, current_user: dict = Depends(get_current_user)):
+    """Server-sent ``status`` events until the job finishes"""
+    return job_events(job_queue, owned_job(job_queue, job_id, _job_owner(current_user), current_user["role"] == "admin"))
+
+
+@router.get("/jobs/{job_id}/result")
+async def get_dashboard_job_result(job_id: str, current_user: dict = Depends(get_current_user)):
+    """Download a finished job's output"""
+    return job_result(owned_job(job_queue, job_id, _job_owner(current_user), current_user["role"] == "admin"))
@@ -1,18 +1,73 @@
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
-from ..deps import get_db, oauth2_scheme, decode_token
-from .. import crud, schemas
-from fastapi import HTTPException
+import json
+import time
+from fastapi import APIRouter, Depends, HTTPException, Request
+from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..deps import get_async_db, get_current_user
+from ..security import Principal
+from .. import crud, schemas, models
+from ..responses import FastJSONResponse
 
-router = APIRouter(prefix="/api/purchases")
+router = APIRouter(prefix="/api/purchases", default_response_class=FastJSONResponse)
 
 @router.post("/")
-def create_purchase(purchase: schemas.PurchaseCreate, db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)):
-    # decode token quickly (demo)
-    payload = decode_token(token)
-    if not payload:
-        raise HTTPException(status_code=401)
-    user_id = payload.get("sub")
+async def create_purchase(purchase: schemas.PurchaseCreate, db: AsyncSession = Depends(get_async_db), current_user: Principal = Depends(get_current_user)):
+    user_id = current_user.user_id
     items = [{"asset_id": it.asset_id, "quantity": it.quantity} for it in purchase.items]
-    crud.add_purchase(db, purchase.base_id, items, user_id)
+    await db.run_sync(crud.add_purchase, purchase.base_id, items, user_id)
     return {"ok": True}
+
+
+def _check_item(raw, current_user: Principal):
+    """Validate one bulk item and scope it to the caller's base; returns (purchase, error result)"""
+    try:
+        purchase = schemas.PurchaseCreate.model_validate(raw)
+    except ValidationError as exc:
+        return None, {"status": 422, "error": exc.errors(include_url=False, include_context=False)}
+    if current_user["role"] == "base_commander" and current_user["base_id"] != purchase.base_id:
+        return None, {"status": 403, "error": "Access denied for this base"}
+    return purchase, None
+
+
+@router.post("/bulk")
+async def create_purchases_bulk(request: Request, db: AsyncSession = Depends(get_async_db), current_user: Principal = Depends(get_current_user)):
+    """Record many purchase orders atomically; every item is validated and base-checked first"""
+    # one token check and one executemany insert for the whole batch
+    started = time.perf_counter()
+    try:
+        raw_items = json.loads(await request.body() or b"[]")
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Malformed JSON body")
+    if not isinstance(raw_items, list):
+        raise HTTPException(status_code=400, detail="Expected a JSON array body")
+
+    purchases, results = [], []
+    for index, raw in enumerate(raw_items):
+        purchase, error = _check_item(raw, current_user)
+        if error:
+            results.append({"index": index, "ok": False, **error})
+        else:
+            purchases.append(purchase)
+            results.append({"index": index, "ok": True, "items": len(purchase.items)})
+    failed = [r for r in results if not r["ok"]]
+    if failed:
+        status = 422 if any(r["status"] == 422 for r in failed) else failed[0]["status"]
+        return FastJSONResponse(status_code=status, content={
+            "ok": False,
+            "message": f"{len(failed)} of {len(raw_items)} items rejected, nothing recorded",
+            "results": results,
+        })
+
+    rows = [
+        {"base_id": p.base_id, "equipment_id": it.asset_id, "quantity": it.quantity}
+        for p in purchases for it in p.items
+    ]
+    inserted = await db.run_sync(crud.add_movements, models.Purchase, rows)
+    elapsed = time.perf_counter() - started
+    return {
+        "ok": True,
+        "results": results,
+        "rows": inserted,
+        "elapsed_ms": round(elapsed * 1000, 3),
+        "rows_per_sec": round(inserted / elapsed, 1) if elapsed else None,
+    }
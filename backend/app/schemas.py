@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional, List
 
 class UserCreate(BaseModel):
@@ -19,7 +19,8 @@ class AssetIn(BaseModel):
 
 class PurchaseItem(BaseModel):
     asset_id: int
-    quantity: int
+    # positive, and within the Integer quantity column
+    quantity: int = Field(gt=0, le=2 ** 31 - 1)
 
 class PurchaseCreate(BaseModel):
     base_id: int
@@ -0,0 +1,114 @@
+"""Signed access tokens and a bounded cache of verified principals."""
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+
+from app.config import settings
+
+ALGORITHM = "HS256"
+
+
+class Principal:
+    """Authenticated caller; supports ``user["role"]`` style access"""
+    __slots__ = ("username", "role", "base_id", "name", "user_id")
+
+    def __init__(self, username, role, base_id=None, name=None, user_id=None):
+        self.username = username
+        self.role = role
+        self.base_id = base_id
+        self.name = name
+        self.user_id = user_id
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+
+    def as_dict(self):
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+    def __repr__(self):
+        return f"Principal(username={self.username!r}, role={self.role!r}, base_id={self.base_id!r})"
+
+
+class TokenCache:
+    """LRU of token -> Principal whose entries expire after ``ttl`` seconds
+    or at the token's own ``exp``, whichever comes first."""
+
+    def __init__(self, maxsize=4096, ttl=300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token):
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                return None
+            expires_at, principal = entry
+            if expires_at <= time.monotonic():
+                del self._entries[token]
+                return None
+            self._entries.move_to_end(token)
+            return principal
+
+    def put(self, token, principal, exp=None):
+        ttl = self.ttl
+        if exp is not None:
+            ttl = min(ttl, exp - time.time())
+        if ttl <= 0 or self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[token] = (time.monotonic() + ttl, principal)
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def discard(self, token):
+        with self._lock:
+            self._entries.pop(token, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def user_claims(username, role, base_id=None):
+    """The claims every access token carries, on both the in-memory and SQL paths"""
+    return {"sub": username, "role": role, "base_id": base_id}
+
+
+def _jose():
+    # imported on first use: jose and its crypto backend are a large share
+    # of cold-start time
+    import jose
+    import jose.jwt
+    return jose
+
+
+def create_access_token(data: dict, expires_delta=None):
+    to_encode = data.copy()
+    if "sub" in to_encode:
+        # RFC 7519 (and jose) require a string subject
+        to_encode["sub"] = str(to_encode["sub"])
+    if expires_delta is None:
+        expires_delta = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+    to_encode["exp"] = datetime.now(timezone.utc) + expires_delta
+    return _jose().jwt.encode(to_encode, settings.SECRET_KEY, algorithm=ALGORITHM)
+
+
+def decode_token(token: str):
+    jose = _jose()
+    try:
+        return jose.jwt.decode(token, settings.SECRET_KEY, algorithms=[ALGORITHM])
+    except jose.JWTError:
+        return None
@@ -0,0 +1,370 @@
+"""Where the in-memory API's writes are ordered: this process, or a state server.
+
+``settings.STATE_BACKEND`` picks the backend behind ``commit_records``:
+
+- ``"local"`` (default): the worker checks stock, assigns ids and applies
+  writes itself. Only correct with a single worker.
+- ``"shared"``: a state server process holds the authoritative stock and id
+  counters and logs every write in one global order. Each uvicorn worker
+  keeps a read replica of the stores, ledger and stock and replays the
+  server's log into it. The server mirrors its log length into a memory-
+  mapped word, so an up-to-date worker notices without a round trip: reads
+  stay local and scale with workers, and only writes and catch-up cross the
+  socket.
+
+    python -m app.state &                    # STATE_ADDRESS, STATE_AUTHKEY, WAL_DIR
+    STATE_BACKEND=shared uvicorn app.main:app --workers 4
+
+Both backends expose ``commit(table, records) -> records``, ``behind()``,
+``lag()``, ``sync()`` and ``close()``. In shared mode the WAL belongs to the server.
+"""
+import atexit
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+from multiprocessing.managers import BaseManager
+
+from starlette.concurrency import run_in_threadpool
+
+SEQ_FORMAT = "<q"
+SEQ_BYTES = 8
+EXPOSED = ("attach", "commit", "entries", "seq", "seq_path")
+
+
+class InsufficientStock(ValueError):
+    """A batch would overdraw some base's stock"""
+
+
+# ==================== Stock rules ====================
+def record_bases(table, record):
+    if table == "transfers":
+        return (record["from_base_id"], record["to_base_id"])
+    return (record["base_id"],)
+
+
+def stock_deltas(table, record):
+    """(base_id, equipment_id, change in current stock) for a record"""
+    eq, qty = record["equipment_id"], record["quantity"]
+    if table == "purchases":
+        return [(record["base_id"], eq, qty)]
+    if table == "transfers":
+        return [(record["from_base_id"], eq, -qty), (record["to_base_id"], eq, qty)]
+    return [(record["base_id"], eq, -qty)]
+
+
+def stock_shortfall(stock, deltas):
+    """Error message if any net debit in ``deltas`` exceeds current stock, else None"""
+    net = {}
+    for base_id, eq_id, delta in deltas:
+        net[(base_id, eq_id)] = net.get((base_id, eq_id), 0) + delta
+    for (base_id, eq_id), delta in net.items():
+        if delta >= 0:
+            continue
+        available = stock.get(base_id, {}).get(eq_id, {}).get("current", 0)
+        if available + delta < 0:
+            return f"Insufficient stock of equipment {eq_id} at base {base_id}: {available} available, {-delta} requested"
+    return None
+
+
+def apply_stock_deltas(stock, deltas):
+    for base_id, eq_id, delta in deltas:
+        entry = stock.setdefault(base_id, {}).get(eq_id)
+        if entry is None:
+            entry = stock[base_id][eq_id] = {"opening": 0, "current": 0}
+        entry["current"] += delta
+
+
+def parse_address(value):
+    """``host:port`` for TCP, anything else is a unix socket path"""
+    host, sep, port = value.rpartition(":")
+    if sep and port.isdigit() and "/" not in value:
+        return (host or "127.0.0.1", int(port))
+    return value
+
+
+class StateManager(BaseManager):
+    pass
+
+
+StateManager.register("state", exposed=EXPOSED)
+
+
+# ==================== Local ====================
+class LocalState:
+    """Writes are checked and applied by ``commit`` in this process"""
+
+    def __init__(self, commit):
+        self.commit = commit
+
+    def behind(self):
+        return False
+
+    def lag(self):
+        return 0
+
+    def sync(self):
+        pass
+
+    def close(self):
+        pass
+
+
+# ==================== Server ====================
+class StateServer:
+    """Authoritative stock, id counters and write log shared by every worker.
+
+    The first worker to ``attach`` seeds the opening stock; every worker
+    then rebuilds its replica from that opening stock plus ``entries``.
+    """
+
+    def __init__(self, wal=None, snapshot_every=0):
+        self.wal = wal
+        self.snapshot_every = snapshot_every
+        self.stock = {}
+        self.seeded = False
+        self.log = []
+        self.last_ids = {}
+        self._lock = threading.Lock()
+        self._compacting = threading.Event()
+        fd, self._seq_path = tempfile.mkstemp(prefix="state-", suffix=".seq")
+        try:
+            os.ftruncate(fd, SEQ_BYTES)
+            self._seq = mmap.mmap(fd, SEQ_BYTES)
+        finally:
+            os.close(fd)
+
+    def _append(self, table, record):
+        self.log.append((table, record))
+        self.last_ids[table] = max(self.last_ids.get(table, 0), record["id"])
+
+    def load(self, state, entries):
+        """Rebuild from a WAL recovery (main.freeze_state snapshot format)"""
+        if state:
+            for table, records in state["tables"].items():
+                for record in records:
+                    self._append(table, record)
+            self.stock = {int(b): {int(e): dict(v) for e, v in eqs.items()} for b, eqs in state["stock"].items()}
+            self.seeded = True
+        for table, record in entries:
+            self._append(table, record)
+            if self.seeded:
+                apply_stock_deltas(self.stock, stock_deltas(table, record))
+        struct.pack_into(SEQ_FORMAT, self._seq, 0, len(self.log))
+
+    def attach(self, opening):
+        """Seed ``{base: {equipment: qty}}`` if unseeded; returns the opening stock to replay from"""
+        with self._lock:
+            if not self.seeded:
+                self.stock = {b: {e: {"opening": q, "current": q} for e, q in eqs.items()} for b, eqs in opening.items()}
+                for table, record in self.log:
+                    apply_stock_deltas(self.stock, stock_deltas(table, record))
+                self.seeded = True
+            return {b: {e: v["opening"] for e, v in eqs.items()} for b, eqs in self.stock.items()}
+
+    def commit(self, table, records):
+        """Check stock, assign ids and log a batch; returns ``(log length, ids)``"""
+        deltas = [d for record in records for d in stock_deltas(table, record)]
+        seq = None
+        with self._lock:
+            shortfall = stock_shortfall(self.stock, deltas)
+            if shortfall:
+                raise InsufficientStock(shortfall)
+            ids = []
+            last_id = self.last_ids.get(table, 0)
+            for record in records:
+                last_id += 1
+                record = dict(record, id=last_id)
+                if self.wal is not None:
+                    seq = self.wal.append(table, record)
+                self.log.append((table, record))
+                ids.append(last_id)
+            self.last_ids[table] = last_id
+            apply_stock_deltas(self.stock, deltas)
+            end = len(self.log)
+            struct.pack_into(SEQ_FORMAT, self._seq, 0, end)
+        if seq is not None:
+            self.wal.commit(seq)
+            self._maybe_compact()
+        return end, ids
+
+    def entries(self, start, limit):
+        return self.log[start:start + limit]
+
+    def seq(self):
+        return len(self.log)
+
+    def seq_path(self):
+        return self._seq_path
+
+    def freeze_state(self):
+        """Snapshot cut (caller holds ``_lock``); the log is append-only, so its length is enough"""
+        stock = {str(b): {str(e): dict(v) for e, v in eqs.items()} for b, eqs in self.stock.items()}
+        size = len(self.log)
+
+        def dump_state():
+            tables = {}
+            for table, record in self.log[:size]:
+                tables.setdefault(table, []).append(record)
+            return {"stock": stock, "tables": tables}
+        return dump_state
+
+    def _maybe_compact(self):
+        if self.snapshot_every and self.wal.appends_since_snapshot >= self.snapshot_every and not self._compacting.is_set():
+            self._compacting.set()
+            threading.Thread(target=self._compact, name="wal-compact", daemon=True).start()
+
+    def _compact(self):
+        try:
+            self.wal.snapshot(self.freeze_state, pause=self._lock)
+        finally:
+            self._compacting.clear()
+
+    def close(self):
+        if self.wal is not None:
+            self.wal.close()
+        self._seq.close()
+        try:
+            os.remove(self._seq_path)
+        except OSError:
+            pass
+
+
+def serve(settings):
+    """Run the state server until interrupted"""
+    from app.wal import WriteAheadLog
+
+    wal = None
+    if settings.WAL_DIR:
+        wal = WriteAheadLog(
+            settings.WAL_DIR,
+            segment_bytes=settings.WAL_SEGMENT_BYTES,
+            fsync_interval=settings.WAL_FSYNC_INTERVAL_MS / 1000,
+            sync_commit=settings.WAL_SYNC_COMMIT,
+        )
+    server_state = StateServer(wal, settings.WAL_SNAPSHOT_EVERY)
+    if wal is not None:
+        server_state.load(*wal.recover())
+    atexit.register(server_state.close)
+
+    address = parse_address(settings.STATE_ADDRESS)
+    if isinstance(address, str) and os.path.exists(address):
+        os.remove(address)
+    StateManager.register("state", callable=lambda: server_state, exposed=EXPOSED)
+    manager = StateManager(address=address, authkey=state_authkey(settings))
+    manager.get_server().serve_forever()
+
+
+def state_authkey(settings):
+    return (settings.STATE_AUTHKEY or settings.SECRET_KEY).encode()
+
+
+# ==================== Worker replica ====================
+class SharedState:
+    """Forwards writes to the state server and replays its log into this worker.
+
+    ``apply(entries)`` receives ``[(table, record), ...]`` in server order.
+    A daemon thread polls the shared log length every ``poll`` seconds so
+    events from other workers' writes reach this worker's stream clients.
+    """
+
+    def __init__(self, address, authkey, apply, poll=0.005, batch=10000):
+        manager = StateManager(address=address, authkey=authkey)
+        try:
+            manager.connect()
+        except OSError as exc:
+            raise RuntimeError(f"State server not reachable at {address!r}; start it with python -m app.state") from exc
+        self.server = manager.state()
+        self.applied = 0
+        self.batch = batch
+        self._apply = apply
+        self._lock = threading.Lock()
+        self._seq = None
+        try:
+            with open(self.server.seq_path(), "rb") as f:
+                self._seq = mmap.mmap(f.fileno(), SEQ_BYTES, access=mmap.ACCESS_READ)
+        except OSError:
+            # server on another host: ask it instead
+            pass
+        self._closed = threading.Event()
+        self._poller = threading.Thread(target=self._poll, args=(poll,), name="state-sync", daemon=True)
+        self._poller.start()
+
+    def attach(self, opening):
+        return self.server.attach(opening)
+
+    def published(self):
+        if self._seq is None:
+            return self.server.seq()
+        return struct.unpack_from(SEQ_FORMAT, self._seq, 0)[0]
+
+    def behind(self):
+        return self.published() > self.applied
+
+    def lag(self):
+        return max(0, self.published() - self.applied)
+
+    def sync(self, upto=None):
+        """Apply the server's log up to ``upto`` (default: everything published)"""
+        target = self.published() if upto is None else upto
+        if target <= self.applied:
+            return
+        with self._lock:
+            while self.applied < target:
+                entries = self.server.entries(self.applied, self.batch)
+                if not entries:
+                    break
+                self._apply(entries)
+                self.applied += len(entries)
+
+    def commit(self, table, records):
+        """Logged by the server, then applied here like everyone else's writes"""
+        end, ids = self.server.commit(table, records)
+        for record, record_id in zip(records, ids):
+            record["id"] = record_id
+        self.sync(end)
+        return records
+
+    def _poll(self, interval):
+        while not self._closed.wait(interval):
+            try:
+                if self.behind():
+                    self.sync()
+            except (OSError, EOFError):
+                # server gone; requests surface the error
+                time.sleep(1)
+
+    def close(self):
+        self._closed.set()
+
+
+class ReplicaSyncMiddleware:
+    """Catch the replica up before each request, so reads see every committed write.
+
+    ``startup()`` returns the state backend; it runs once, on the first
+    request, unless the app's lifespan already ran it.
+    """
+
+    def __init__(self, app, startup):
+        self.app = app
+        self.startup = startup
+        self.state = None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            state = self.state
+            if state is None:
+                state = self.state = await run_in_threadpool(self.startup)
+            if state.behind():
+                await run_in_threadpool(state.sync)
+        await self.app(scope, receive, send)
+
+
+if __name__ == "__main__":
+    # import through the package so pickled exceptions resolve in the workers
+    from app.config import settings
+    from app.state import serve as run_server
+
+    run_server(settings)
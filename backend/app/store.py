@@ -0,0 +1,165 @@
+"""In-memory record stores with secondary hash indexes for the list endpoints."""
+import threading
+from bisect import bisect_left, bisect_right, insort
+from contextlib import contextmanager
+from heapq import merge
+
+from app.columnar import DAY_US, bucket_day, parse_date
+
+
+class StripedLock:
+    """Fixed set of locks picked by key, so unrelated keys rarely contend"""
+
+    def __init__(self, stripes=16):
+        self._locks = [threading.Lock() for _ in range(stripes)]
+
+    def _stripes(self, keys):
+        return sorted({hash(key) % len(self._locks) for key in keys})
+
+    @contextmanager
+    def hold(self, *keys):
+        """Acquire the stripes for ``keys`` in a fixed order (deadlock-free)"""
+        stripes = self._stripes(keys)
+        for i in stripes:
+            self._locks[i].acquire()
+        try:
+            yield
+        finally:
+            for i in reversed(stripes):
+                self._locks[i].release()
+
+    def hold_all(self):
+        return self.hold(*range(len(self._locks)))
+
+
+class RecordStore:
+    """Append-only list of dict records indexed by field value and by day.
+
+    Every index maps a value to the records holding it in insertion (= id)
+    order, so a filtered read costs in proportion to the smallest matching
+    bucket rather than the whole history.
+    """
+
+    def __init__(self, indexed_fields=(), date_field=None, fields=()):
+        self.fields = tuple(fields)
+        self.records = []
+        self.indexes = {field: {} for field in indexed_fields}
+        self.date_field = date_field
+        self.by_day = {}
+        self.days = []
+        self.last_id = 0
+        # Guards id allocation + append only; readers never take it
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.records)
+
+    def __iter__(self):
+        return iter(self.records)
+
+    def __getitem__(self, item):
+        return self.records[item]
+
+    def check(self, record):
+        """Raise ValueError if ``record`` cannot be indexed"""
+        try:
+            for field in self.indexes:
+                hash(record[field])
+            if self.date_field:
+                record[self.date_field][:10]
+        except (KeyError, TypeError) as exc:
+            raise ValueError(f"record {record!r} cannot be stored") from exc
+
+    def insert(self, record, log=None):
+        """Give ``record`` the next id and append it atomically.
+
+        ``log(record)`` runs inside the same critical section once the record
+        is stored, so the log order matches id order and a record the store
+        rejects is never logged; its return value is passed back.
+        """
+        with self.lock:
+            record["id"] = self.last_id + 1
+            self.append(record)
+            return log(record) if log is not None else None
+
+    def append(self, record):
+        """Append a record that already has an id (recovery, or under ``lock``)"""
+        self.check(record)
+        self.last_id = max(self.last_id, record["id"])
+        for field, index in self.indexes.items():
+            bucket = index.get(record[field])
+            if bucket is None:
+                index[record[field]] = [record]
+            else:
+                bucket.append(record)
+        if self.date_field:
+            day = record[self.date_field][:10]
+            bucket = self.by_day.get(day)
+            if bucket is None:
+                self.by_day[day] = [record]
+                insort(self.days, day)
+            else:
+                bucket.append(record)
+        # published last, so an unlocked reader never sees a half-indexed row
+        self.records.append(record)
+
+    def _day_range(self, start_date, end_date):
+        lo = bisect_left(self.days, start_date[:10]) if start_date else 0
+        hi = bisect_right(self.days, end_date[:10]) if end_date else len(self.days)
+        return self.days[lo:hi]
+
+    def _in_range(self, record, start_date, end_date):
+        day = record[self.date_field][:10]
+        return not ((start_date and day < start_date[:10]) or (end_date and day > end_date[:10]))
+
+    def find(self, start_date=None, end_date=None, **filters):
+        """Records matching every non-None ``field=value`` and the day range"""
+        filters = {f: v for f, v in filters.items() if v is not None}
+        candidates = [self.indexes[f].get(v, []) for f, v in filters.items()]
+        ranged = bool(self.date_field and (start_date or end_date))
+
+        if ranged:
+            days = self._day_range(start_date, end_date)
+            if not candidates or sum(len(self.by_day[d]) for d in days) < min(map(len, candidates)):
+                candidates.append(list(merge(*(self.by_day[d] for d in days), key=lambda r: r["id"])))
+                ranged = False
+
+        if not candidates:
+            return self.records
+        smallest = min(candidates, key=len)
+        return [
+            r for r in smallest
+            if all(r[f] == v for f, v in filters.items())
+            and (not ranged or self._in_range(r, start_date, end_date))
+        ]
+
+    def find_either(self, fields, value, start_date=None, end_date=None):
+        """Records where any of ``fields`` equals ``value``, in id order"""
+        result = []
+        last_id = None
+        for record in merge(*(self.indexes[f].get(value, []) for f in fields), key=lambda r: r["id"]):
+            if record["id"] == last_id:
+                continue
+            last_id = record["id"]
+            if self._in_range(record, start_date, end_date):
+                result.append(record)
+        return result
+
+    def group_sum(self, keys, value_field="quantity", start_date=None, end_date=None, bucket=None, upto=None, **filters):
+        """Same contract as ColumnarStore.group_sum, one pass over matching records"""
+        result = {}
+        if upto == 0:
+            return result
+        # records are appended in id order, so the first ``upto`` end at this id
+        last_id = self.records[upto - 1]["id"] if upto is not None else None
+        for record in self.find(start_date, end_date, **filters):
+            if last_id is not None and record["id"] > last_id:
+                continue
+            key = tuple(record[k] for k in keys)
+            if bucket:
+                us, _ = parse_date(record[self.date_field])
+                if us is None:
+                    continue
+                key += (bucket_day(us // DAY_US, bucket),)
+            result[key] = result.get(key, 0) + record[value_field]
+        return result
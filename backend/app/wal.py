@@ -0,0 +1,251 @@
+"""Segmented append-only NDJSON log with group-commit fsync and snapshots.
+
+Layout of the log directory::
+
+    wal-00000001.log   one ``{"t": table, "r": record}`` line per write
+    snapshot.json      {"segment": n, "state": {...}} - covers segments < n
+
+Recovery loads the snapshot and replays every segment numbered ``n`` or
+later. A torn final line from a crash mid-write is skipped.
+"""
+import json
+import mmap
+import os
+import threading
+
+SEGMENT_PREFIX = "wal-"
+SEGMENT_SUFFIX = ".log"
+SNAPSHOT_NAME = "snapshot.json"
+# lists in a snapshot are encoded this many items at a time
+SNAPSHOT_CHUNK = 1000
+
+
+def _segment_name(number):
+    return f"{SEGMENT_PREFIX}{number:08d}{SEGMENT_SUFFIX}"
+
+
+def _mapped_lines(path):
+    """Yield the lines of ``path`` (without newlines), sliced straight out of a read-only mmap"""
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            pos = 0
+            while pos < size:
+                end = mm.find(b"\n", pos)
+                if end == -1:
+                    end = size
+                yield mm[pos:end]
+                pos = end + 1
+
+
+def _read_snapshot(path):
+    with open(path, "rb") as f:
+        return json.load(f)
+
+
+def _dump_chunked(f, value):
+    """json.dump that encodes long lists a slice at a time.
+
+    One json.dumps of the whole state is a single C call that keeps the GIL
+    for its full length; slicing lets writers run between chunks.
+    """
+    if isinstance(value, dict):
+        f.write("{")
+        for i, (key, item) in enumerate(value.items()):
+            f.write(("," if i else "") + json.dumps(str(key)) + ":")
+            _dump_chunked(f, item)
+        f.write("}")
+    elif isinstance(value, list) and len(value) > SNAPSHOT_CHUNK:
+        f.write("[")
+        for start in range(0, len(value), SNAPSHOT_CHUNK):
+            chunk = json.dumps(value[start:start + SNAPSHOT_CHUNK], separators=(",", ":"))
+            f.write(("," if start else "") + chunk[1:-1])
+        f.write("]")
+    else:
+        f.write(json.dumps(value, separators=(",", ":")))
+
+
+def _fsync_dir(directory):
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class WriteAheadLog:
+    """Durable log of in-memory writes.
+
+    ``append`` writes a line and, with ``sync_commit``, blocks until a
+    background flusher has fsynced it. Writers arriving while an fsync is in
+    flight share the next one (group commit). Without ``sync_commit`` the
+    flusher syncs every ``fsync_interval`` seconds.
+    """
+
+    def __init__(self, directory, segment_bytes=64 * 1024 * 1024, fsync_interval=0.005, sync_commit=True):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.fsync_interval = fsync_interval
+        self.sync_commit = sync_commit
+        os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._flushed = threading.Condition(self._lock)
+        self._written_seq = 0
+        self._synced_seq = 0
+        self._closed = False
+        self.appends_since_snapshot = 0
+
+        segments = self._segments()
+        self._segment = segments[-1] if segments else self._snapshot_segment() or 1
+        if segments:
+            self._truncate_torn_tail(os.path.join(directory, _segment_name(self._segment)))
+        self._file = open(os.path.join(directory, _segment_name(self._segment)), "ab")
+
+        self._flusher = threading.Thread(target=self._flush_loop, name="wal-flusher", daemon=True)
+        self._flusher.start()
+
+    @staticmethod
+    def _truncate_torn_tail(path):
+        """Cut a partial last line so new appends start on a clean line"""
+        with open(path, "r+b") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                if mm[-1:] == b"\n":
+                    return
+                keep = mm.rfind(b"\n") + 1
+            f.truncate(keep)
+
+    # ---------- writing ----------
+    def append(self, table, record):
+        """Buffer one entry and return its sequence number for ``commit``"""
+        line = json.dumps({"t": table, "r": record}, separators=(",", ":")).encode() + b"\n"
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("write-ahead log is closed")
+            self._file.write(line)
+            self._written_seq += 1
+            self.appends_since_snapshot += 1
+            if self._file.tell() >= self.segment_bytes:
+                self._rotate()
+            return self._written_seq
+
+    def commit(self, seq):
+        """With ``sync_commit``, block until entry ``seq`` has been fsynced"""
+        if not self.sync_commit:
+            return
+        with self._lock:
+            self._flushed.notify_all()
+            while self._synced_seq < seq and not self._closed:
+                self._flushed.wait()
+
+    def _rotate(self):
+        # caller holds the lock
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        self._synced_seq = self._written_seq
+        self._segment += 1
+        self._file = open(os.path.join(self.directory, _segment_name(self._segment)), "ab")
+        _fsync_dir(self.directory)
+
+    def _flush_loop(self):
+        with self._lock:
+            while not self._closed:
+                if self._synced_seq == self._written_seq:
+                    self._flushed.wait(self.fsync_interval)
+                    continue
+                seq = self._written_seq
+                self._file.flush()
+                fd = os.dup(self._file.fileno())
+                # fsync outside the lock so writers keep appending meanwhile;
+                # everything they add rides on the next fsync
+                self._lock.release()
+                try:
+                    os.fsync(fd)
+                finally:
+                    os.close(fd)
+                    self._lock.acquire()
+                self._synced_seq = max(self._synced_seq, seq)
+                self._flushed.notify_all()
+
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._synced_seq = self._written_seq
+            self._closed = True
+            self._file.close()
+            self._flushed.notify_all()
+        self._flusher.join()
+
+    # ---------- snapshots ----------
+    def snapshot(self, freeze, pause=None):
+        """Snapshot the caller's state and drop the segments it covers.
+
+        ``pause`` is the caller's write lock. It is held while the log rotates
+        and ``freeze()`` cuts the state, so no write lands in both the
+        snapshot and the new segment. ``freeze`` returns a function building
+        the JSON-ready state; that and the serialization run after ``pause``
+        is released, so writers only wait for the rotation and the cut.
+        """
+        with pause or threading.Lock():
+            with self._lock:
+                self._rotate()
+                covered_upto = self._segment
+                self.appends_since_snapshot = 0
+            dump_state = freeze()
+
+        tmp = os.path.join(self.directory, SNAPSHOT_NAME + ".tmp")
+        with open(tmp, "w") as f:
+            _dump_chunked(f, {"segment": covered_upto, "state": dump_state()})
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, os.path.join(self.directory, SNAPSHOT_NAME))
+        _fsync_dir(self.directory)
+
+        for number in self._segments():
+            if number < covered_upto:
+                os.remove(os.path.join(self.directory, _segment_name(number)))
+
+    # ---------- recovery ----------
+    def _segments(self):
+        numbers = []
+        for name in os.listdir(self.directory):
+            if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX):
+                numbers.append(int(name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)]))
+        return sorted(numbers)
+
+    def _snapshot_segment(self):
+        path = os.path.join(self.directory, SNAPSHOT_NAME)
+        if not os.path.exists(path):
+            return None
+        return _read_snapshot(path)["segment"]
+
+    def recover(self):
+        """Return ``(state or None, [(table, record), ...])`` to rebuild memory"""
+        state, first_segment = None, 0
+        path = os.path.join(self.directory, SNAPSHOT_NAME)
+        if os.path.exists(path):
+            snap = _read_snapshot(path)
+            state, first_segment = snap["state"], snap["segment"]
+
+        entries = []
+        for number in self._segments():
+            if number < first_segment:
+                continue
+            for line in _mapped_lines(os.path.join(self.directory, _segment_name(number))):
+                if not line:
+                    continue
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # torn write at the tail of the last segment
+                    break
+                entries.append((entry["t"], entry["r"]))
+        return state, entries
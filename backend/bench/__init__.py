@@ -0,0 +1 @@
+"""Benchmark and stress scripts; run from backend/ as ``python -m bench.<name>``."""
@@ -0,0 +1,40 @@
+"""Drive an ASGI app in-process, without a server or HTTP client library."""
+import asyncio
+import json
+from urllib.parse import urlencode
+
+
+async def call(app, method, path, params=None, body=None, headers=None):
+    """Run one request through ``app``; returns ``(status, headers, body bytes)``.
+
+    ``body`` is JSON-encoded unless it is already bytes.
+    """
+    if body is not None and not isinstance(body, bytes):
+        body = json.dumps(body).encode()
+        headers = {"content-type": "application/json", **(headers or {})}
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": method,
+        "scheme": "http", "path": path, "raw_path": path.encode(), "root_path": "",
+        "query_string": urlencode(params or {}, doseq=True).encode(),
+        "headers": [(k.lower().encode(), str(v).encode()) for k, v in (headers or {}).items()],
+        "client": ("bench", 0), "server": ("bench", 80),
+    }
+    pending = [{"type": "http.request", "body": body or b"", "more_body": False}]
+    sent = []
+
+    async def receive():
+        if pending:
+            return pending.pop()
+        # the client never disconnects; wait until the app stops listening
+        await asyncio.Event().wait()
+
+    async def send(message):
+        sent.append(message)
+
+    await app(scope, receive, send)
+    start = next(m for m in sent if m["type"] == "http.response.start")
+    return (
+        start["status"],
+        {k.decode(): v.decode() for k, v in start.get("headers", [])},
+        b"".join(m.get("body", b"") for m in sent if m["type"] == "http.response.body"),
+    )
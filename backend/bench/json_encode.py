@@ -0,0 +1,93 @@
+"""Per-endpoint cost of encoding responses, FastAPI default vs fast JSON.
+
+Seeds the in-memory stores, then for each endpoint payload times
+``jsonable_encoder`` + stdlib ``JSONResponse`` (what a handler returning a
+dict used to cost) against ``dumps`` from every JSON backend installed, and
+the whole request through the ASGI app with the configured backend. Prints
+JSON.
+
+    python -m bench.json_encode --rows 100000 --repeat 5
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from app import main
+from app.responses import JSON_BACKEND, JSON_BACKENDS, select_backend
+from bench.asgi import call
+
+
+def seed(rows, bases):
+    main.startup()
+    for base_id in range(1, bases + 1):
+        main.stock_data.setdefault(base_id, {})[1] = {"opening": 10 ** 9, "current": 10 ** 9}
+    batch = []
+    for i in range(rows):
+        batch.append({"id": None, "base_id": i % bases + 1, "equipment_id": 1, "quantity": 1 + i % 7,
+                      "purchase_date": f"2024-{1 + i % 12:02d}-{1 + i % 28:02d}"})
+        if len(batch) == 1000:
+            main.commit_records("purchases", batch)
+            batch = []
+    if batch:
+        main.commit_records("purchases", batch)
+
+
+def payloads():
+    """(endpoint, request path, content the handler produces)"""
+    rows = main.purchases_db.find(base_id=1)
+    return [
+        ("GET /api/purchases?base_id=1", "/api/purchases", {"base_id": 1}, rows[0:]),
+        ("GET /api/purchases?limit=1000", "/api/purchases", {"limit": 1000}, main.purchases_db[0:1000]),
+        ("GET /api/dashboard?by_equipment", "/api/dashboard", {"base_id": 1, "by_equipment": "true"},
+         main.dashboard_metrics(1, None, None, True)),
+        ("GET /api/bases", "/api/bases", {}, main.bases_db),
+    ]
+
+
+def best_of(repeat, fn):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return round(best * 1000, 3)
+
+
+def run(repeat):
+    encoders = {}
+    for backend in JSON_BACKENDS:
+        try:
+            encoders[backend] = select_backend(backend)[1]
+        except ImportError:
+            pass
+
+    results = []
+    for name, path, params, content in payloads():
+        row = {"endpoint": name, "bytes": len(encoders["json"](content))}
+        row["fastapi_default_ms"] = best_of(repeat, lambda: JSONResponse(jsonable_encoder(content)))
+        for backend, dumps in encoders.items():
+            row[f"{backend}_ms"] = best_of(repeat, lambda: dumps(content))
+        # the response cache would hide encoding cost on repeat requests
+        row["request_ms"] = best_of(repeat, lambda: (main.response_cache.clear(), asyncio.run(call(main.app, "GET", path, params))))
+        results.append(row)
+    return results
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--bases", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    seed(args.rows, args.bases)
+    print(json.dumps({"rows": args.rows, "backend": JSON_BACKEND, "endpoints": run(args.repeat)}, indent=2))
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,297 @@
+"""Load test of the API at a fixed concurrency, with JSON results.
+
+Seeds ``--rows`` transactions across ``--bases`` bases into the in-memory
+store of app.main and (with ``--paths sql``) a SQLite stand-in for the
+routers/ + crud.py path, then drives each scenario with ``--concurrency``
+in-flight requests through the ASGI app in-process. Every scenario reports
+throughput, p50/p95/p99/max latency and status counts; the run reports RSS
+after seeding and at the end. The JSON goes to stdout or ``--output`` so
+runs can be diffed between releases.
+
+    python -m bench.load --rows 100000 --bases 8 --concurrency 32 --requests 2000
+    python -m bench.load --rows 10000000 --paths mem --scenarios dashboard_range list_page
+    DATABASE_URL=mysql+mysqlconnector://... ASYNC_DATABASE_URL=mysql+aiomysql://... \\
+        python -m bench.load --paths sql
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+if "DATABASE_URL" not in os.environ:
+    _db = os.path.join(tempfile.mkdtemp(prefix="bench-load-"), "bench.db")
+    os.environ["DATABASE_URL"] = f"sqlite:///{_db}"
+    os.environ["ASYNC_DATABASE_URL"] = f"sqlite+aiosqlite:///{_db}"
+
+from fastapi import FastAPI
+
+from app import crud, deps, main, models
+from app.config import settings
+from app.responses import JSON_BACKEND
+from app.security import user_claims
+from bench.asgi import call
+from bench.stats import peak_rss_bytes, percentiles, rss_bytes
+
+TABLES = ("purchases", "transfers", "assignments", "expended")
+FIRST_DAY = date(2024, 1, 1)
+DAYS = 366
+SEED_BATCH = 5000
+BIG_STOCK = 10 ** 12
+
+
+def day(rnd):
+    return (FIRST_DAY + timedelta(days=rnd.randrange(DAYS))).isoformat()
+
+
+def movement(table, rnd, bases, equipment):
+    base_id = rnd.randint(1, bases)
+    eq = rnd.randint(1, equipment)
+    qty = rnd.randint(1, 20)
+    if table == "purchases":
+        return {"base_id": base_id, "equipment_id": eq, "quantity": qty, "purchase_date": day(rnd)}
+    if table == "transfers":
+        other = rnd.randint(1, bases - 1) if bases > 1 else base_id
+        other += other >= base_id and bases > 1
+        return {"from_base_id": base_id, "to_base_id": other, "equipment_id": eq, "quantity": qty,
+                "transfer_date": day(rnd)}
+    if table == "assignments":
+        return {"base_id": base_id, "equipment_id": eq, "personnel_name": f"person-{rnd.randrange(500)}",
+                "quantity": qty, "assigned_date": day(rnd)}
+    return {"base_id": base_id, "equipment_id": eq, "quantity": qty, "expended_date": day(rnd)}
+
+
+# ==================== Seeding ====================
+def seed_memory(rows, bases, equipment, rnd):
+    """Load ``rows`` movements straight into the stores, bypassing the WAL"""
+    for base_id in range(1, bases + 1):
+        per_base = main.stock_data.setdefault(base_id, {})
+        for eq in range(1, equipment + 1):
+            per_base[eq] = {"opening": BIG_STOCK, "current": BIG_STOCK}
+    for i in range(rows):
+        table = TABLES[i % len(TABLES)]
+        store = main.TABLES[table][0]
+        main.apply_record(table, {"id": store.last_id + 1, **movement(table, rnd, bases, equipment)})
+
+
+SQL_MODELS = {
+    "purchases": models.Purchase,
+    "transfers": models.Transfer,
+    "assignments": models.Assignment,
+    "expended": models.Expended,
+}
+
+
+def sql_row(table, record):
+    if table == "transfers":
+        record = dict(record)
+        record["from_base"] = record.pop("from_base_id")
+        record["to_base"] = record.pop("to_base_id")
+    return record
+
+
+def seed_sql(rows, bases, equipment, rnd):
+    """Create the schema and load ``rows`` movements through crud.add_movements"""
+    deps.create_db()
+    db = deps.SessionLocal()
+    try:
+        db.add(models.User(username="bench", password_hash="!", role="admin"))
+        db.commit()
+        user = crud.get_user_by_username(db, "bench")
+        for table in TABLES:
+            count = rows // len(TABLES)
+            for start in range(0, count, SEED_BATCH):
+                batch = [sql_row(table, movement(table, rnd, bases, equipment))
+                         for _ in range(min(SEED_BATCH, count - start))]
+                crud.add_movements(db, SQL_MODELS[table], batch)
+        crud.ensure_monthly_snapshots(db, FIRST_DAY + timedelta(days=DAYS))
+        return user.username
+    finally:
+        db.close()
+
+
+# ==================== Scenarios ====================
+def memory_scenarios(bases, equipment):
+    """name -> request factory ``(rnd) -> (method, path, params, body)``"""
+    def month_range(rnd):
+        start = FIRST_DAY + timedelta(days=rnd.randrange(DAYS - 31))
+        return start.isoformat(), (start + timedelta(days=30)).isoformat()
+
+    def dashboard(rnd):
+        return "GET", "/api/dashboard", {"base_id": rnd.randint(1, bases)}, None
+
+    def dashboard_range(rnd):
+        start, end = month_range(rnd)
+        return "GET", "/api/dashboard", {"base_id": rnd.randint(1, bases), "start_date": start,
+                                          "end_date": end, "by_equipment": "true"}, None
+
+    def timeseries(rnd):
+        return "GET", "/api/dashboard/timeseries", {"base_id": rnd.randint(1, bases), "bucket": "week"}, None
+
+    def list_page(rnd):
+        return "GET", "/api/purchases", {"base_id": rnd.randint(1, bases), "limit": 100}, None
+
+    def list_range(rnd):
+        start, end = month_range(rnd)
+        return "GET", "/api/transfers", {"base_id": rnd.randint(1, bases), "start_date": start,
+                                         "end_date": end, "limit": 1000}, None
+
+    def create(table, path):
+        def factory(rnd):
+            record = movement(table, rnd, bases, equipment)
+            record.pop(next(k for k in record if k.endswith("_date")))
+            return "POST", path, None, record
+        return factory
+
+    def bulk_purchases(rnd):
+        return "POST", "/api/purchases/bulk", None, [
+            movement("purchases", rnd, bases, equipment) for _ in range(100)]
+
+    return {
+        "dashboard": dashboard,
+        "dashboard_range": dashboard_range,
+        "timeseries": timeseries,
+        "list_page": list_page,
+        "list_range": list_range,
+        "create_purchase": create("purchases", "/api/purchases"),
+        "create_transfer": create("transfers", "/api/transfers"),
+        "create_expenditure": create("expended", "/api/expenditures"),
+        "bulk_purchases": bulk_purchases,
+    }
+
+
+def sql_scenarios(bases, equipment, username):
+    headers = {"Authorization": f"Bearer {deps.create_access_token(user_claims(username, 'admin'))}"}
+
+    def dashboard(rnd):
+        return "GET", "/dashboard/", {"base_id": rnd.randint(1, bases)}, None, headers
+
+    def dashboard_bases(rnd):
+        return "GET", "/dashboard/bases", {"base_ids": list(range(1, bases + 1)),
+                                           "start_date": "2024-03-01", "end_date": "2024-09-30"}, None, headers
+
+    def create_purchase(rnd):
+        items = [{"asset_id": rnd.randint(1, equipment), "quantity": rnd.randint(1, 20)}]
+        return "POST", "/api/purchases/", None, {"base_id": rnd.randint(1, bases), "items": items}, headers
+
+    return {
+        "sql_dashboard": dashboard,
+        "sql_dashboard_bases": dashboard_bases,
+        "sql_create_purchase": create_purchase,
+    }
+
+
+async def run_scenario(app, factory, requests, concurrency, seed):
+    rnd = random.Random(seed)
+    jobs = iter(range(requests))
+    latencies = []
+    statuses = {}
+
+    async def worker():
+        for _ in jobs:
+            method, path, params, body, *headers = factory(rnd)
+            started = time.perf_counter()
+            status, _, _ = await call(app, method, path, params, body, headers[0] if headers else None)
+            latencies.append(time.perf_counter() - started)
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {"requests": requests, "seconds": round(elapsed, 3), "rps": round(requests / elapsed, 1),
+            "status": statuses, **percentiles(latencies)}
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(__file__), timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+async def run(args):
+    rnd = random.Random(args.seed)
+    main.startup()
+    report = {
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "commit": git_commit(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "config": {"rows": args.rows, "sql_rows": args.sql_rows, "bases": args.bases,
+                   "equipment": args.equipment, "concurrency": args.concurrency,
+                   "requests": args.requests, "response_cache": not args.no_cache,
+                   "store_backend": settings.STORE_BACKEND, "state_backend": settings.STATE_BACKEND,
+                   "json_backend": JSON_BACKEND,
+                   "durable": main.wal is not None},
+        "seed": {},
+        "scenarios": {},
+    }
+    if args.no_cache:
+        main.response_cache.maxsize = 0
+
+    app = FastAPI()
+    scenarios = {}
+    if "mem" in args.paths:
+        started = time.perf_counter()
+        seed_memory(args.rows, args.bases, args.equipment, rnd)
+        report["seed"]["mem_seconds"] = round(time.perf_counter() - started, 3)
+        app.mount("/mem", main.app)
+        scenarios.update({name: ("/mem", factory)
+                          for name, factory in memory_scenarios(args.bases, args.equipment).items()})
+    if "sql" in args.paths:
+        from app.routers import dashboard, purchases
+        started = time.perf_counter()
+        username = seed_sql(args.sql_rows, args.bases, args.equipment, rnd)
+        report["seed"]["sql_seconds"] = round(time.perf_counter() - started, 3)
+        app.include_router(dashboard.router)
+        app.include_router(purchases.router)
+        scenarios.update({name: ("", factory)
+                          for name, factory in sql_scenarios(args.bases, args.equipment, username).items()})
+    report["seed"]["rss_bytes"] = rss_bytes()
+
+    for name, (prefix, factory) in scenarios.items():
+        if args.scenarios and name not in args.scenarios:
+            continue
+
+        def prefixed(rnd, factory=factory, prefix=prefix):
+            method, path, *rest = factory(rnd)
+            return (method, prefix + path, *rest)
+        report["scenarios"][name] = await run_scenario(app, prefixed, args.requests, args.concurrency, args.seed)
+
+    report["rss_bytes"] = rss_bytes()
+    report["peak_rss_bytes"] = peak_rss_bytes()
+    return report
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10000, help="in-memory transactions to seed")
+    parser.add_argument("--sql-rows", type=int, default=10000, help="SQL transactions to seed")
+    parser.add_argument("--bases", type=int, default=8)
+    parser.add_argument("--equipment", type=int, default=len(main.equipment_db))
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=1000, help="requests per scenario")
+    parser.add_argument("--paths", nargs="+", choices=("mem", "sql"), default=["mem", "sql"])
+    parser.add_argument("--scenarios", nargs="*", help="only run these scenarios")
+    parser.add_argument("--no-cache", action="store_true", help="disable the response cache")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    report = json.dumps(asyncio.run(run(args)), indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(report + "\n")
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,116 @@
+"""Login storm: latency of other endpoints while bcrypt logins pile up.
+
+Fires ``--logins`` concurrent POST /api/auth/token requests (the SQL auth
+router, on SQLite unless DATABASE_URL / ASYNC_DATABASE_URL are set) while a
+probe keeps hitting GET /api/bases of the in-memory app on the same event
+loop. Runs once with bcrypt inline on the loop and once on the hashing pool,
+and prints probe p50/p95/p99 before and during each storm as JSON.
+
+    python -m bench.login_storm --logins 100 --rounds 10
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+if "DATABASE_URL" not in os.environ:
+    _db = os.path.join(tempfile.mkdtemp(prefix="login-storm-"), "bench.db")
+    os.environ["DATABASE_URL"] = f"sqlite:///{_db}"
+    os.environ["ASYNC_DATABASE_URL"] = f"sqlite+aiosqlite:///{_db}"
+
+from fastapi import FastAPI
+
+from app import deps, main, models
+from app.passwords import PasswordHasher, hash_password
+from app.routers import auth
+from bench.asgi import call
+from bench.stats import percentiles
+
+USERNAME = "storm-user"
+PASSWORD = "storm-password"
+PROBE_INTERVAL = 0.005
+
+
+def build_app(rounds):
+    deps.create_db()
+    db = deps.SessionLocal()
+    try:
+        if db.query(models.User).filter_by(username=USERNAME).first() is None:
+            db.add(models.User(username=USERNAME, password_hash=hash_password(PASSWORD, rounds), role="admin"))
+            db.commit()
+    finally:
+        db.close()
+    app = FastAPI()
+    app.include_router(auth.router)
+    app.mount("/mem", main.app)
+    return app
+
+
+async def probe(app, stop, samples):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await call(app, "GET", "/mem/api/bases")
+        samples.append(time.perf_counter() - started)
+        await asyncio.sleep(PROBE_INTERVAL)
+
+
+async def login(app):
+    status, _, _ = await call(app, "POST", "/api/auth/token", body={"username": USERNAME, "password": PASSWORD})
+    return status
+
+
+async def storm(app, logins, baseline_seconds):
+    baseline, during = [], []
+    stop = asyncio.Event()
+    task = asyncio.create_task(probe(app, stop, baseline))
+    await asyncio.sleep(baseline_seconds)
+    stop.set()
+    await task
+
+    stop = asyncio.Event()
+    task = asyncio.create_task(probe(app, stop, during))
+    started = time.perf_counter()
+    statuses = await asyncio.gather(*(login(app) for _ in range(logins)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await task
+    counts = {}
+    for status in statuses:
+        counts[str(status)] = counts.get(str(status), 0) + 1
+    return {"storm_seconds": round(elapsed, 3), "login_status": counts,
+            "probe_baseline": percentiles(baseline), "probe_during_storm": percentiles(during)}
+
+
+async def run_modes(app, args):
+    # one event loop for both runs: the async engine's pool is bound to it
+    results = {}
+    for mode in ("inline", "pool"):
+        deps.password_hasher = PasswordHasher(args.rounds, args.workers, args.queue, inline=mode == "inline")
+        try:
+            if mode == "pool":
+                # start the worker processes before timing
+                await deps.password_hasher.verify(PASSWORD, hash_password(PASSWORD, 4))
+            results[mode] = await storm(app, args.logins, args.baseline_seconds)
+        finally:
+            deps.password_hasher.shutdown()
+    return results
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--logins", type=int, default=100)
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--workers", type=int, default=0)
+    parser.add_argument("--queue", type=int, default=64)
+    parser.add_argument("--baseline-seconds", type=float, default=1.0)
+    args = parser.parse_args()
+
+    app = build_app(args.rounds)
+    results = asyncio.run(run_modes(app, args))
+    print(json.dumps({"logins": args.logins, "rounds": args.rounds, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,114 @@
+"""Cold start: import time, first-request time and RSS of a fresh process.
+
+Each run starts a new interpreter that imports ``--module``, then sends one
+request (``--path``) through its ASGI app, and reports the wall time of
+both steps, the peak RSS, and how many modules were loaded. Runs repeat
+``--runs`` times and report the median. ``--compare REF`` measures a git
+revision the same way, in a temporary worktree, so before/after numbers
+come from the same machine.
+
+    python -m bench.startup --runs 7
+    python -m bench.startup --compare HEAD~1 --importtime 15
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+# runs in the child; kept free of bench imports so older trees can run it
+CHILD = r"""
+import asyncio, json, resource, sys, time
+started = time.perf_counter()
+module = __import__(sys.argv[1], fromlist=["app"])
+imported = time.perf_counter()
+app = module.app
+messages = []
+
+async def receive():
+    return {"type": "http.request", "body": b"", "more_body": False}
+
+async def send(message):
+    messages.append(message)
+
+scope = {"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+         "scheme": "http", "path": sys.argv[2], "raw_path": sys.argv[2].encode(), "root_path": "",
+         "query_string": b"", "headers": [], "server": ("bench", 80), "client": ("bench", 1)}
+asyncio.run(app(scope, receive, send))
+served = time.perf_counter()
+print(json.dumps({
+    "import_ms": (imported - started) * 1000,
+    "first_request_ms": (served - imported) * 1000,
+    "status": messages[0]["status"],
+    "peak_rss_bytes": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+    "modules": len(sys.modules),
+}))
+"""
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def measure(cwd, module, path, runs):
+    samples = []
+    env = dict(os.environ, PYTHONPATH=cwd)
+    # one extra, discarded run writes the bytecode caches
+    for _ in range(runs + 1):
+        out = subprocess.run([sys.executable, "-c", CHILD, module, path], cwd=cwd, env=env,
+                             capture_output=True, text=True, check=True)
+        samples.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    samples = samples[1:]
+    return {
+        "runs": runs,
+        "status": samples[-1]["status"],
+        "modules": samples[-1]["modules"],
+        **{key: round(statistics.median(s[key] for s in samples), 1)
+           for key in ("import_ms", "first_request_ms", "peak_rss_bytes")},
+    }
+
+
+def slowest_imports(cwd, module, top):
+    """The ``top`` modules with the largest cumulative import time"""
+    env = dict(os.environ, PYTHONPATH=cwd)
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], cwd=cwd, env=env,
+                         capture_output=True, text=True, check=True)
+    rows = []
+    for line in out.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        rows.append((int(cumulative), name.strip()))
+    return [{"module": name, "cumulative_ms": round(us / 1000, 1)} for us, name in sorted(rows, reverse=True)[:top]]
+
+
+def measure_ref(ref, module, path, runs):
+    root = subprocess.run(["git", "rev-parse", "--show-toplevel"], cwd=BACKEND,
+                          capture_output=True, text=True, check=True).stdout.strip()
+    tree = tempfile.mkdtemp(prefix="bench-startup-")
+    subprocess.run(["git", "worktree", "add", "--detach", tree, ref], cwd=root, capture_output=True, check=True)
+    try:
+        return measure(os.path.join(tree, os.path.relpath(BACKEND, root)), module, path, runs)
+    finally:
+        subprocess.run(["git", "worktree", "remove", "--force", tree], cwd=root, capture_output=True)
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--module", default="app.main")
+    parser.add_argument("--path", default="/api/bases")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--compare", metavar="REF", help="also measure this git revision")
+    parser.add_argument("--importtime", type=int, default=0, metavar="N", help="list the N slowest imports")
+    args = parser.parse_args()
+
+    report = {"module": args.module, "current": measure(BACKEND, args.module, args.path, args.runs)}
+    if args.importtime:
+        report["slowest_imports"] = slowest_imports(BACKEND, args.module, args.importtime)
+    if args.compare:
+        report[args.compare] = measure_ref(args.compare, args.module, args.path, args.runs)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,88 @@
+"""Multi-threaded stress run of the in-memory write path.
+
+Drives app.main.commit_records from N threads across several bases, then
+checks that every id is unique and gap-free per table and that the ledger
+matches a rebuild from the raw stores. Prints throughput per thread count
+as JSON.
+
+    python -m bench.stress_store --writes 20000 --threads 1 2 4 8
+    WAL_DIR=/tmp/wal python -m bench.stress_store   # with group-commit fsync
+"""
+import argparse
+import json
+import random
+import threading
+import time
+
+from app import main
+from app.ledger import check_ledger
+
+TABLES = ("purchases", "transfers", "assignments", "expended")
+
+
+def make_row(table, base_id, other_base):
+    if table == "purchases":
+        return {"id": None, "base_id": base_id, "equipment_id": 1, "quantity": 1, "purchase_date": "2024-01-01"}
+    if table == "transfers":
+        return {"id": None, "from_base_id": base_id, "to_base_id": other_base, "equipment_id": 1,
+                "quantity": 1, "transfer_date": "2024-01-01"}
+    if table == "assignments":
+        return {"id": None, "base_id": base_id, "equipment_id": 1, "personnel_name": "stress",
+                "quantity": 1, "assigned_date": "2024-01-01"}
+    return {"id": None, "base_id": base_id, "equipment_id": 1, "quantity": 1, "expended_date": "2024-01-01"}
+
+
+def run(threads, writes, bases):
+    # enough stock that no debit in the run is rejected as an overdraw
+    for base_id in range(1, bases + 1):
+        main.stock_data.setdefault(base_id, {})[1] = {"opening": 10 ** 9, "current": 10 ** 9}
+    before = {t: len(main.TABLES[t][0]) for t in TABLES}
+    per_thread = writes // threads
+    barrier = threading.Barrier(threads + 1)
+
+    def worker(seed):
+        rnd = random.Random(seed)
+        barrier.wait()
+        for _ in range(per_thread):
+            table = rnd.choice(TABLES)
+            base_id = rnd.randint(1, bases)
+            main.commit_records(table, [make_row(table, base_id, rnd.randint(1, bases))])
+
+    pool = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for t in pool:
+        t.start()
+    barrier.wait()
+    started = time.perf_counter()
+    for t in pool:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    written = 0
+    for table in TABLES:
+        ids = [r["id"] for r in main.TABLES[table][0]]
+        assert len(ids) == len(set(ids)), f"duplicate ids in {table}"
+        assert ids == list(range(1, len(ids) + 1)), f"ids out of order in {table}"
+        written += len(ids) - before[table]
+    assert written == per_thread * threads, "lost writes"
+
+    _, mismatches = check_ledger(main.ledger, main.purchases_db, main.transfers_db,
+                                 main.assignments_db, main.expended_db)
+    assert not mismatches, mismatches[:5]
+    return {"threads": threads, "writes": written, "seconds": round(elapsed, 4),
+            "writes_per_sec": round(written / elapsed, 1)}
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--writes", type=int, default=20000)
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--bases", type=int, default=8)
+    args = parser.parse_args()
+
+    main.startup()
+    results = [run(n, args.writes, args.bases) for n in args.threads]
+    print(json.dumps({"durable": main.wal is not None, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main_cli()
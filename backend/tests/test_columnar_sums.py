@@ -0,0 +1,40 @@
+"""NumPy aggregates must agree with the pure-Python fallback, even past int64."""
+import pytest
+
+from app import columnar
+from app.columnar import ColumnarStore
+
+pytest.importorskip("numpy")
+
+FIELDS = ("id", "base_id", "equipment_id", "quantity", "purchase_date")
+
+
+@pytest.fixture
+def store():
+    store = ColumnarStore(FIELDS, ("base_id", "equipment_id"), date_field="purchase_date")
+    for i in range(6):
+        store.append({"id": i + 1, "base_id": 1 + i % 2, "equipment_id": 1 + i % 3,
+                      "quantity": 2 ** 63 - 1 if i % 2 else -2 ** 62, "purchase_date": f"2024-0{1 + i}-15"})
+    return store
+
+
+AGGREGATES = [
+    lambda s: s.sum(),
+    lambda s: s.sum(base_id=2),
+    lambda s: s.sum(start_date="2024-02-01", end_date="2024-06-30"),
+    lambda s: s.group_sum(("base_id",)),
+    lambda s: s.group_sum(("base_id", "equipment_id"), start_date="2024-02-01"),
+    lambda s: s.group_sum(("equipment_id",), bucket="month"),
+]
+
+
+@pytest.mark.parametrize("aggregate", AGGREGATES)
+def test_numpy_matches_python_fallback_at_the_limit(store, aggregate, monkeypatch):
+    fast = aggregate(store)
+    monkeypatch.setattr(columnar, "_numpy", lambda: False)
+    assert fast == aggregate(store)
+
+
+def test_sums_past_int64_are_exact(store):
+    assert store.sum(base_id=2) == 3 * (2 ** 63 - 1)
+    assert store.group_sum(("base_id",)) == {(1,): -3 * 2 ** 62, (2,): 3 * (2 ** 63 - 1)}
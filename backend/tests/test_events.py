@@ -0,0 +1,27 @@
+"""EventHub.stream owns its subscription for exactly as long as it runs."""
+import asyncio
+
+from app.events import EventHub
+
+
+def test_stream_that_never_starts_never_subscribes():
+    hub = EventHub()
+
+    async def run():
+        hub.stream({1})
+    asyncio.run(run())
+    assert len(hub) == 0
+
+
+def test_stream_unsubscribes_when_the_client_goes_away():
+    hub = EventHub()
+
+    async def run():
+        stream = hub.stream({1})
+        assert await anext(stream) == b"retry: 3000\n\n"
+        assert len(hub) == 1
+        hub.publish("purchase", {"id": 1}, {1})
+        assert b"event: purchase" in await anext(stream)
+        await stream.aclose()
+    asyncio.run(run())
+    assert len(hub) == 0
@@ -0,0 +1,83 @@
+"""Movement quantities must be positive and fit an int64 column."""
+import pytest
+from fastapi.testclient import TestClient
+
+from app import main
+
+BASE_ID = 1
+EQUIPMENT_ID = 1
+TOO_BIG = main.MAX_QUANTITY + 1
+
+MOVEMENTS = {
+    "/api/purchases": {"base_id": BASE_ID, "equipment_id": EQUIPMENT_ID},
+    "/api/transfers": {"from_base_id": BASE_ID, "to_base_id": 2, "equipment_id": EQUIPMENT_ID},
+    "/api/assignments": {"base_id": BASE_ID, "equipment_id": EQUIPMENT_ID, "personnel_name": "Pvt. Test"},
+    "/api/expenditures": {"base_id": BASE_ID, "equipment_id": EQUIPMENT_ID},
+}
+
+
+@pytest.fixture(scope="module")
+def client():
+    return TestClient(main.app)
+
+
+@pytest.fixture(scope="module")
+def token(client):
+    response = client.post("/api/auth/token", json={"username": "admin1", "password": "admin123"})
+    assert response.status_code == 200
+    return response.json()["access_token"]
+
+
+def current_stock():
+    return main.stock_data[BASE_ID][EQUIPMENT_ID]["current"]
+
+
+@pytest.mark.parametrize("quantity", [-1000, 0, TOO_BIG])
+@pytest.mark.parametrize("path", MOVEMENTS)
+def test_single_create_rejects_bad_quantity(client, token, path, quantity):
+    before = current_stock()
+    response = client.post(path, params={"token": token}, json={**MOVEMENTS[path], "quantity": quantity})
+    assert response.status_code == 422
+    assert current_stock() == before
+
+
+@pytest.mark.parametrize("quantity", [-1000, 0, TOO_BIG])
+@pytest.mark.parametrize("path", MOVEMENTS)
+def test_bulk_create_rejects_bad_quantity(client, token, path, quantity):
+    before = current_stock()
+    items = [{**MOVEMENTS[path], "quantity": 1}, {**MOVEMENTS[path], "quantity": quantity}]
+    response = client.post(path + "/bulk", params={"token": token}, json=items)
+    assert response.status_code == 422
+    assert [result["ok"] for result in response.json()["results"]] == [True, False]
+    assert current_stock() == before
+
+
+def test_positive_quantity_is_accepted(client, token):
+    before = current_stock()
+    response = client.post("/api/purchases", params={"token": token},
+                           json={**MOVEMENTS["/api/purchases"], "quantity": 1})
+    assert response.status_code == 200
+    assert current_stock() == before + 1
+
+
+def test_max_size_rows_sum_exactly(client, token):
+    base_id, rows = 951, 5
+    for _ in range(rows):
+        response = client.post("/api/purchases", params={"token": token},
+                               json={"base_id": base_id, "equipment_id": EQUIPMENT_ID,
+                                     "quantity": main.MAX_QUANTITY, "purchase_date": "2024-06-01"})
+        assert response.status_code == 200
+    total = rows * main.MAX_QUANTITY
+
+    # ledger path
+    response = client.get("/api/dashboard", params={"base_id": base_id, "token": token})
+    assert response.status_code == 200
+    assert response.json()["purchases"] == total
+    # date-filtered path over the stores
+    response = client.get("/api/dashboard", params={"base_id": base_id, "token": token, "by_equipment": True,
+                                                    "start_date": "2024-01-01", "end_date": "2024-12-31"})
+    assert response.status_code == 200
+    assert response.json()["purchases"] == total
+    assert response.json()["equipment"][0]["purchases"] == total
+    assert client.get("/api/stock", params={"base_id": base_id, "token": token}).status_code == 200
+    assert client.get("/api/dashboard/rollup", params={"token": token}).status_code == 200
@@ -0,0 +1,62 @@
+"""SQL bulk purchases: every item is validated and scoped before anything is written."""
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.deps import get_async_db, get_current_user
+from app.routers import purchases
+from app.security import Principal
+
+
+class RecordingDB:
+    """Stands in for the session: keeps the rows handed to crud.add_movements"""
+
+    def __init__(self):
+        self.rows = []
+
+    async def run_sync(self, fn, model, rows):
+        self.rows.extend(rows)
+        return len(rows)
+
+
+@pytest.fixture
+def db():
+    return RecordingDB()
+
+
+def client_for(db, user):
+    app = FastAPI()
+    app.include_router(purchases.router)
+    app.dependency_overrides[get_current_user] = lambda: user
+    app.dependency_overrides[get_async_db] = lambda: db
+    return TestClient(app)
+
+
+COMMANDER = Principal("cmd", "base_commander", base_id=1, user_id=2)
+ADMIN = Principal("root", "admin", user_id=1)
+
+
+def order(base_id, quantity=3):
+    return {"base_id": base_id, "items": [{"asset_id": 1, "quantity": quantity}]}
+
+
+def test_valid_batch_is_recorded_with_per_item_results(db):
+    response = client_for(db, ADMIN).post("/api/purchases/bulk", json=[order(1), order(2, 4)])
+    assert response.status_code == 200
+    assert response.json()["results"] == [{"index": 0, "ok": True, "items": 1}, {"index": 1, "ok": True, "items": 1}]
+    assert [row["quantity"] for row in db.rows] == [3, 4]
+
+
+def test_commander_cannot_buy_for_another_base(db):
+    response = client_for(db, COMMANDER).post("/api/purchases/bulk", json=[order(1), order(2)])
+    assert response.status_code == 403
+    assert [(r["ok"], r.get("status")) for r in response.json()["results"]] == [(True, None), (False, 403)]
+    assert db.rows == []
+
+
+@pytest.mark.parametrize("quantity", [-9, 0, 2 ** 31])
+def test_bad_quantity_rejects_the_batch(db, quantity):
+    response = client_for(db, ADMIN).post("/api/purchases/bulk", json=[order(1), order(1, quantity)])
+    assert response.status_code == 422
+    assert [r["ok"] for r in response.json()["results"]] == [True, False]
+    assert db.rows == []
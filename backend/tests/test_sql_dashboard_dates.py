@@ -0,0 +1,28 @@
+"""Malformed date filters on the SQL dashboard are a 400, never a 500."""
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.deps import get_async_db, get_current_user
+from app.routers import dashboard
+
+
+@pytest.fixture(scope="module")
+def client():
+    app = FastAPI()
+    app.include_router(dashboard.router)
+    app.dependency_overrides[get_current_user] = lambda: {"role": "admin", "base_id": None}
+    app.dependency_overrides[get_async_db] = lambda: None
+    return TestClient(app)
+
+
+@pytest.mark.parametrize("method, path, params", [
+    ("GET", "/dashboard/", {"base_id": 1}),
+    ("GET", "/dashboard/bases", {"base_ids": [1, 2]}),
+    ("POST", "/dashboard/jobs", {"base_ids": [1]}),
+])
+@pytest.mark.parametrize("dates", [{"start_date": "junk"}, {"end_date": "2024-13-01"}])
+def test_malformed_dates_are_rejected(client, method, path, params, dates):
+    response = client.request(method, path, params={**params, **dates})
+    assert response.status_code == 400
+    assert response.json()["detail"].startswith("Invalid date filter")
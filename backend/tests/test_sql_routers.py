@@ -0,0 +1,33 @@
+"""SQL routers must never be shadowed by routes the in-memory API already serves."""
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.routers import include_routers
+
+
+def app_with_login():
+    app = FastAPI()
+
+    @app.post("/api/auth/token")
+    def login():
+        return {}
+    return app
+
+
+def test_colliding_router_fails_before_including_anything():
+    app = app_with_login()
+    routes = list(app.routes)
+    with pytest.raises(RuntimeError, match="POST /api/auth/token"):
+        include_routers(app, "assets,auth")
+    assert app.routes == routes
+
+
+def test_prefixed_routers_are_all_reachable():
+    app = app_with_login()
+    include_routers(app, "auth,purchases", "/sql")
+    client = TestClient(app)
+    assert client.post("/api/auth/token").json() == {}
+    # the SQL handlers answer (and reject the empty requests) under the prefix
+    assert client.post("/sql/api/auth/token").status_code == 422
+    assert client.post("/sql/api/purchases/bulk", json=[]).status_code == 401
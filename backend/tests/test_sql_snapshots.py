@@ -0,0 +1,43 @@
+"""Opening balances read through snapshots match a full recomputation."""
+from datetime import date
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+
+from app import crud, models
+from app.config import Base
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://", poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.add_all([models.BaseModel(id=1, name="North"), models.EquipmentType(id=1, name="Rifle")])
+        session.add(models.OpeningStock(base_id=1, equipment_id=1, quantity=100, date=date(2024, 1, 1)))
+        session.commit()
+        crud.add_movements(session, models.Purchase, [
+            {"base_id": 1, "equipment_id": 1, "quantity": 33, "purchase_date": date(2024, 1, 10)},
+            {"base_id": 1, "equipment_id": 1, "quantity": 33, "purchase_date": date(2024, 2, 10)},
+        ])
+        crud.ensure_monthly_snapshots(session, date(2024, 4, 1))
+        yield session
+    engine.dispose()
+
+
+def expected_balance(day, seeds):
+    """Balance at the start of ``day`` recomputed from the rows themselves"""
+    opening = sum(q for q, seeded_on in seeds if seeded_on is None or seeded_on <= day)
+    return opening + sum(33 for bought in (date(2024, 1, 10), date(2024, 2, 10)) if bought < day)
+
+
+@pytest.mark.parametrize("seeded_on", [None, date(2024, 1, 5), date(2024, 3, 15)])
+def test_opening_stock_added_after_snapshots_counts(db, seeded_on):
+    assert crud.get_opening_balance(db, 1, "2024-04-01") == 166
+    db.add(models.OpeningStock(base_id=1, equipment_id=1, quantity=1000, date=seeded_on))
+    db.commit()
+    seeds = [(100, date(2024, 1, 1)), (1000, seeded_on)]
+    for day in (date(2024, 1, 1), date(2024, 2, 1), date(2024, 3, 15), date(2024, 3, 16), date(2024, 4, 1)):
+        assert crud.get_opening_balance(db, 1, day.isoformat()) == expected_balance(day, seeds), day
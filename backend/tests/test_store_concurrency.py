@@ -0,0 +1,195 @@
+"""Concurrent writers: ids stay unique and every total stays consistent."""
+import random
+import sys
+import threading
+
+import pytest
+from fastapi import HTTPException
+
+from app import main
+from app.columnar import ColumnarStore
+from app.ledger import check_ledger
+from app.store import RecordStore
+
+THREADS = 8
+FIELDS = ("id", "base_id", "equipment_id", "quantity", "purchase_date")
+# bases no other test writes to
+BASES = (901, 902, 903, 904)
+
+
+def run_threads(target, threads=THREADS):
+    barrier = threading.Barrier(threads)
+    errors = []
+
+    def run(n):
+        barrier.wait()
+        try:
+            target(n)
+        except Exception as exc:
+            errors.append(exc)
+
+    workers = [threading.Thread(target=run, args=(n,)) for n in range(threads)]
+    # switch threads far more often than the default 5 ms, so races surface
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+    finally:
+        sys.setswitchinterval(interval)
+    assert not errors, errors
+
+
+@pytest.mark.parametrize("make_store", [
+    lambda: RecordStore(("base_id",), date_field="purchase_date", fields=FIELDS),
+    lambda: ColumnarStore(FIELDS, ("base_id",), date_field="purchase_date"),
+], ids=["rows", "columnar"])
+def test_store_insert_allocates_unique_ids(make_store):
+    store = make_store()
+    per_thread = 500
+
+    def write(n):
+        for i in range(per_thread):
+            store.insert({"id": None, "base_id": n, "equipment_id": 1, "quantity": i, "purchase_date": "2024-01-01"})
+
+    run_threads(write)
+    rows = list(store)
+    assert [row["id"] for row in rows] == list(range(1, THREADS * per_thread + 1))
+    assert store.last_id == THREADS * per_thread
+    for n in range(THREADS):
+        assert sorted(row["quantity"] for row in store.find(base_id=n)) == list(range(per_thread))
+
+
+@pytest.fixture
+def stocked():
+    main.startup()
+    for base_id in BASES:
+        main.stock_data.setdefault(base_id, {})[1] = {"opening": 10 ** 9, "current": 10 ** 9}
+    yield
+    for base_id in BASES:
+        main.stock_data.pop(base_id, None)
+
+
+def movement(table, rnd):
+    base_id, other = rnd.sample(BASES, 2)
+    quantity = rnd.randint(1, 9)
+    if table == "purchases":
+        return {"id": None, "base_id": base_id, "equipment_id": 1, "quantity": quantity, "purchase_date": "2024-01-01"}
+    if table == "transfers":
+        return {"id": None, "from_base_id": base_id, "to_base_id": other, "equipment_id": 1,
+                "quantity": quantity, "transfer_date": "2024-01-01"}
+    return {"id": None, "base_id": base_id, "equipment_id": 1, "quantity": quantity, "expended_date": "2024-01-01"}
+
+
+def test_concurrent_commits_keep_ids_and_totals_consistent(stocked):
+    tables = ("purchases", "transfers", "expended")
+    before = {table: main.TABLES[table][0].last_id for table in tables}
+    opening = {base_id: main.stock_data[base_id][1]["current"] for base_id in BASES}
+    written = {table: [] for table in tables}
+    lock = threading.Lock()
+
+    def write(n):
+        rnd = random.Random(n)
+        for _ in range(300):
+            table = rnd.choice(tables)
+            batch = [movement(table, rnd) for _ in range(rnd.randint(1, 3))]
+            main.commit_records(table, batch)
+            with lock:
+                written[table].extend(batch)
+
+    run_threads(write)
+
+    for table in tables:
+        ids = sorted(record["id"] for record in written[table])
+        assert ids == list(range(before[table] + 1, before[table] + len(ids) + 1)), table
+
+    expected = dict(opening)
+    for table in tables:
+        for record in written[table]:
+            for base_id, _, delta in main.stock_deltas(table, record):
+                expected[base_id] += delta
+    assert {base_id: main.stock_data[base_id][1]["current"] for base_id in BASES} == expected
+
+    _, mismatches = check_ledger(main.ledger, main.purchases_db, main.transfers_db,
+                                 main.assignments_db, main.expended_db)
+    assert mismatches == []
+
+
+def test_concurrent_debits_never_overdraw(stocked):
+    base_id = BASES[0]
+
+    def expend(accepted):
+        try:
+            main.commit_records("expended", [{"id": None, "base_id": base_id, "equipment_id": 1,
+                                              "quantity": 1, "expended_date": "2024-01-01"}])
+        except HTTPException as exc:
+            assert exc.status_code == 400
+        else:
+            accepted.append(1)
+
+    # every round, all threads race for the last unit of stock
+    for _ in range(100):
+        main.stock_data[base_id][1] = {"opening": 1, "current": 1}
+        accepted = []
+        run_threads(lambda n: expend(accepted))
+        assert len(accepted) == 1
+        assert main.stock_data[base_id][1]["current"] == 0
+
+
+@pytest.mark.parametrize("make_store", [
+    lambda: RecordStore(("base_id",), date_field="purchase_date", fields=FIELDS),
+    lambda: ColumnarStore(FIELDS, ("base_id",), date_field="purchase_date"),
+], ids=["rows", "columnar"])
+def test_group_sum_upto_ignores_later_rows(make_store):
+    store = make_store()
+    for i in range(10):
+        store.insert({"id": None, "base_id": i % 2, "equipment_id": 1, "quantity": 1, "purchase_date": "2024-01-01"})
+    assert store.group_sum(("base_id",), upto=5) == {(0,): 3, (1,): 2}
+    assert store.group_sum(("base_id",), upto=5, start_date="2024-01-01") == {(0,): 3, (1,): 2}
+    assert store.group_sum(("base_id",), upto=0) == {}
+
+
+def test_rollup_scans_transfers_outside_the_write_lock(stocked, monkeypatch):
+    # a writer must be able to commit while the transfer scan runs
+    scan = main.transfers_db.group_sum
+    committed = []
+
+    def scan_with_write(*args, **kwargs):
+        writer = threading.Thread(target=lambda: committed.append(main.commit_records("transfers", [
+            {"id": None, "from_base_id": BASES[0], "to_base_id": BASES[1], "equipment_id": 1,
+             "quantity": 1, "transfer_date": "2024-01-01"}])))
+        writer.start()
+        writer.join(5)
+        return scan(*args, **kwargs)
+
+    monkeypatch.setattr(main.transfers_db, "group_sum", scan_with_write)
+    movements, flows = main.rollup_movements()
+    assert committed
+    # flows and ledger totals come from the same cut, which predates that write
+    out = sum(q for (from_id, _, eq_id), q in flows.items() if from_id == BASES[0] and eq_id == 1)
+    assert out == movements.get((BASES[0], 1), {}).get("transfer_out", 0)
+    assert main.ledger.equipment[BASES[0]][1]["transfer_out"] == out + 1
+
+
+def test_readers_survive_new_equipment_keys(stocked):
+    base_id = BASES[2]
+    main.ledger.equipment.setdefault(base_id, {})
+    done = threading.Event()
+
+    def add_keys(n):
+        if n == 0:
+            for eq_id in range(2, 20000):
+                main.stock_data[base_id][eq_id] = {"opening": 0, "current": 0}
+                main.ledger.equipment[base_id][eq_id] = dict.fromkeys(main.FIELDS, 0)
+            done.set()
+            return
+        while not done.is_set():
+            main.opening_balances(base_id)
+            main.ledger.equipment_totals(base_id)
+
+    try:
+        run_threads(add_keys, threads=3)
+    finally:
+        main.ledger.equipment.pop(base_id, None)
@@ -0,0 +1,70 @@
+"""A record the store cannot hold is rejected whole: not stored, not logged."""
+import pytest
+from fastapi.testclient import TestClient
+
+from app import main
+from app.columnar import ColumnarStore
+from app.store import RecordStore
+
+FIELDS = ("id", "base_id", "equipment_id", "quantity", "purchase_date")
+
+
+def rows():
+    return RecordStore(("base_id",), date_field="purchase_date", fields=FIELDS)
+
+
+def columnar():
+    return ColumnarStore(FIELDS, ("base_id",), date_field="purchase_date")
+
+
+@pytest.mark.parametrize("make_store, bad", [
+    (rows, {"base_id": [1]}),
+    (rows, {"purchase_date": None}),
+    (columnar, {"base_id": [1]}),
+    (columnar, {"equipment_id": "x"}),
+    (columnar, {"quantity": 10 ** 20}),
+])
+def test_rejected_insert_leaves_store_and_log_untouched(make_store, bad):
+    store = make_store()
+    logged = []
+
+    with pytest.raises(ValueError):
+        store.insert({"id": None, "base_id": 1, "equipment_id": 1, "quantity": 5,
+                      "purchase_date": "2024-01-01", **bad}, logged.append)
+    store.insert({"id": None, "base_id": 1, "equipment_id": 1, "quantity": 5,
+                  "purchase_date": "2024-01-01"}, logged.append)
+
+    assert len(store) == 1
+    assert [record["id"] for record in logged] == [1]
+    assert list(store) == [{"id": 1, "base_id": 1, "equipment_id": 1, "quantity": 5,
+                            "purchase_date": "2024-01-01"}]
+
+
+def test_columnar_overflow_keeps_columns_aligned():
+    store = columnar()
+    with pytest.raises(ValueError):
+        store.insert({"id": None, "base_id": 1, "equipment_id": 1, "quantity": 10 ** 20,
+                      "purchase_date": "2024-01-01"})
+    store.insert({"id": None, "base_id": 1, "equipment_id": 1, "quantity": 5, "purchase_date": "2024-01-01"})
+    assert {field: column.size for field, column in store.columns.items()} == dict.fromkeys(store.columns, 1)
+    assert store.find(base_id=1)[0]["quantity"] == 5
+
+
+def test_api_rejects_unstorable_record_before_commit():
+    client = TestClient(main.app)
+    token = client.post("/api/auth/token", json={"username": "admin1", "password": "admin123"}).json()["access_token"]
+    if not isinstance(main.purchases_db, ColumnarStore):
+        pytest.skip("dict rows hold any integer")
+    last_id = main.purchases_db.last_id
+
+    response = client.post("/api/purchases", params={"token": token},
+                           json={"base_id": 10 ** 20, "equipment_id": 1, "quantity": 1})
+    assert response.status_code == 422
+    assert main.purchases_db.last_id == last_id
+
+    response = client.post("/api/purchases", params={"token": token},
+                           json={"base_id": 1, "equipment_id": 1, "quantity": 5})
+    assert response.status_code == 200
+    record = response.json()["data"]
+    assert main.purchases_db.find(base_id=1)[-1] == record
+    assert record["quantity"] == 5